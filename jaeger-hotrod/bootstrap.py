@@ -0,0 +1,207 @@
+import concurrent.futures
+import contextlib
+import dataclasses
+import math
+import numpy
+import os
+import warnings
+
+
+# Bootstrap confidence intervals: a statistic is recomputed on many
+# resamples (with replacement) of its data, and the spread of the
+# recomputed values bounds the estimate.  Resamples are drawn as index
+# matrices (or, for data summarized into groups, count matrices), one row
+# per replicate, so the statistic sees every replicate of a chunk at once
+# and is written with numpy operations along axis 1; chunks of replicates
+# can be computed in a process pool.
+#
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Constants
+
+DEFAULT_REPLICATES = 2000
+DEFAULT_CONFIDENCE = 0.95
+
+# Replicates are computed in chunks of at most this many resampled values
+# per column (replicates x rows), bounding the memory of each chunk (32MB
+# per float64 column) and setting the granularity of the work handed to a
+# process pool.
+#
+CHUNK_VALUES = 1 << 22
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclasses.dataclass
+class ConfidenceInterval:
+    """
+    An estimate together with the (lower, upper) bounds of its percentile
+    bootstrap confidence interval.
+    """
+    estimate: float
+    lower: float
+    upper: float
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclasses.dataclass
+class Grouped:
+    """
+    A dataset given as groups of rows (e.g. the buckets of a
+    sketches.QuantileSketch): parallel columns with one value per group,
+    and the number of rows in each group.
+
+    It is resampled by drawing the number of rows of each group
+    (multinomially, which is how many rows of each group resampling the
+    rows themselves would draw), so a replicate costs the number of groups
+    rather than of rows.  Resampled, `counts` is a (replicates, groups)
+    array and the columns are unchanged.
+    """
+    counts: numpy.ndarray
+    columns: tuple
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def dataset_rows(dataset):
+    if isinstance(dataset, Grouped):
+        return len(dataset.counts)
+    return len(dataset[0])
+
+
+def chunk_sizes(datasets, replicates):
+    """
+    Splits `replicates` into chunks of at most CHUNK_VALUES resampled values
+    (rows or groups of the largest dataset), returning the number of
+    replicates of each.
+    """
+    rows = max([dataset_rows(dataset) for dataset in datasets] + [1])
+    per_chunk = max(1, CHUNK_VALUES // rows)
+    return [min(per_chunk, replicates - start)
+            for start in range(0, replicates, per_chunk)]
+
+
+def resample(datasets, replicates, seed):
+    """
+    Returns `replicates` resamples of each of `datasets`: for a dataset of
+    parallel columns (1-D arrays of the same length n), the same columns as
+    (replicates, n) arrays whose rows are drawn together, with replacement;
+    for a Grouped dataset, see Grouped.
+    """
+    rng = numpy.random.default_rng(seed)
+
+    resampled = []
+    for dataset in datasets:
+        if isinstance(dataset, Grouped):
+            total = int(dataset.counts.sum())
+            if total:
+                counts = rng.multinomial(total, dataset.counts / total, size=replicates)
+            else:
+                counts = numpy.zeros((replicates, len(dataset.counts)), dtype=numpy.int64)
+            resampled.append(Grouped(counts=counts, columns=dataset.columns))
+            continue
+
+        rows = len(dataset[0])
+        if rows:
+            index = rng.integers(0, rows, size=(replicates, rows))
+        else:
+            index = numpy.empty((replicates, 0), dtype=numpy.int64)
+        resampled.append(tuple(column[index] for column in dataset))
+
+    return resampled
+
+
+def as_dataset(dataset):
+    if isinstance(dataset, Grouped):
+        return Grouped(counts=numpy.asarray(dataset.counts),
+                       columns=tuple(numpy.asarray(column) for column in dataset.columns))
+    return tuple(numpy.asarray(column) for column in dataset)
+
+
+def replicate_chunk(statistic, datasets, replicates, seed):
+    return numpy.asarray(statistic(resample(datasets, replicates, seed)))
+
+
+def replicate(statistic, datasets, replicates=DEFAULT_REPLICATES, seed=None,
+              executor=None):
+    """
+    Returns the (replicates, k) array of the k values of `statistic` on each
+    bootstrap replicate of `datasets` (a list of tuples of parallel columns
+    or of Grouped, each dataset resampled independently of the others; see
+    resample).
+
+    `statistic` takes the resampled datasets and returns a (replicates, k)
+    array; it must be picklable (e.g. a module-level function or a
+    functools.partial of one) to run in `executor`, a
+    concurrent.futures.Executor over which the chunks of replicates are
+    spread (None: computed in this process).  The result depends only on
+    `seed` (an int or a numpy.random.SeedSequence), not on the executor or
+    on how many workers it has.
+    """
+    datasets = [as_dataset(dataset) for dataset in datasets]
+    sizes = chunk_sizes(datasets, replicates)
+    if not isinstance(seed, numpy.random.SeedSequence):
+        seed = numpy.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+
+    if executor is None or len(sizes) == 1:
+        chunks = [replicate_chunk(statistic, datasets, size, chunk_seed)
+                  for size, chunk_seed in zip(sizes, seeds)]
+    else:
+        futures = [executor.submit(replicate_chunk, statistic, datasets, size, chunk_seed)
+                   for size, chunk_seed in zip(sizes, seeds)]
+        chunks = [future.result() for future in futures]
+
+    return numpy.concatenate(chunks)
+
+
+def estimate(statistic, datasets):
+    """
+    Returns the k values of `statistic` on `datasets` themselves (a single
+    replicate made of every row once).
+    """
+    observed = []
+    for dataset in map(as_dataset, datasets):
+        if isinstance(dataset, Grouped):
+            observed.append(Grouped(counts=dataset.counts[numpy.newaxis, :],
+                                    columns=dataset.columns))
+        else:
+            observed.append(tuple(column[numpy.newaxis, :] for column in dataset))
+
+    return numpy.asarray(statistic(observed))[0]
+
+
+def intervals(estimates, replicates, confidence=DEFAULT_CONFIDENCE):
+    """
+    Returns a ConfidenceInterval for each of the k `estimates` from their
+    (replicates, k) bootstrap `replicates` (percentile method; replicates
+    where a value is nan are ignored for that value).
+    """
+    tail = (1 - confidence) / 2 * 100
+    if len(replicates):
+        # Values that are nan in every replicate get a nan interval.
+        #
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lower, upper = numpy.nanpercentile(replicates, [tail, 100 - tail], axis=0)
+    else:
+        lower = upper = numpy.full(len(estimates), math.nan)
+
+    return [ConfidenceInterval(estimate=float(value), lower=float(lo), upper=float(hi))
+            for value, lo, hi in zip(estimates, lower, upper)]
+
+
+def process_pool(workers):
+    """
+    Returns a context manager giving the executor to pass to `replicate`: a
+    process pool of `workers` processes (None: one per CPU), or None if
+    workers <= 1.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        return contextlib.nullcontext()
+
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers)
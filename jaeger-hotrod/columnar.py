@@ -0,0 +1,305 @@
+import io
+import json
+import mmap
+import numpy
+import os
+import stat
+import struct
+import sys
+import zipfile
+
+
+# A typed, columnar alternative to the JSON files passed between the Makefile
+# stages (spans, RPCs and packets).  A list of records becomes one numpy array
+# per field, stored uncompressed in an .npz bundle so that a reader can map the
+# file and use the arrays in place, without parsing anything.
+#
+# Auxiliary arrays are named "<field>:<kind>":
+#
+#  - "<field>:null"     bool mask of the records whose value is None
+#  - "<field>:offsets"  CSR offsets of a list-valued field into "<field>"
+#  - "<field>:json"     JSON text of each value of a dict-valued field
+#
+# Strings are stored UTF-8 encoded, as fixed-width numpy bytes.  COUNT_COLUMN
+# holds the number of records, so that a bundle of none (or of records
+# without fields) still reads back as such.
+#
+
+FORMAT_JSON = "json"
+FORMAT_NPZ = "npz"
+FORMATS = (FORMAT_JSON, FORMAT_NPZ)
+
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+ZIP_MAGIC = b"PK\x03\x04"
+ZIP_EMPTY_MAGIC = b"PK\x05\x06"
+
+COUNT_COLUMN = "__count__"
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def values_to_column(values):
+    """
+    Returns a typed numpy array holding `values` (all None, bool, int, float
+    or str), plus a null mask if any of them is None (else None).
+    """
+    present = [v for v in values if v is not None]
+    null = None
+    if len(present) < len(values):
+        null = numpy.array([v is None for v in values], dtype=bool)
+
+    if present and all(isinstance(v, bool) for v in present):
+        fill, dtype = False, bool
+    elif all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        fill, dtype = 0, numpy.int64
+    elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        fill, dtype = 0.0, numpy.float64
+    elif all(isinstance(v, str) for v in present):
+        return (numpy.array([b"" if v is None else v.encode() for v in values],
+                            dtype=bytes),
+                null)
+    else:
+        raise TypeError(f"can't store values of type "
+                        f"{sorted(set(type(v).__name__ for v in present))} in a column")
+
+    column = numpy.array([fill if v is None else v for v in values], dtype=dtype)
+    return column, null
+
+
+def records_to_columns(records):
+    """
+    Converts a list of dicts (all with the same keys) into a dict of numpy
+    arrays, in the layout described at the top of this module.
+    """
+    columns = {COUNT_COLUMN: numpy.array([len(records)], dtype=numpy.int64)}
+    for name in (records[0].keys() if records else ()):
+        values = [record[name] for record in records]
+
+        if any(isinstance(v, list) for v in values):
+            columns[name + ":offsets"] = numpy.cumsum(
+                [0] + [len(v) for v in values], dtype=numpy.int64)
+            columns[name], _null = values_to_column([x for v in values for x in v])
+
+        elif any(isinstance(v, dict) for v in values):
+            columns[name + ":json"] = numpy.array([json.dumps(v).encode() for v in values],
+                                                  dtype=bytes)
+
+        else:
+            columns[name], null = values_to_column(values)
+            if null is not None:
+                columns[name + ":null"] = null
+
+    return columns
+
+
+def column_values(column):
+    if column.dtype.kind == 'S':
+        return [v.decode() for v in column.tolist()]
+
+    return column.tolist()
+
+
+def columns_to_records(columns):
+    """
+    Inverse of records_to_columns.
+    """
+    count = None
+    if COUNT_COLUMN in columns:
+        count = int(columns[COUNT_COLUMN][0])
+        columns = {key: column for key, column in columns.items() if key != COUNT_COLUMN}
+
+    fields = {}
+    for key, column in columns.items():
+        name, _sep, kind = key.partition(":")
+        if kind == "":
+            fields[name] = column_values(column)
+        elif kind == "json":
+            fields[name] = [json.loads(v) for v in column.tolist()]
+
+    for key, column in columns.items():
+        name, _sep, kind = key.partition(":")
+        if kind == "null":
+            fields[name] = [None if null else v
+                            for v, null in zip(fields[name], column.tolist())]
+        elif kind == "offsets":
+            offsets = column.tolist()
+            flat = fields[name]
+            fields[name] = [flat[begin:end]
+                            for begin, end in zip(offsets[:-1], offsets[1:])]
+
+    if not fields:
+        return [{} for _ in range(count or 0)]
+
+    return [dict(zip(fields.keys(), values)) for values in zip(*fields.values())]
+
+
+def rows_to_columns(rows, names):
+    """
+    Converts a list of tuples/lists, whose fields are named by `names`, into
+    a dict of numpy arrays.
+    """
+    return records_to_columns([dict(zip(names, row)) for row in rows])
+
+
+def columns_to_rows(columns, names):
+    """
+    Returns the values of `names` in `columns` as a list of tuples.
+    """
+    records = columns_to_records(columns)
+    return [tuple(record[name] for name in names) for record in records]
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def save(columns, stream):
+    """
+    Writes a dict of numpy arrays to a binary stream as an uncompressed .npz
+    bundle; `stream` need not be seekable.
+    """
+    numpy.savez(stream, **columns)
+
+
+def load(stream):
+    """
+    Loads a bundle written by `save`.  If `stream` is a regular file, the
+    returned arrays are read-only views of a memory map of it; otherwise the
+    stream is read into memory.
+    """
+    if is_regular_file(stream):
+        buf = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        buf = stream.read()
+        stream = io.BytesIO(buf)
+
+    columns = {}
+    with zipfile.ZipFile(stream) as bundle:
+        for info in bundle.infolist():
+            # Members are stored uncompressed, so each .npy file is a
+            # contiguous range of the bundle, just after its local header.
+            #
+            header = ZIP_LOCAL_HEADER.unpack_from(buf, info.header_offset)
+            name_bytes, extra_bytes = header[-2:]
+            stream.seek(info.header_offset + ZIP_LOCAL_HEADER.size +
+                        name_bytes + extra_bytes)
+
+            version = numpy.lib.format.read_magic(stream)
+            if version == (1, 0):
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(stream)
+            else:
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(stream)
+
+            count = int(numpy.prod(shape))
+            array = numpy.frombuffer(buf, dtype=dtype, count=count, offset=stream.tell())
+            columns[info.filename.removesuffix(".npy")] = array.reshape(
+                shape, order='F' if fortran_order else 'C')
+
+    return columns
+
+
+def is_regular_file(stream):
+    try:
+        return stat.S_ISREG(os.fstat(stream.fileno()).st_mode)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+
+
+def is_bundle(stream):
+    """
+    Returns True if the binary `stream` holds a bundle rather than JSON,
+    without consuming any of it; a bundle without arrays is just the zip
+    end record.
+    """
+    return stream.peek(len(ZIP_MAGIC))[:len(ZIP_MAGIC)] in (ZIP_MAGIC, ZIP_EMPTY_MAGIC)
+
+
+def read_records(stream):
+    """
+    Reads a list of records from a binary stream holding either JSON or a
+    bundle (detected automatically).
+    """
+    if is_bundle(stream):
+        return columns_to_records(load(stream))
+
+    return json.load(stream)
+
+
+def read_rows(stream, names):
+    """
+    Like read_records, for files of rows (JSON arrays) whose fields are
+    named by `names`; returns a list of tuples.
+    """
+    if is_bundle(stream):
+        return columns_to_rows(load(stream), names)
+
+    return [tuple(row) for row in json.load(stream)]
+
+
+def write_records(records, stream, fmt=FORMAT_JSON):
+    """
+    Writes a list of records to the binary `stream` in the format `fmt`.
+    """
+    if fmt == FORMAT_NPZ:
+        save(records_to_columns(records), stream)
+    else:
+        stream.write(json.dumps(records).encode())
+
+
+def write_rows(rows, names, stream, fmt=FORMAT_JSON):
+    if fmt == FORMAT_NPZ:
+        save(rows_to_columns(rows, names), stream)
+    else:
+        stream.write(json.dumps(rows).encode())
+
+
+def write_row_batches(batches, names, stream, fmt=FORMAT_JSON):
+    """
+    Like write_rows, for an iterable of lists of rows (without None values)
+    that are written as they come: the JSON output is the same as
+    write_rows of all of them.  A bundle needs each column whole, so only
+    the typed columns of the batches, not their rows, are held until the
+    end.
+    """
+    if fmt == FORMAT_NPZ:
+        parts = [rows_to_columns(rows, names) for rows in batches if rows]
+        columns = {name: numpy.concatenate([part[name] for part in parts])
+                   for name in (parts[0] if parts else ())}
+        columns[COUNT_COLUMN] = numpy.array(
+            [sum(int(part[COUNT_COLUMN][0]) for part in parts)], dtype=numpy.int64)
+        save(columns, stream)
+        return
+
+    stream.write(b"[")
+    separator = b""
+    for rows in batches:
+        for row in rows:
+            stream.write(separator + json.dumps(row).encode())
+            separator = b", "
+    stream.write(b"]")
+
+
+def parse_format_arg(args):
+    """
+    Removes a "--format=json|npz" argument from `args` (a list), returning
+    the selected output format (FORMAT_JSON if absent).
+    """
+    fmt = FORMAT_JSON
+    for arg in list(args):
+        if arg.startswith("--format="):
+            fmt = arg[len("--format="):]
+            if fmt not in FORMATS:
+                raise ValueError(f"unknown format {fmt!r}; expected one of {FORMATS}")
+            args.remove(arg)
+    return fmt
+
+
+def main(args):
+    # Usage: columnar.py < FILE.npz > FILE.json
+    #
+    # Exports a bundle (or JSON) as JSON, for debugging.
+    #
+    write_records(read_records(sys.stdin.buffer), sys.stdout.buffer)
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+if __name__ == "__main__":
+    main(sys.argv)
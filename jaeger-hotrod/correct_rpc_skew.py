@@ -1,29 +1,13 @@
-import json
 import sys
+import tracedoppler
 
 
-def correct_skew(rpc, avg_skew_usec):
-    query_latency_usec = rpc["query.latency.usec"]
-    reply_latency_usec = rpc["reply.latency.usec"]
-
-    rpc["query.latency.usec"] = query_latency_usec - avg_skew_usec
-    rpc["reply.latency.usec"] = reply_latency_usec + avg_skew_usec
-
-    return rpc
-
-
+# Same as `tracedoppler.py correct_rpc_skew`; kept so that existing command lines work.
+#
 def main(args):
-    rpcs = json.load(sys.stdin)
-
-    avg_skew_usec = (
-        float(sum([rpc["split.skew.usec"] for rpc in rpcs])) /
-        float(len(rpcs))
-    )
-
-    json.dump([correct_skew(rpc, avg_skew_usec) for rpc in rpcs], sys.stdout)
-    pass
+    return tracedoppler.run("correct_rpc_skew", args)
 
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 if __name__ == "__main__":
-    main(sys.argv)
+    sys.exit(main(sys.argv))
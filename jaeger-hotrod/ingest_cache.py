@@ -0,0 +1,117 @@
+import columnar
+import hashlib
+import os
+import tempfile
+import zipfile
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+ENTRY_SUFFIX = ".npz"
+
+HASH_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def file_digest(filename):
+    """
+    Returns the SHA-256 hex digest of the contents of `filename`.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as stream:
+        while block := stream.read(HASH_BLOCK_BYTES):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestCache:
+    """
+    A persistent, content-addressed cache of decoded inputs (packet tables,
+    span tables, ...), stored as columnar bundles in `directory`.
+
+    Entries are keyed by a hash of the parser version, the contents of the
+    input files and any parameters that affect the result, so editing an
+    input or bumping a parser version simply misses.  Hits are memory-mapped
+    (see columnar.load).  The directory is kept under `max_bytes` by evicting
+    least recently used entries; an entry's mtime is its last use.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, parser_version, filenames=(), params=()):
+        digest = hashlib.sha256()
+        for part in ([str(parser_version)] +
+                     [file_digest(filename) for filename in filenames] +
+                     [str(param) for param in params]):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """
+        Returns the columns stored under `key`, or None on a miss.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as stream:
+                columns = columnar.load(stream)
+        except FileNotFoundError:
+            return None
+        except (zipfile.BadZipFile, ValueError, OSError):
+            # A truncated or otherwise unreadable entry is just a miss.
+            #
+            self.remove(path)
+            return None
+
+        os.utime(path)
+        return columns
+
+    def put(self, key, columns):
+        """
+        Stores `columns` (a dict of numpy arrays) under `key`, then evicts
+        entries until the cache fits in max_bytes.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temporary file and rename it into place, so that readers
+        # never see a partial entry.
+        #
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp",
+                                         delete=False) as stream:
+            columnar.save(columns, stream)
+        os.replace(stream.name, self.path(key))
+
+        self.evict(keep=key)
+
+    def entries(self):
+        """
+        Returns a list of (mtime, size, path) of all entries, oldest first.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        entries = self.entries()
+        total_bytes = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if keep is not None and path == self.path(keep):
+                continue
+            self.remove(path)
+            total_bytes -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,1207 @@
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
+import io
+import mmap
+import numpy
+import os
+import socket
+import struct
+
+from typing import Optional
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Constants
+
+# Bump whenever a change to the decoders changes what they return, so that
+# cached decodes (see ingest_cache.py) are invalidated.
+#
+PARSER_VERSION = 2
+
+PCAP_GLOBAL_HEADER_BYTES = 24
+PCAP_RECORD_HEADER_BYTES = 16
+
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+
+PCAPNG_BLOCK_SHB = 0x0a0d0d0a
+PCAPNG_BLOCK_IDB = 1
+PCAPNG_BLOCK_OPB = 2
+PCAPNG_BLOCK_EPB = 6
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+PCAPNG_MIN_BLOCK_BYTES = 12
+
+# Interface Description Block options.
+#
+PCAPNG_OPT_ENDOFOPT = 0
+PCAPNG_OPT_IF_TSRESOL = 9
+PCAPNG_OPT_IF_TSOFFSET = 14
+
+# Timestamp resolution (if_tsresol) of interfaces without the option: usec.
+#
+PCAPNG_DEFAULT_TSRESOL = 6
+
+NSEC_PER_SEC = 1000 * 1000 * 1000
+
+LINKTYPE_ETHERNET = 1
+
+ETH_HEADER_BYTES = 14
+ETH_TYPE_IP = 0x0800
+
+# Frames with these ether types can never produce an IPv4/TCP packet, so the
+# fast path drops them without consulting dpkt.  Anything else that isn't
+# plain IPv4 (VLAN tags, MPLS, 802.3/LLC, ...) is handed to the dpkt fallback.
+#
+ETH_TYPES_NEVER_TCP = (0x0806, 0x86dd)
+
+IP_PROTO_TCP = 6
+IP_HEADER_BYTES = 20
+IP_OFFSET_MASK = 0x1fff
+
+TCP_HEADER_BYTES = 20
+
+# Approximate size of the byte ranges a single pcap file is split into for
+# parallel decoding.
+#
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Largest timestamp gap (seconds) between consecutive records accepted when
+# resynchronizing on record headers in the middle of a file.
+#
+RESYNC_MAX_GAP_SEC = 3600
+
+# Approximate number of bytes (fast path) or packets (dpkt path) decoded per
+# batch by the streaming readers.
+#
+DEFAULT_BATCH_BYTES = 8 * 1024 * 1024
+DEFAULT_BATCH_RECORDS = 64 * 1024
+
+# How long (capture time) the streaming matcher waits for the other copy of
+# a packet before giving up on it: must cover the link latency plus the clock
+# skew between any two capture hosts.
+#
+DEFAULT_MATCH_WINDOW_NS = NSEC_PER_SEC
+
+# Normalized TCP connection key: each endpoint packed as (ip << 16 | port),
+# ordered so that lo <= hi; both directions of a connection share a key.
+#
+FLOW_KEY_DTYPE = numpy.dtype([("lo", numpy.uint64), ("hi", numpy.uint64)])
+
+# Packed packet identity: a single int holding, from the most significant
+# bits down, (src ip, dst ip, src port, dst port, seq, size).  Copies of a
+# packet captured on its sender and on its receiver share the same key.
+# Five fields need 160 bits, so keys are Python ints rather than numpy words;
+# one int hashes and compares much faster than a tuple or a dataclass.
+#
+PACKET_KEY_BITS = 160
+PACKET_KEY_DST_SHIFT = 96
+PACKET_KEY_SIZE_MASK = 0xffffffff
+PACKET_KEY_ADDR_MASK = 0xffffffff
+PACKET_KEY_MASK = (1 << PACKET_KEY_BITS) - 1
+
+# Column name -> dtype, matching pipeline.PacketTable.
+#
+COLUMNS = {
+    "src_addr_ip": numpy.uint32,
+    "dst_addr_ip": numpy.uint32,
+    "src_port_tcp": numpy.uint16,
+    "dst_port_tcp": numpy.uint16,
+    "seq_tcp": numpy.uint32,
+    "size_bytes": numpy.uint32,
+    "payload_bytes": numpy.uint32,
+    "capture_time_ns": numpy.int64,
+}
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Functions
+
+def ip_to_int(addr_ip):
+    """
+    Converts a dotted-quad IPv4 string to its uint32 value.
+    """
+    return int.from_bytes(socket.inet_aton(addr_ip), 'big')
+
+
+def int_to_ip(addr_int):
+    """
+    Converts a uint32 IPv4 value to a dotted-quad string.
+    """
+    return socket.inet_ntoa(int(addr_int).to_bytes(4, 'big'))
+
+
+def empty_columns():
+    return {name: numpy.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def flow_keys(columns):
+    """
+    Returns the FLOW_KEY_DTYPE key of each packet in `columns`.
+    """
+    src = ((columns["src_addr_ip"].astype(numpy.uint64) << numpy.uint64(16)) |
+           columns["src_port_tcp"].astype(numpy.uint64))
+    dst = ((columns["dst_addr_ip"].astype(numpy.uint64) << numpy.uint64(16)) |
+           columns["dst_port_tcp"].astype(numpy.uint64))
+
+    keys = numpy.empty(len(src), dtype=FLOW_KEY_DTYPE)
+    keys["lo"] = numpy.minimum(src, dst)
+    keys["hi"] = numpy.maximum(src, dst)
+    return keys
+
+
+def flow_key(addr_ip_1, port_1, addr_ip_2, port_2):
+    """
+    Returns the (lo, hi) flow key of a connection between two uint32 IP/port
+    endpoints.
+    """
+    first = (addr_ip_1 << 16) | port_1
+    second = (addr_ip_2 << 16) | port_2
+    return (min(first, second), max(first, second))
+
+
+def packet_keys(columns):
+    """
+    Returns the packed key (see PACKET_KEY_BITS) of each packet in `columns`,
+    as a list of ints.
+    """
+    addrs = ((columns["src_addr_ip"].astype(numpy.uint64) << numpy.uint64(32)) |
+             columns["dst_addr_ip"].astype(numpy.uint64))
+    ports_seq = ((columns["src_port_tcp"].astype(numpy.uint64) << numpy.uint64(48)) |
+                 (columns["dst_port_tcp"].astype(numpy.uint64) << numpy.uint64(32)) |
+                 columns["seq_tcp"].astype(numpy.uint64))
+
+    return [(a << 96) | (p << 32) | size
+            for a, p, size in zip(addrs.tolist(), ports_seq.tolist(),
+                                  columns["size_bytes"].tolist())]
+
+
+def unpack_packet_key(key):
+    """
+    Returns (src ip, dst ip, src port, dst port, seq, size) of a packed key.
+    """
+    return ((key >> 128) & 0xffffffff,
+            (key >> 96) & 0xffffffff,
+            (key >> 80) & 0xffff,
+            (key >> 64) & 0xffff,
+            (key >> 32) & 0xffffffff,
+            key & 0xffffffff)
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclasses.dataclass
+class PacketFilter:
+    """
+    A predicate pushed down into the readers, so that packets outside of it
+    are dropped while decoding instead of being materialized.  A packet must
+    match every criterion that is set (None means unconstrained):
+
+     - flows: FLOW_KEY_DTYPE array of TCP connections (see flow_key)
+     - host_pairs: directed (src_ip, dst_ip) uint32 pairs
+     - port_ranges: inclusive (lo, hi) ranges matched by either TCP port
+     - time_windows_ns: half-open [start, stop) capture time windows
+    """
+    flows: Optional[numpy.ndarray] = None
+    host_pairs: Optional[list[tuple[int, int]]] = None
+    port_ranges: Optional[list[tuple[int, int]]] = None
+    time_windows_ns: Optional[list[tuple[int, int]]] = None
+
+    def cache_params(self):
+        """
+        Returns a list of strings identifying this filter in a cache key.
+        """
+        flows = None
+        if self.flows is not None:
+            flows = numpy.asarray(self.flows, dtype=FLOW_KEY_DTYPE).tobytes().hex()
+        return [f"flows={flows}",
+                f"host_pairs={self.host_pairs}",
+                f"port_ranges={self.port_ranges}",
+                f"time_windows_ns={self.time_windows_ns}"]
+
+    def time_mask(self, capture_time_ns):
+        if self.time_windows_ns is None:
+            return numpy.ones(len(capture_time_ns), dtype=bool)
+
+        mask = numpy.zeros(len(capture_time_ns), dtype=bool)
+        for start_ns, stop_ns in self.time_windows_ns:
+            mask |= (capture_time_ns >= start_ns) & (capture_time_ns < stop_ns)
+        return mask
+
+    def mask(self, columns):
+        mask = self.time_mask(columns["capture_time_ns"])
+
+        if self.flows is not None:
+            mask &= numpy.isin(flow_keys(columns),
+                               numpy.asarray(self.flows, dtype=FLOW_KEY_DTYPE))
+
+        if self.host_pairs is not None:
+            pairs = ((columns["src_addr_ip"].astype(numpy.uint64) << numpy.uint64(32)) |
+                     columns["dst_addr_ip"].astype(numpy.uint64))
+            mask &= numpy.isin(pairs, numpy.array([(src << 32) | dst
+                                                   for src, dst in self.host_pairs],
+                                                  dtype=numpy.uint64))
+
+        if self.port_ranges is not None:
+            in_range = numpy.zeros(len(mask), dtype=bool)
+            for lo, hi in self.port_ranges:
+                for port in (columns["src_port_tcp"], columns["dst_port_tcp"]):
+                    in_range |= (port >= lo) & (port <= hi)
+            mask &= in_range
+
+        return mask
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def gather_u8(data, offsets):
+    return data[numpy.minimum(offsets, len(data) - 1)].astype(numpy.uint32)
+
+
+def gather_be16(data, offsets):
+    return (gather_u8(data, offsets) << 8) | gather_u8(data, offsets + 1)
+
+
+def gather_be32(data, offsets):
+    return (gather_be16(data, offsets) << 16) | gather_be16(data, offsets + 2)
+
+
+def gather_u32(data, offsets, byte_order):
+    """
+    Reads a uint32 with the pcap file's byte order at each offset.
+    """
+    if byte_order == '>':
+        return gather_be32(data, offsets)
+
+    return ((gather_u8(data, offsets + 3) << 24) |
+            (gather_u8(data, offsets + 2) << 16) |
+            (gather_u8(data, offsets + 1) << 8) |
+            gather_u8(data, offsets))
+
+
+def pcap_format(header):
+    """
+    Returns (byte_order, ns_per_tick) for a classic pcap file header, where
+    byte_order is the struct prefix ('<' or '>') and ns_per_tick is the
+    resolution of the sub-second timestamp field (1000 for microsecond
+    files, 1 for nanosecond files), or None if `header` isn't classic pcap.
+    """
+    if len(header) < PCAP_GLOBAL_HEADER_BYTES:
+        return None
+
+    for byte_order in ('<', '>'):
+        magic, = struct.unpack_from(byte_order + 'I', header, 0)
+        if magic == PCAP_MAGIC_USEC:
+            return byte_order, 1000
+        if magic == PCAP_MAGIC_NSEC:
+            return byte_order, 1
+
+    return None
+
+
+def is_pcapng(header):
+    return (len(header) >= 4 and
+            struct.unpack_from('<I', header, 0)[0] == PCAPNG_BLOCK_SHB)
+
+
+def pcap_linktype(header, byte_order):
+    linktype, = struct.unpack_from(byte_order + 'I', header, 20)
+    return linktype
+
+
+def scan_records(buf, byte_order, start=PCAP_GLOBAL_HEADER_BYTES, stop=None):
+    """
+    Walks the record headers of a pcap file in one pass, starting at the
+    record boundary `start`, returning (offsets, next_offset): an array of the
+    offsets of all records that begin before `stop`, and the offset where the
+    walk stopped.  No per-packet objects are created.
+    """
+    record_len = struct.Struct(byte_order + 'I')
+    end = len(buf)
+    if stop is None or stop > end:
+        stop = end
+
+    offsets = numpy.empty(max(0, (stop - start) // PCAP_RECORD_HEADER_BYTES + 1),
+                          dtype=numpy.int64)
+    count = 0
+
+    off = start
+    while off < stop and off + PCAP_RECORD_HEADER_BYTES <= end:
+        incl_len, = record_len.unpack_from(buf, off + 8)
+        if off + PCAP_RECORD_HEADER_BYTES + incl_len > end:
+            break
+        offsets[count] = off
+        count += 1
+        off += PCAP_RECORD_HEADER_BYTES + incl_len
+
+    return offsets[:count], off
+
+
+def find_record_boundary(buf, pcap_fmt, start, stop, chain=8):
+    """
+    Returns the first offset in [start, stop) that looks like the start of a
+    pcap record, judged by validating a chain of `chain` consecutive record
+    headers; returns `stop` if there is none.
+
+    A header is plausible if its lengths fit the snaplen and the file, and its
+    timestamp is no earlier than the file's first record and close to the
+    previous one in the chain.
+    """
+    byte_order, ns_per_tick = pcap_fmt
+    ticks_per_sec = NSEC_PER_SEC // ns_per_tick
+
+    header = struct.Struct(byte_order + 'IIII')
+    snaplen, = struct.unpack_from(byte_order + 'I', buf, 16)
+    first_ts_sec, = struct.unpack_from(byte_order + 'I', buf, PCAP_GLOBAL_HEADER_BYTES)
+    end = len(buf)
+
+    def valid_chain(off):
+        prev_ts_sec = None
+        for _ in range(chain):
+            if off == end:
+                return True
+            if off + PCAP_RECORD_HEADER_BYTES > end:
+                return False
+            ts_sec, ts_frac, incl_len, orig_len = header.unpack_from(buf, off)
+            if (ts_sec < first_ts_sec or
+                ts_frac >= ticks_per_sec or
+                (prev_ts_sec is not None and
+                 abs(ts_sec - prev_ts_sec) > RESYNC_MAX_GAP_SEC) or
+                incl_len > orig_len or
+                (snaplen and incl_len > snaplen) or
+                off + PCAP_RECORD_HEADER_BYTES + incl_len > end):
+                return False
+            prev_ts_sec = ts_sec
+            off += PCAP_RECORD_HEADER_BYTES + incl_len
+        return True
+
+    for off in range(max(start, PCAP_GLOBAL_HEADER_BYTES), min(stop, end)):
+        if valid_chain(off):
+            return off
+
+    return stop
+
+
+def decode_frame(buf):
+    """
+    Fallback decoder: returns (src_ip, dst_ip, src_port, dst_port, seq,
+    payload_bytes) for an Ethernet frame carrying IPv4/TCP, else None.
+    """
+    # dpkt is only needed off the fast path; importing it lazily keeps it out
+    # of the start-up time of everything that never falls back.
+    #
+    import dpkt
+
+    try:
+        eth = dpkt.ethernet.Ethernet(buf)
+    except dpkt.NeedData:
+        return None
+
+    if not (isinstance(eth.data, dpkt.ip.IP) and
+            isinstance(eth.data.data, dpkt.tcp.TCP)):
+        return None
+
+    ip = eth.data
+    tcp = ip.data
+    payload_bytes = len(tcp.data)
+    if ip.len > 0:
+        payload_bytes = max(ip.len - (ip.hl << 2) - (tcp.off << 2), 0)
+
+    return (int.from_bytes(ip.src, 'big'),
+            int.from_bytes(ip.dst, 'big'),
+            tcp.sport,
+            tcp.dport,
+            tcp.seq,
+            payload_bytes)
+
+
+def decode_frames(buf, frames, caplen, linktype):
+    """
+    Extracts the TCP/IPv4 columns of the link-layer frames that start at
+    offsets `frames` in `buf` and have captured lengths `caplen`.
+    `linktype` is a scalar or a per-frame array.
+
+    Returns (columns, accepted): the columns for every frame (without the
+    capture time) and a mask of the frames that carry IPv4/TCP.  Frames the
+    fast path can't decide on are decoded with dpkt.
+    """
+    data = numpy.frombuffer(buf, dtype=numpy.uint8)
+
+    eth = frames
+    eth_type = gather_be16(data, eth + 12)
+
+    ip = eth + ETH_HEADER_BYTES
+    ip_caplen = caplen - ETH_HEADER_BYTES
+    ip_hl = (gather_u8(data, ip) & 0xf).astype(numpy.int64) << 2
+    ip_len = gather_be16(data, ip + 2).astype(numpy.int64)
+    ip_offset = gather_be16(data, ip + 6) & IP_OFFSET_MASK
+    ip_proto = gather_u8(data, ip + 9)
+
+    # Mirror dpkt: the IP payload is truncated to the IP total length, unless
+    # that is zero (TCP segmentation offload).
+    #
+    ip_end = numpy.where(ip_len > 0, numpy.minimum(ip_len, ip_caplen), ip_caplen)
+    tcp = ip + ip_hl
+    tcp_caplen = ip_end - ip_hl
+
+    is_ethernet = numpy.broadcast_to(numpy.asarray(linktype) == LINKTYPE_ETHERNET,
+                                     caplen.shape)
+    is_ip = (caplen >= ETH_HEADER_BYTES) & (eth_type == ETH_TYPE_IP)
+    accepted = (is_ethernet &
+                is_ip &
+                (ip_caplen >= IP_HEADER_BYTES) &
+                (ip_hl >= IP_HEADER_BYTES) &
+                (ip_proto == IP_PROTO_TCP) &
+                (ip_offset == 0) &
+                (tcp_caplen >= TCP_HEADER_BYTES))
+    tcp_hl = (gather_u8(data, tcp + 12) >> 4).astype(numpy.int64) << 2
+    accepted &= tcp_hl >= TCP_HEADER_BYTES
+
+    # The TCP payload length on the wire (by which the sequence number
+    # advances), which may exceed what was captured.
+    #
+    ip_total = numpy.where(ip_len > 0, ip_len, ip_caplen)
+    payload_bytes = numpy.maximum(ip_total - ip_hl - tcp_hl, 0)
+
+    fallback = numpy.where(is_ethernet,
+                           ((caplen >= ETH_HEADER_BYTES) &
+                            ~is_ip &
+                            ~numpy.isin(eth_type, ETH_TYPES_NEVER_TCP)),
+                           True)
+
+    columns = {
+        "src_addr_ip": gather_be32(data, ip + 12),
+        "dst_addr_ip": gather_be32(data, ip + 16),
+        "src_port_tcp": gather_be16(data, tcp),
+        "dst_port_tcp": gather_be16(data, tcp + 2),
+        "seq_tcp": gather_be32(data, tcp + 4),
+        "size_bytes": caplen,
+        "payload_bytes": payload_bytes,
+    }
+    columns = {name: column.astype(COLUMNS[name])
+               for name, column in columns.items()}
+
+    for i in numpy.flatnonzero(fallback).tolist():
+        start = int(eth[i])
+        decoded = decode_frame(bytes(buf[start:start + int(caplen[i])]))
+        if decoded is None:
+            continue
+
+        for name, value in zip(("src_addr_ip", "dst_addr_ip", "src_port_tcp",
+                                "dst_port_tcp", "seq_tcp", "payload_bytes"), decoded):
+            columns[name][i] = value
+        accepted[i] = True
+
+    return columns, accepted
+
+
+def keep_host_packets(host_addr_ip, columns, accepted, packet_filter=None):
+    keep = accepted & ((columns["src_addr_ip"] == host_addr_ip) |
+                       (columns["dst_addr_ip"] == host_addr_ip))
+    if packet_filter is not None:
+        keep &= packet_filter.mask(columns)
+    return {name: column[keep] for name, column in columns.items()}
+
+
+def decode_pcap_records(host_addr_ip, buf, pcap_fmt, linktype, offsets,
+                        packet_filter=None):
+    """
+    Decodes the classic pcap records at `offsets`, keeping only the IPv4/TCP
+    packets sent or received by `host_addr_ip` (uint32) that match
+    `packet_filter`.  Records outside of its time windows are dropped from
+    the record headers alone, before their frames are looked at.
+    """
+    byte_order, ns_per_tick = pcap_fmt
+    data = numpy.frombuffer(buf, dtype=numpy.uint8)
+
+    ts_sec = gather_u32(data, offsets, byte_order).astype(numpy.int64)
+    ts_frac = gather_u32(data, offsets + 4, byte_order).astype(numpy.int64)
+    capture_time_ns = ts_sec * NSEC_PER_SEC + ts_frac * ns_per_tick
+
+    if packet_filter is not None:
+        in_time = packet_filter.time_mask(capture_time_ns)
+        offsets, capture_time_ns = offsets[in_time], capture_time_ns[in_time]
+
+    if len(offsets) == 0:
+        return empty_columns()
+
+    caplen = gather_u32(data, offsets + 8, byte_order).astype(numpy.int64)
+
+    columns, accepted = decode_frames(buf, offsets + PCAP_RECORD_HEADER_BYTES,
+                                      caplen, linktype)
+    columns["capture_time_ns"] = capture_time_ns
+
+    return keep_host_packets(host_addr_ip, columns, accepted, packet_filter)
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclasses.dataclass
+class PcapngInterface:
+    linktype: int
+    tsresol: int = PCAPNG_DEFAULT_TSRESOL
+    tsoffset_sec: int = 0
+
+    def ticks_to_ns(self, ticks):
+        """
+        Converts an array of raw (uint64) timestamps to int64 nanoseconds,
+        exactly for decimal resolutions up to 1ns and binary resolutions up
+        to 2^-33 sec.
+        """
+        ticks = ticks.astype(numpy.uint64)
+        if self.tsresol & 0x80:
+            shift = self.tsresol & 0x7f
+            if shift > 33:
+                ticks = ticks >> numpy.uint64(shift - 33)
+                shift = 33
+            sec = (ticks >> numpy.uint64(shift)).astype(numpy.int64)
+            frac = ticks & numpy.uint64((1 << shift) - 1)
+            ns = sec * NSEC_PER_SEC + ((frac * numpy.uint64(NSEC_PER_SEC)) >>
+                                       numpy.uint64(shift)).astype(numpy.int64)
+        elif self.tsresol <= 9:
+            ns = ticks.astype(numpy.int64) * (10 ** (9 - self.tsresol))
+        else:
+            ns = (ticks // numpy.uint64(10 ** (self.tsresol - 9))).astype(numpy.int64)
+
+        return ns + self.tsoffset_sec * NSEC_PER_SEC
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class PcapngState:
+    """
+    pcapng decoding state that persists across blocks: the byte order of the
+    current section and all interfaces seen so far.  Interfaces are numbered
+    globally; packet blocks refer to them relative to `section_base`.
+    """
+    def __init__(self):
+        self.byte_order = '<'
+        self.section_base = 0
+        self.interfaces = []
+
+    def start_section(self, byte_order):
+        self.byte_order = byte_order
+        self.section_base = len(self.interfaces)
+
+
+def parse_pcapng_idb(buf, off, block_len, byte_order):
+    linktype, = struct.unpack_from(byte_order + 'H', buf, off + 8)
+    interface = PcapngInterface(linktype=linktype)
+
+    opt = off + 16
+    end = off + block_len - 4
+    while opt + 4 <= end:
+        code, length = struct.unpack_from(byte_order + 'HH', buf, opt)
+        if code == PCAPNG_OPT_ENDOFOPT:
+            break
+        if code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+            interface.tsresol = buf[opt + 4]
+        elif code == PCAPNG_OPT_IF_TSOFFSET and length >= 8:
+            interface.tsoffset_sec, = struct.unpack_from(byte_order + 'q', buf, opt + 4)
+        opt += 4 + ((length + 3) & ~3)
+
+    return interface
+
+
+def scan_pcapng_blocks(buf, state, start=0):
+    """
+    Walks the pcapng blocks in `buf` from `start`, updating `state` from
+    section header and interface description blocks, and collecting the
+    frames of (enhanced or obsolete) packet blocks.
+
+    Returns (frames, caplen, interface, ticks, next_offset): per-packet arrays
+    of frame offsets, captured lengths, global interface numbers and raw
+    timestamps, and the offset of the first incomplete block.
+    """
+    frames, caplens, interfaces, ticks = [], [], [], []
+    end = len(buf)
+
+    off = start
+    while off + PCAPNG_MIN_BLOCK_BYTES <= end:
+        block_type, = struct.unpack_from(state.byte_order + 'I', buf, off)
+
+        # The section header's type reads the same in both byte orders; its
+        # byte order magic decides how to read the rest of the section.
+        #
+        byte_order = state.byte_order
+        if block_type == PCAPNG_BLOCK_SHB:
+            magic, = struct.unpack_from('<I', buf, off + 8)
+            byte_order = '<' if magic == PCAPNG_BYTE_ORDER_MAGIC else '>'
+
+        block_len, = struct.unpack_from(byte_order + 'I', buf, off + 4)
+        if block_len < PCAPNG_MIN_BLOCK_BYTES or block_len % 4:
+            raise ValueError(f"corrupt pcapng block at offset {off}")
+        if off + block_len > end:
+            break
+
+        if block_type == PCAPNG_BLOCK_SHB:
+            state.start_section(byte_order)
+
+        elif block_type == PCAPNG_BLOCK_IDB:
+            state.interfaces.append(parse_pcapng_idb(buf, off, block_len, byte_order))
+
+        elif block_type == PCAPNG_BLOCK_EPB:
+            interface, ts_high, ts_low, caplen = struct.unpack_from(
+                byte_order + 'IIII', buf, off + 8)
+            frames.append(off + 28)
+            caplens.append(caplen)
+            interfaces.append(state.section_base + interface)
+            ticks.append((ts_high << 32) | ts_low)
+
+        elif block_type == PCAPNG_BLOCK_OPB:
+            interface, _drops, ts_high, ts_low, caplen = struct.unpack_from(
+                byte_order + 'HHIII', buf, off + 8)
+            frames.append(off + 28)
+            caplens.append(caplen)
+            interfaces.append(state.section_base + interface)
+            ticks.append((ts_high << 32) | ts_low)
+
+        off += block_len
+
+    return (numpy.array(frames, dtype=numpy.int64),
+            numpy.array(caplens, dtype=numpy.int64),
+            numpy.array(interfaces, dtype=numpy.int64),
+            numpy.array(ticks, dtype=numpy.uint64),
+            off)
+
+
+def decode_pcapng_blocks(host_addr_ip, buf, state, start=0, packet_filter=None):
+    """
+    Decodes the complete pcapng blocks in `buf`, keeping only the IPv4/TCP
+    packets sent or received by `host_addr_ip` (uint32) that match
+    `packet_filter`.  Returns (columns, next_offset).
+    """
+    frames, caplen, interface, ticks, next_offset = scan_pcapng_blocks(buf, state, start)
+
+    capture_time_ns = numpy.empty(len(frames), dtype=numpy.int64)
+    for i in numpy.unique(interface).tolist():
+        mask = interface == i
+        capture_time_ns[mask] = state.interfaces[i].ticks_to_ns(ticks[mask])
+
+    if packet_filter is not None:
+        in_time = packet_filter.time_mask(capture_time_ns)
+        frames, caplen, interface, capture_time_ns = (
+            frames[in_time], caplen[in_time], interface[in_time], capture_time_ns[in_time])
+
+    if len(frames) == 0:
+        return empty_columns(), next_offset
+
+    linktypes = numpy.array([i.linktype for i in state.interfaces], dtype=numpy.int64)
+    columns, accepted = decode_frames(buf, frames, caplen, linktypes[interface])
+    columns["capture_time_ns"] = capture_time_ns
+
+    return (keep_host_packets(host_addr_ip, columns, accepted, packet_filter),
+            next_offset)
+
+
+def rows_to_columns(rows):
+    """
+    Converts (capture_time_ns, size_bytes, src_ip, dst_ip, src_port,
+    dst_port, seq, payload_bytes) rows to columns.
+    """
+    columns = empty_columns()
+    if rows:
+        for name, values in zip(("capture_time_ns", "size_bytes", "src_addr_ip",
+                                 "dst_addr_ip", "src_port_tcp", "dst_port_tcp",
+                                 "seq_tcp", "payload_bytes"),
+                                zip(*rows)):
+            columns[name] = numpy.array(values, dtype=COLUMNS[name])
+
+    return columns
+
+
+def iter_dpkt_columns(host_addr_ip, stream, batch_records=DEFAULT_BATCH_RECORDS,
+                      packet_filter=None):
+    """
+    Slow path for files the fast path doesn't understand: decodes every
+    frame with dpkt, yielding batches of at most `batch_records` packets
+    sent or received by `host_addr_ip` that match `packet_filter`.
+    """
+    def batch(rows):
+        columns = rows_to_columns(rows)
+        if packet_filter is not None:
+            keep = packet_filter.mask(columns)
+            columns = {name: column[keep] for name, column in columns.items()}
+        return columns
+
+    import dpkt
+
+    rows = []
+    for ts_sec, frame in dpkt.pcap.Reader(stream):
+        decoded = decode_frame(frame)
+        if decoded is None or host_addr_ip not in decoded[0:2]:
+            continue
+
+        rows.append((round(ts_sec * NSEC_PER_SEC), len(frame)) + decoded)
+        if len(rows) == batch_records:
+            yield batch(rows)
+            rows = []
+
+    if rows:
+        yield batch(rows)
+
+
+def concat_columns(parts):
+    parts = list(parts)
+    if not parts:
+        return empty_columns()
+
+    return {name: numpy.concatenate([part[name] for part in parts])
+            for name in COLUMNS}
+
+
+def read_pcap_columns(host_addr_ip, buf, packet_filter=None):
+    """
+    Decodes the IPv4/TCP packets sent or received by `host_addr_ip` (uint32)
+    from an in-memory (or memory-mapped) pcap or pcapng file, returning a
+    dict of numpy columns in capture order.  If given, only packets matching
+    `packet_filter` are returned.
+    """
+    pcap_fmt = pcap_format(buf)
+    if pcap_fmt is not None:
+        offsets, _next = scan_records(buf, pcap_fmt[0])
+        return decode_pcap_records(host_addr_ip, buf, pcap_fmt,
+                                   pcap_linktype(buf, pcap_fmt[0]), offsets,
+                                   packet_filter)
+
+    if is_pcapng(buf):
+        columns, _next = decode_pcapng_blocks(host_addr_ip, buf, PcapngState(),
+                                              packet_filter=packet_filter)
+        return columns
+
+    return concat_columns(iter_dpkt_columns(host_addr_ip, io.BytesIO(buf),
+                                            packet_filter=packet_filter))
+
+
+class PrefixedStream:
+    """
+    A readable stream that returns `prefix` before the rest of `stream`; lets
+    dpkt re-read a file header that has already been consumed.
+    """
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.stream.read(size)
+
+        if size is None or size < 0:
+            buf, self.prefix = self.prefix + self.stream.read(), b''
+            return buf
+
+        buf, self.prefix = self.prefix[:size], self.prefix[size:]
+        if len(buf) < size:
+            buf += self.stream.read(size - len(buf))
+        return buf
+
+
+def iter_stream_blocks(stream, pending, batch_bytes, decode):
+    """
+    Reads `stream` about `batch_bytes` at a time and yields the non-empty
+    results of `decode(buf)`, which returns (columns, next_offset).  Bytes
+    past `next_offset` (a record split across reads) are carried over to the
+    next read.
+    """
+    while True:
+        block = stream.read(batch_bytes)
+        buf = pending + block if pending else block
+
+        columns, next_offset = decode(buf)
+        if len(columns["size_bytes"]):
+            yield columns
+
+        pending = buf[next_offset:]
+        if not block:
+            break
+
+
+def iter_pcap_stream_columns(host_addr_ip, stream, batch_bytes=DEFAULT_BATCH_BYTES,
+                             packet_filter=None):
+    """
+    Generator version of read_pcap_columns for a (possibly non-seekable)
+    stream: reads about `batch_bytes` at a time and yields one dict of
+    columns per block, so memory use is bounded by the batch size rather
+    than the capture size.  Empty batches are skipped.
+    """
+    header = stream.read(PCAP_GLOBAL_HEADER_BYTES)
+
+    pcap_fmt = pcap_format(header)
+    if pcap_fmt is not None:
+        linktype = pcap_linktype(header, pcap_fmt[0])
+
+        def decode(buf):
+            offsets, next_offset = scan_records(buf, pcap_fmt[0], start=0)
+            return (decode_pcap_records(host_addr_ip, buf, pcap_fmt, linktype, offsets,
+                                        packet_filter),
+                    next_offset)
+
+        yield from iter_stream_blocks(stream, b'', batch_bytes, decode)
+
+    elif is_pcapng(header):
+        state = PcapngState()
+
+        def decode(buf):
+            return decode_pcapng_blocks(host_addr_ip, buf, state,
+                                        packet_filter=packet_filter)
+
+        yield from iter_stream_blocks(stream, header, batch_bytes, decode)
+
+    else:
+        yield from iter_dpkt_columns(host_addr_ip, PrefixedStream(header, stream),
+                                     packet_filter=packet_filter)
+
+
+def iter_pcap_file_columns(host_addr_ip, filename, batch_bytes=DEFAULT_BATCH_BYTES,
+                           packet_filter=None):
+    with open(filename, 'rb') as stream:
+        yield from iter_pcap_stream_columns(host_addr_ip, stream, batch_bytes,
+                                            packet_filter)
+
+
+def read_pcap_stream_columns(host_addr_ip, stream, packet_filter=None):
+    return concat_columns(iter_pcap_stream_columns(host_addr_ip, stream,
+                                                   packet_filter=packet_filter))
+
+
+@contextlib.contextmanager
+def map_file(filename):
+    """
+    Memory-maps `filename` read-only for the duration of the `with` block.
+    """
+    with open(filename, 'rb') as stream:
+        try:
+            buf = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped.
+            #
+            yield stream.read()
+            return
+
+        with buf:
+            yield buf
+
+
+def read_pcap_file_columns(host_addr_ip, filename, packet_filter=None):
+    """
+    Like read_pcap_columns, but memory-maps `filename` instead of reading it.
+    """
+    with map_file(filename) as buf:
+        return read_pcap_columns(host_addr_ip, buf, packet_filter)
+
+
+def read_pcap_file_range(host_addr_ip, filename, start, stop, packet_filter=None):
+    """
+    Process pool task: decodes the records of `filename` that begin in the
+    byte range [start, stop).  The first record boundary is found by
+    resynchronizing on the record headers, unless `start` is the beginning
+    of the file.
+
+    Returns (first_offset, next_offset, columns), so that the caller can
+    check that adjacent ranges met at the same record boundary.
+    """
+    with map_file(filename) as buf:
+        pcap_fmt = pcap_format(buf)
+        if start > PCAP_GLOBAL_HEADER_BYTES:
+            start = find_record_boundary(buf, pcap_fmt, start, stop)
+
+        offsets, next_offset = scan_records(buf, pcap_fmt[0], start, stop)
+        return (start, next_offset,
+                decode_pcap_records(host_addr_ip, buf, pcap_fmt,
+                                    pcap_linktype(buf, pcap_fmt[0]), offsets,
+                                    packet_filter))
+
+
+def pcap_file_ranges(filename, chunk_bytes):
+    """
+    Splits `filename` into byte ranges of about `chunk_bytes` each for
+    parallel decoding; only classic pcap files are split, others (pcapng,
+    or files the fast path can't read) return None.
+    """
+    with map_file(filename) as buf:
+        size = len(buf)
+        pcap_fmt = pcap_format(buf)
+
+    if pcap_fmt is None:
+        return None
+
+    bounds = list(range(PCAP_GLOBAL_HEADER_BYTES, size, chunk_bytes)) + [size]
+    return list(zip(bounds[:-1], bounds[1:])) or [(PCAP_GLOBAL_HEADER_BYTES, size)]
+
+
+def read_pcap_files_columns(host_files, workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES,
+                            packet_filter=None):
+    """
+    Decodes a list of (host_addr_ip, filename) captures, returning a list of
+    column dicts in the same order.
+
+    With `workers` > 1, all captures are decoded concurrently in a process
+    pool and large captures are additionally split into record-aligned byte
+    ranges of about `chunk_bytes`; the ranges of each file are reassembled
+    in file (capture-time) order, so the result is identical to decoding
+    serially.  `workers=None` uses one process per CPU.  `packet_filter` is
+    applied by the workers, so only matching packets are sent back.
+    """
+    host_files = list(host_files)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        return [read_pcap_file_columns(host_addr_ip, filename, packet_filter)
+                for host_addr_ip, filename in host_files]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for host_addr_ip, filename in host_files:
+            ranges = pcap_file_ranges(filename, chunk_bytes)
+            if ranges is None:
+                pending.append([executor.submit(read_pcap_file_columns,
+                                                host_addr_ip, filename, packet_filter)])
+            else:
+                pending.append([executor.submit(read_pcap_file_range,
+                                                host_addr_ip, filename, start, stop,
+                                                packet_filter)
+                                for start, stop in ranges])
+
+        results = []
+        for (host_addr_ip, filename), futures in zip(host_files, pending):
+            parts = [future.result() for future in futures]
+            if not isinstance(parts[0], tuple):
+                results.append(parts[0])
+                continue
+
+            # Every (non-empty) range must begin exactly where the previous
+            # one's walk over the record headers ended; otherwise a resync went
+            # wrong and the file is decoded again serially.
+            #
+            bounds = [(first, next_offset) for first, next_offset, _ in parts
+                      if first < next_offset]
+            aligned = all(prev_next == first
+                          for (_, prev_next), (first, _) in zip(bounds, bounds[1:]))
+            if aligned:
+                results.append(concat_columns(columns for _, _, columns in parts))
+            else:
+                results.append(read_pcap_file_columns(host_addr_ip, filename,
+                                                      packet_filter))
+
+        return results
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def take_columns(columns, index):
+    return {name: column[index] for name, column in columns.items()}
+
+
+def key_columns(keys):
+    """
+    Inverse of packet_keys: returns the identity columns (all of COLUMNS but
+    capture_time_ns) of a list of packed keys.
+    """
+    names = ("src_addr_ip", "dst_addr_ip", "src_port_tcp", "dst_port_tcp",
+             "seq_tcp", "size_bytes")
+    fields = list(zip(*map(unpack_packet_key, keys))) or [()] * len(names)
+
+    return {name: numpy.array(field, dtype=COLUMNS[name])
+            for name, field in zip(names, fields)}
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class PacketMatcher:
+    """
+    Pairs the sender and receiver copies of packets fed to it in (merged)
+    capture time order, holding on to a copy only until the watermark is
+    more than `window_ns` past it.
+
+    Copies of a packet are paired first in, first out; `pending` maps a
+    packed key to a deque of (entry id, role, capture_time_ns) that are all
+    of the same role, since a copy of the other role would have been paired
+    with the oldest of them.  `expiry` holds (capture_time_ns, key, entry
+    id) of every pending copy, oldest first.
+    """
+    SENDER = 0
+    RECEIVER = 1
+
+    def __init__(self, window_ns=DEFAULT_MATCH_WINDOW_NS):
+        self.window_ns = window_ns
+        self.pending = {}
+        self.expiry = collections.deque()
+        self.next_id = 0
+        self.unmatched = 0
+        self.duplicates = 0
+
+    def add(self, keys, roles, capture_time_ns, payload_bytes):
+        """
+        Feeds copies of packets, given as parallel lists, and returns the
+        (key, send_time_ns, recv_time_ns, payload_bytes) of every pair they
+        complete.
+        """
+        matched = []
+        for key, role, time_ns, payload in zip(keys, roles, capture_time_ns,
+                                               payload_bytes):
+            waiting = self.pending.get(key)
+            if waiting and waiting[0][1] != role:
+                _id, _role, other_ns = waiting.popleft()
+                if not waiting:
+                    del self.pending[key]
+                if role == PacketMatcher.RECEIVER:
+                    matched.append((key, other_ns, time_ns, payload))
+                else:
+                    matched.append((key, time_ns, other_ns, payload))
+                continue
+
+            if waiting:
+                self.duplicates += 1
+            else:
+                waiting = self.pending[key] = collections.deque()
+
+            waiting.append((self.next_id, role, time_ns))
+            self.expiry.append((time_ns, key, self.next_id))
+            self.next_id += 1
+
+        return matched
+
+    def expire(self, watermark_ns=None):
+        """
+        Drops the copies captured more than window_ns before `watermark_ns`
+        (all of them if None), counting them as unmatched.
+        """
+        while self.expiry:
+            time_ns, key, entry_id = self.expiry[0]
+            if watermark_ns is not None and time_ns >= watermark_ns - self.window_ns:
+                break
+            self.expiry.popleft()
+
+            # Copies that were paired in the meantime are skipped.
+            #
+            waiting = self.pending.get(key)
+            if waiting and waiting[0][0] == entry_id:
+                waiting.popleft()
+                if not waiting:
+                    del self.pending[key]
+                self.unmatched += 1
+
+    def pending_count(self):
+        return len(self.expiry)
+
+
+def merge_columns(host_streams):
+    """
+    K-way merges the column batches of each (host_addr_ip, iterable of
+    batches) in `host_streams` by capture time.
+
+    The watermark is the earliest capture time any host may still deliver
+    (the last time buffered for each unfinished stream); every row at or
+    before it is merged as soon as it is known, so memory is bounded by one
+    batch per host.  Yields (columns, capture_host) where capture_host is
+    the uint32 IP of the host that captured each row; the rows of a yield
+    are sorted by capture time and captured no earlier than those of the
+    previous yields.
+    """
+    hosts = [host_addr_ip for host_addr_ip, _batches in host_streams]
+    streams = [iter(batches) for _host_addr_ip, batches in host_streams]
+    buffers = [empty_columns() for _stream in streams]
+    live = [True] * len(streams)
+
+    while True:
+        for i, stream in enumerate(streams):
+            while live[i] and len(buffers[i]["capture_time_ns"]) == 0:
+                batch = next(stream, None)
+                if batch is None:
+                    live[i] = False
+                else:
+                    # Captures are mostly time ordered; sort each batch so
+                    # that it can be split at the watermark.
+                    #
+                    buffers[i] = take_columns(
+                        batch, numpy.argsort(batch["capture_time_ns"], kind='stable'))
+
+        # Every row at or before the watermark can be merged now: no stream
+        # can deliver an earlier one.
+        #
+        watermark_ns = min((int(buffers[i]["capture_time_ns"][-1])
+                            for i in range(len(streams)) if live[i]), default=None)
+
+        parts = []
+        part_hosts = []
+        for i, columns in enumerate(buffers):
+            stop = len(columns["capture_time_ns"])
+            if watermark_ns is not None:
+                stop = int(numpy.searchsorted(columns["capture_time_ns"], watermark_ns,
+                                              side='right'))
+            parts.append(take_columns(columns, slice(None, stop)))
+            part_hosts.append(numpy.full(stop, hosts[i], dtype=numpy.uint32))
+            buffers[i] = take_columns(columns, slice(stop, None))
+
+        merged = concat_columns(parts)
+        capture_host = numpy.concatenate(part_hosts)
+        order = numpy.argsort(merged["capture_time_ns"], kind='stable')
+
+        yield take_columns(merged, order), capture_host[order]
+
+        if watermark_ns is None:
+            break
+
+
+def match_columns(merged, window_ns=DEFAULT_MATCH_WINDOW_NS):
+    """
+    Pairs the sender and receiver copies of each packet of the (columns,
+    capture_host) batches of `merged`, which must be in capture time order
+    (see merge_columns), with a PacketMatcher.  The latest capture time of
+    each batch serves as the watermark: copies captured more than
+    `window_ns` before it are given up on, and whatever is still waiting
+    when `merged` runs out.
+
+    Yields (columns, unmatched, duplicates) as pairs complete: the identity
+    columns plus payload_bytes, send_time_ns and recv_time_ns of the new
+    pairs, the number of copies given up on (or captured by neither end) and
+    the number of duplicates (copies that arrived while an earlier copy of
+    the same packet and role was still waiting) since the previous yield.
+    """
+    matcher = PacketMatcher(window_ns)
+
+    def pairs(matched, unmatched, duplicates):
+        keys, send_ns, recv_ns, payload = (list(zip(*matched)) if matched
+                                           else ([], [], [], []))
+        columns = key_columns(keys)
+        columns["payload_bytes"] = numpy.array(payload, dtype=COLUMNS["payload_bytes"])
+        columns["send_time_ns"] = numpy.array(send_ns, dtype=numpy.int64)
+        columns["recv_time_ns"] = numpy.array(recv_ns, dtype=numpy.int64)
+        return (columns,
+                matcher.unmatched - unmatched,
+                matcher.duplicates - duplicates)
+
+    for columns, capture_host in merged:
+        if len(capture_host) == 0:
+            continue
+
+        role = numpy.where(capture_host == columns["src_addr_ip"], PacketMatcher.SENDER,
+                           numpy.where(capture_host == columns["dst_addr_ip"],
+                                       PacketMatcher.RECEIVER, -1))
+        bystander = role < 0
+
+        unmatched = matcher.unmatched - int(bystander.sum())
+        duplicates = matcher.duplicates
+        matched = matcher.add(packet_keys(take_columns(columns, ~bystander)),
+                              role[~bystander].tolist(),
+                              columns["capture_time_ns"][~bystander].tolist(),
+                              columns["payload_bytes"][~bystander].tolist())
+        matcher.expire(int(columns["capture_time_ns"].max()))
+
+        yield pairs(matched, unmatched, duplicates)
+
+    unmatched = matcher.unmatched
+    matcher.expire()
+    yield pairs([], unmatched, matcher.duplicates)
+
+
+def merge_join_columns(host_streams, window_ns=DEFAULT_MATCH_WINDOW_NS):
+    """
+    Streaming counterpart of matching whole captures: merges `host_streams`
+    by capture time (see merge_columns) and pairs the copies of each packet
+    as they come (see match_columns).  Memory is bounded by one batch per
+    host plus the copies within the window.
+    """
+    return match_columns(merge_columns(host_streams), window_ns)
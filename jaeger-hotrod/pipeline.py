@@ -1,53 +1,157 @@
 #=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
 # Imports
+#
+# The modules only some commands need (bootstrap, columnar, ingest_cache,
+# proto_scan, robust_stats, sketches and trace_scan) are imported by the
+# functions that use them, so that the other commands don't pay for them
+# at start-up (see tracedoppler.py startup).
+#
 
-import bisect
 import collections
 import dataclasses
-import dpkt
-import jq
+import functools
+import itertools
 import json
 import math
 import numpy
-import random
-import statistics
+import pcap_scan
 import sys
 
 from dataclasses import dataclass
-from dataclasses_json import dataclass_json
-from dpkt.utils import mac_to_str, inet_to_str
-from matplotlib import pyplot
-from typing import Optional, Any
+from pcap_scan import ip_to_int, int_to_ip
+from typing import Optional
 
 
 #=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
 # Constants
 
 USEC_PER_SEC = 1000.0 * 1000.0
+NSEC_PER_USEC = 1000
 
-TRACE_FILE = "data-2/traces-1711316915536.json"
+UINT64_MASK = (1 << 64) - 1
 
-PCAP_FILES = [
-    ("192.168.1.195", "data-2/trace.epyc3451.2024-03-24T21-30-38.pcap"),
-    ("192.168.1.187", "data-2/trace.thebeast.2024-03-24T17-30-40.pcap"),
-]
-
-HOST_TO_IP = {
-    "thebeast": "192.168.1.187",
-    "thebeast.en": "192.168.1.187",
-    "epyc3451": "192.168.1.195",
-    "epyc3451.en": "192.168.1.195",
-}
+# The capture mesh (trace file, capture hosts and their pcaps); see
+# MeshConfig.  Override with --config=FILE.
+#
+CONFIG_FILE = "hosts.json"
 
 HIST_BINS = 64
 
+# Number of processes used to decode pcap files; None means one per CPU and 1
+# decodes serially in this process.
+#
+INGEST_WORKERS = None
+
+# Decoded captures and traces are cached here between runs (see
+# ingest_cache.py), up to CACHE_MAX_BYTES.
+#
+CACHE_DIR = "output/cache"
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Skew/latency window of the streaming packet matcher (see
+# stream_traced_packets).
+#
+MATCH_WINDOW_NS = pcap_scan.DEFAULT_MATCH_WINDOW_NS
+
+# Relative accuracy of the TransmitDelta median/outlier sketch and number
+# of samples kept for plotting, per host pair (see TransmitDeltaAccumulator).
+#
+TRANSMIT_DELTA_RELATIVE_ACCURACY = 0.01
+TRANSMIT_DELTA_RESERVOIR_SIZE = 10000
+
+# Width and hop of the windows of the time-varying link bias and clock skew
+# estimates (see link_bias_series and clock_skew_series); the width must be
+# a whole number of hops.
+#
+SKEW_WINDOW_USEC = 30 * USEC_PER_SEC
+SKEW_HOP_USEC = 5 * USEC_PER_SEC
+
+# Bootstrap confidence intervals of the per-link estimates (see
+# bootstrap_link_estimates): number of replicates, confidence level, seed
+# (fixed, so that runs on the same data report the same intervals) and
+# number of processes (None: one per CPU; 1: in this process).
+#
+BOOTSTRAP_REPLICATES = 2000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 0
+BOOTSTRAP_WORKERS = None
+
+# Number of processes evaluating the configurations of a parameter sweep
+# (see sweep_link_estimates; None: one per CPU), and number of
+# configurations handed to a process at a time.
+#
+SWEEP_WORKERS = None
+SWEEP_CHUNK_CONFIGS = 16
+
+# How LinkBias.from_transmit_deltas summarizes a TransmitDelta, by name;
+# "null" is LinkBias.null() (no bias correction).
+#
+BIAS_METHODS = ("null", "mean", "median")
+
+# Formats of MeshConfig.trace_file: a Jaeger JSON export (see read_spans)
+# or a length-delimited protobuf file of OTLP or Jaeger messages (see
+# read_proto_spans).
+#
+TRACE_FORMAT_JSON = "jaeger_json"
+TRACE_FORMATS = (TRACE_FORMAT_JSON, "otlp", "jaeger_proto")
+
+# Bump whenever a change to read_spans changes what it returns.
+#
+SPAN_PARSER_VERSION = 3
+
+# read_spans converts spans to a SpanTable this many at a time, so only one
+# batch of them is ever held as TraceSpan objects.
+#
+SPAN_TABLE_BATCH = 64 * 1024
+
 
 #=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
 # Data classes
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
+@dataclass
+class MeshConfig:
+    """
+    A set of capture hosts, loaded from a JSON file of the form:
+
+        {"trace_file": TRACE_FILE,
+         "trace_format": TRACE_FORMAT,
+         "hosts": [{"ip": IP, "names": [HOST_NAME, ...], "pcap": PCAP_FILE},
+                   ...]}
+
+    `names` are the names a host may appear under in trace tags; `pcap` may
+    be omitted for hosts that weren't captured on, and `trace_file` by
+    configs only used to map host names.  `trace_format` is one of
+    TRACE_FORMATS, by default TRACE_FORMAT_JSON.
+    """
+    trace_file: Optional[str]
+    host_to_ip: dict[str, str]
+    pcap_files: list[tuple[str, str]]
+    trace_format: str = TRACE_FORMAT_JSON
+
+    def from_file(filename):
+        with open(filename, 'r') as stream:
+            config = json.load(stream)
+
+        trace_format = config.get("trace_format", TRACE_FORMAT_JSON)
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"{filename}: unknown trace_format {trace_format!r} "
+                             f"(expected one of {', '.join(TRACE_FORMATS)})")
+
+        return MeshConfig(
+            trace_file=config.get("trace_file"),
+            trace_format=trace_format,
+            host_to_ip={name: host["ip"]
+                        for host in config["hosts"]
+                        for name in host.get("names", ())},
+            pcap_files=[(host["ip"], host["pcap"])
+                        for host in config["hosts"]
+                        if host.get("pcap")])
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
 @dataclass(eq=True, frozen=True)
 class Packet:
     size_bytes: int
@@ -57,87 +161,513 @@ class Packet:
     dst_port_tcp: int
     seq_tcp: int
 
-    def from_pcap(buf):
-        eth = dpkt.ethernet.Ethernet(buf)
-        if not (isinstance(eth.data, dpkt.ip.IP) and
-                isinstance(eth.data.data, dpkt.tcp.TCP)):
-            return None
-
-        ip = eth.data
-        src_host = inet_to_str(ip.src)
-        dst_host = inet_to_str(ip.dst)
-        tcp = ip.data
-
-        return Packet(size_bytes = len(buf),
-                      src_addr_ip = src_host,
-                      dst_addr_ip = dst_host,
-                      src_port_tcp = tcp.sport,
-                      dst_port_tcp = tcp.dport,
-                      seq_tcp = tcp.seq)
-
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
 @dataclass
 class CapturedPacket:
     capture_host_ip: str
-    capture_time_usec: float
+    capture_time_ns: int
     packet: Packet
 
-    def from_pcap(capture_host_ip, ts_sec, buf):
-        return CapturedPacket(capture_host_ip = capture_host_ip,
-                              capture_time_usec = ts_sec * USEC_PER_SEC,
-                              packet = Packet.from_pcap(buf))
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class PacketTable:
+    """
+    Struct-of-arrays table of captured TCP packets; one row per frame per
+    capture host.  IPs are stored as uint32 (the numeric address value), the
+    capture host as a small categorical code indexing `capture_hosts`.
+
+    This is the representation consumed by all packet analysis stages;
+    Packet/CapturedPacket objects are only materialized (via `packet` and
+    `captured`) for printing.
+    """
+    COLUMNS = {
+        "src_addr_ip": numpy.uint32,
+        "dst_addr_ip": numpy.uint32,
+        "src_port_tcp": numpy.uint16,
+        "dst_port_tcp": numpy.uint16,
+        "seq_tcp": numpy.uint32,
+        "size_bytes": numpy.uint32,
+        "payload_bytes": numpy.uint32,
+        "capture_time_ns": numpy.int64,
+        "capture_host": numpy.uint16,
+    }
+
+    def __init__(self, capture_hosts=(), **columns):
+        self.capture_hosts = list(capture_hosts)
+        for name, dtype in PacketTable.COLUMNS.items():
+            setattr(self, name, numpy.asarray(columns.get(name, ()), dtype=dtype))
+
+    def from_columns(capture_host_ip, columns):
+        """
+        Wraps the columns decoded from a single host's capture.
+        """
+        return PacketTable([capture_host_ip],
+                           capture_host=numpy.zeros(len(columns["size_bytes"])),
+                           **columns)
+
+    def __len__(self):
+        return len(self.capture_time_ns)
+
+    def __iter__(self):
+        return (self.captured(i) for i in range(len(self)))
+
+    def columns(self):
+        return {name: getattr(self, name) for name in PacketTable.COLUMNS}
+
+    def to_bundle(self):
+        """
+        Returns the table as a dict of arrays for columnar.save.
+        """
+        return dict(self.columns(),
+                    capture_hosts=numpy.array([host.encode()
+                                               for host in self.capture_hosts],
+                                              dtype=bytes))
+
+    def from_bundle(columns):
+        return PacketTable([host.decode() for host in columns["capture_hosts"].tolist()],
+                           **{name: columns[name] for name in PacketTable.COLUMNS})
+
+    def take(self, index):
+        """
+        Returns a new table with the rows selected by `index` (an integer
+        index array or a boolean mask).
+        """
+        return PacketTable(self.capture_hosts,
+                           **{name: column[index]
+                              for name, column in self.columns().items()})
+
+    def concat(tables):
+        """
+        Concatenates tables, merging their capture host categories.
+        """
+        tables = list(tables)
+        capture_hosts = []
+        for table in tables:
+            for host in table.capture_hosts:
+                if host not in capture_hosts:
+                    capture_hosts.append(host)
+
+        columns = {}
+        for name in PacketTable.COLUMNS:
+            parts = []
+            for table in tables:
+                column = getattr(table, name)
+                if name == "capture_host":
+                    remap = numpy.array([capture_hosts.index(host)
+                                         for host in table.capture_hosts],
+                                        dtype=numpy.uint16)
+                    column = remap[column] if len(remap) else column
+                parts.append(column)
+            columns[name] = numpy.concatenate(parts) if parts else ()
+
+        return PacketTable(capture_hosts, **columns)
+
+    def capture_host_addr_ip(self):
+        """
+        Returns the uint32 IP of the capture host of each row.
+        """
+        host_ips = numpy.array([ip_to_int(host) for host in self.capture_hosts],
+                               dtype=numpy.uint32)
+        return host_ips[self.capture_host]
+
+    def flow_keys(self):
+        """
+        Returns a structured array of normalized (lo, hi) TCP endpoints, each
+        packed as (ip << 16 | port), so that both directions of a connection
+        map to the same key.
+        """
+        return pcap_scan.flow_keys(self.columns())
+
+    def flow_mask(self, flow_ids):
+        """
+        Returns a boolean mask selecting the rows belonging to any of the
+        passed TCPPacketFlowIds.
+        """
+        return numpy.isin(self.flow_keys(), TCPPacketFlowId.keys(flow_ids))
+
+    def packet(self, i):
+        return Packet(size_bytes=int(self.size_bytes[i]),
+                      src_addr_ip=int_to_ip(self.src_addr_ip[i]),
+                      dst_addr_ip=int_to_ip(self.dst_addr_ip[i]),
+                      src_port_tcp=int(self.src_port_tcp[i]),
+                      dst_port_tcp=int(self.dst_port_tcp[i]),
+                      seq_tcp=int(self.seq_tcp[i]))
+
+    def captured(self, i):
+        return CapturedPacket(
+            capture_host_ip=self.capture_hosts[self.capture_host[i]],
+            capture_time_ns=int(self.capture_time_ns[i]),
+            packet=self.packet(i))
 
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
 @dataclass
 class TracedPacket:
-    send_time_usec: float
-    recv_time_usec: float
+    send_time_ns: int
+    recv_time_ns: int
     packet: Packet
 
+    def send_time_usec(self):
+        return self.send_time_ns / NSEC_PER_USEC
+
+    def recv_time_usec(self):
+        return self.recv_time_ns / NSEC_PER_USEC
+
     def ordinal(self):
         return (
             self.packet.src_addr_ip,
             self.packet.src_port_tcp,
             self.packet.dst_addr_ip,
             self.packet.dst_port_tcp,
-            self.send_time_usec,
-            self.recv_time_usec,
+            self.send_time_ns,
+            self.recv_time_ns,
         )
 
-    def find_closest(traced_packets, src_host, src_port, dst_host, dst_port,
-                     time_usec):
-        packets = traced_packets
-        target = (src_host, src_port, dst_host, dst_port, time_usec, 0)
-        init_i = bisect.bisect(packets, target, key=TracedPacket.ordinal)
-        best_i = init_i
-        best_dt = abs(packets[best_i].send_time_usec - time_usec)
 
-        def probe(step, best_i, best_dt):
-            i = init_i + step
-            while (i >= 0 and i < len(packets) and
-                   target[:4] == packets[i].ordinal()[:4] and
-                   abs(packets[i].send_time_usec - time_usec) < best_dt):
-                best_i = i
-                best_dt = abs(packets[i].send_time_usec - time_usec)
-                i += step
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class TracedPacketTable:
+    """
+    Struct-of-arrays table of packets matched between their sender and
+    receiver captures, sorted in TracedPacket.ordinal order.  Indexing with
+    an int returns a TracedPacket view and with a slice a new table, so the
+    table can stand in for a sorted list of TracedPackets.
+
+    `unmatched` counts the captured rows that were not paired and
+    `duplicates` the extra copies of a packet captured more than once in the
+    same role (e.g. retransmissions with the same seq and size).
+    """
+    COLUMNS = {
+        "src_addr_ip": numpy.uint32,
+        "dst_addr_ip": numpy.uint32,
+        "src_port_tcp": numpy.uint16,
+        "dst_port_tcp": numpy.uint16,
+        "seq_tcp": numpy.uint32,
+        "size_bytes": numpy.uint32,
+        "payload_bytes": numpy.uint32,
+        "send_time_ns": numpy.int64,
+        "recv_time_ns": numpy.int64,
+    }
+
+    def __init__(self, unmatched=0, duplicates=0, **columns):
+        self.unmatched = unmatched
+        self.duplicates = duplicates
+        for name, dtype in TracedPacketTable.COLUMNS.items():
+            setattr(self, name, numpy.asarray(columns.get(name, ()), dtype=dtype))
+
+        # Built on first use by send_time_index() and seq_index().
+        #
+        self.send_index = None
+        self.tcp_seq_index = None
+
+    def concat(tables):
+        tables = list(tables)
+        return TracedPacketTable(
+            sum(table.unmatched for table in tables),
+            sum(table.duplicates for table in tables),
+            **{name: numpy.concatenate([getattr(table, name) for table in tables],
+                                       dtype=dtype)
+               for name, dtype in TracedPacketTable.COLUMNS.items()})
+
+    def __len__(self):
+        return len(self.send_time_ns)
+
+    def __iter__(self):
+        return (self.traced(i) for i in range(len(self)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(i)
+        return self.traced(i)
+
+    def columns(self):
+        return {name: getattr(self, name) for name in TracedPacketTable.COLUMNS}
+
+    def host_pair_counts(self):
+        """
+        Returns {HostPair: number of traced packets} for every (sender,
+        receiver) pair observed.
+        """
+        pairs, counts = numpy.unique(
+            (self.src_addr_ip.astype(numpy.uint64) << numpy.uint64(32)) |
+            self.dst_addr_ip.astype(numpy.uint64),
+            return_counts=True)
+
+        return {
+            HostPair(src_addr_ip=int_to_ip(pair >> 32),
+                     dst_addr_ip=int_to_ip(pair & 0xffffffff)): count
+            for pair, count in zip(pairs.tolist(), counts.tolist())
+        }
+
+    def send_time_index(self):
+        """
+        Returns a FlowTimeIndex of the send times of this table's rows.
+        """
+        if self.send_index is None:
+            self.send_index = FlowTimeIndex(self.src_addr_ip, self.src_port_tcp,
+                                            self.dst_addr_ip, self.dst_port_tcp,
+                                            self.send_time_ns)
+        return self.send_index
+
+    def seq_index(self):
+        """
+        Returns a TCPSeqIndex of this table's data segments.
+        """
+        if self.tcp_seq_index is None:
+            self.tcp_seq_index = TCPSeqIndex(self)
+        return self.tcp_seq_index
+
+    def sorted(self):
+        """
+        Returns this table sorted in TracedPacket.ordinal order.
+        """
+        src_rank, dst_rank = numpy.split(
+            addr_ip_str_rank(numpy.concatenate((self.src_addr_ip, self.dst_addr_ip))), 2)
+        return self.take(numpy.lexsort((self.recv_time_ns, self.send_time_ns,
+                                        (dst_rank << 16) | self.dst_port_tcp,
+                                        (src_rank << 16) | self.src_port_tcp)))
+
+    def take(self, index):
+        return TracedPacketTable(self.unmatched, self.duplicates,
+                                 **{name: column[index]
+                                    for name, column in self.columns().items()})
+
+    def traced(self, i):
+        return TracedPacket(
+            send_time_ns=int(self.send_time_ns[i]),
+            recv_time_ns=int(self.recv_time_ns[i]),
+            packet=Packet(size_bytes=int(self.size_bytes[i]),
+                          src_addr_ip=int_to_ip(self.src_addr_ip[i]),
+                          dst_addr_ip=int_to_ip(self.dst_addr_ip[i]),
+                          src_port_tcp=int(self.src_port_tcp[i]),
+                          dst_port_tcp=int(self.dst_port_tcp[i]),
+                          seq_tcp=int(self.seq_tcp[i])))
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class FlowTimeIndex:
+    """
+    Nearest-time lookup of packets by directed flow (src ip:port -> dst
+    ip:port).  Rows are grouped by flow (`offsets` is CSR into `rows`, the
+    indexed row numbers) and sorted by time within each flow, so a batch of
+    any number of (flow, time) queries takes one numpy.searchsorted over the
+    flows and one over the packed (flow, time) keys.
+    """
+    KEY_DTYPE = numpy.dtype([("src", numpy.uint64), ("dst", numpy.uint64)])
+
+    def keys(src_addr_ip, src_port_tcp, dst_addr_ip, dst_port_tcp):
+        keys = numpy.empty(len(src_addr_ip), dtype=FlowTimeIndex.KEY_DTYPE)
+        keys["src"] = ((numpy.asarray(src_addr_ip, dtype=numpy.uint64) << numpy.uint64(16)) |
+                       numpy.asarray(src_port_tcp, dtype=numpy.uint64))
+        keys["dst"] = ((numpy.asarray(dst_addr_ip, dtype=numpy.uint64) << numpy.uint64(16)) |
+                       numpy.asarray(dst_port_tcp, dtype=numpy.uint64))
+        return keys
+
+    def __init__(self, src_addr_ip, src_port_tcp, dst_addr_ip, dst_port_tcp, time):
+        time = numpy.asarray(time, dtype=numpy.int64)
+        self.flows, flow = numpy.unique(
+            FlowTimeIndex.keys(src_addr_ip, src_port_tcp, dst_addr_ip, dst_port_tcp),
+            return_inverse=True)
+        flow = flow.reshape(-1)
+
+        self.rows = numpy.lexsort((time, flow))
+        self.time = time[self.rows]
+        self.offsets = numpy.searchsorted(flow[self.rows],
+                                          numpy.arange(len(self.flows) + 1))
+
+        # Times are replaced by their rank among the distinct times, so that
+        # (flow, time) fits in a single sortable int64.
+        #
+        self.distinct_times = numpy.unique(time)
+        self.flow_times = self.pack(flow[self.rows], self.time)
+
+    def pack(self, flow, time):
+        return (flow.astype(numpy.int64) * (len(self.distinct_times) + 1) +
+                numpy.searchsorted(self.distinct_times, time))
+
+    def nearest(self, src_addr_ip, src_port_tcp, dst_addr_ip, dst_port_tcp, time):
+        """
+        For each query, returns the indexed row of its flow whose time is
+        closest to the query's (the later one on ties), or -1 if the flow
+        has no rows, and the absolute time difference, as two int64 columns.
+        """
+        time = numpy.asarray(time, dtype=numpy.int64)
+        keys = FlowTimeIndex.keys(src_addr_ip, src_port_tcp, dst_addr_ip, dst_port_tcp)
+
+        flow = numpy.searchsorted(self.flows, keys)
+        found = flow < len(self.flows)
+        found[found] = self.flows[flow[found]] == keys[found]
+        flow = numpy.where(found, flow, 0)
+
+        row = numpy.full(len(time), -1, dtype=numpy.int64)
+        dt = numpy.zeros(len(time), dtype=numpy.int64)
+        if len(self.rows) == 0:
+            return row, dt
+
+        # First row of the flow at or after the query time.
+        #
+        after = numpy.searchsorted(self.flow_times, self.pack(flow, time))
+        has_after = found & (after < self.offsets[flow + 1])
+        has_before = found & (after > self.offsets[flow])
+
+        before = numpy.maximum(after - 1, 0)
+        after = numpy.minimum(after, len(self.rows) - 1)
+        dt_after = self.time[after] - time
+        dt_before = time - self.time[before]
+
+        use_before = has_before & (~has_after | (dt_before < dt_after))
+        has_any = has_before | has_after
+
+        row[has_any] = self.rows[numpy.where(use_before, before, after)][has_any]
+        dt[has_any] = numpy.where(use_before, dt_before, dt_after)[has_any]
+        return row, dt
+
 
-            return best_i, best_dt
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class TCPSeqIndex:
+    """
+    Maps the TCP byte-sequence ranges of each direction of each connection
+    (TCPPacketFlowId) to the traced data segments carrying them, so that an
+    application message can be resolved to its first and last wire segment.
+
+    Sequence numbers are unwrapped to 64 bits relative to the first data
+    segment of each direction.  A message is a run of new bytes in one
+    direction: it starts at a data segment sent after data from the other
+    direction (or at the first data of the connection), and ends where the
+    next message in the same direction starts.  This fits request/response
+    protocols, including back-to-back RPCs on a keep-alive connection.
+    """
+    def __init__(self, traced_packets):
+        self.traced_packets = traced_packets
 
-        best_i, best_dt = probe(-1, best_i, best_dt)
-        best_i, best_dt = probe(1, best_i, best_dt)
+        data = numpy.flatnonzero(traced_packets.payload_bytes > 0)
+        send_time_ns = traced_packets.send_time_ns[data]
+        keys = FlowTimeIndex.keys(traced_packets.src_addr_ip[data],
+                                  traced_packets.src_port_tcp[data],
+                                  traced_packets.dst_addr_ip[data],
+                                  traced_packets.dst_port_tcp[data])
 
-        return packets[best_i], best_dt
+        # Data segments of each direction, in send order.
+        #
+        self.flows, flow = numpy.unique(keys, return_inverse=True)
+        flow = flow.reshape(-1)
+        order = numpy.lexsort((send_time_ns, flow))
+        self.rows = data[order]
+        flow = flow[order]
+        first = numpy.ones(len(flow), dtype=bool)
+        first[1:] = flow[1:] != flow[:-1]
+
+        seq = traced_packets.seq_tcp[self.rows].astype(numpy.int64)
+        step = numpy.zeros(len(seq), dtype=numpy.int64)
+        step[1:] = ((seq[1:] - seq[:-1] + (1 << 31)) % (1 << 32)) - (1 << 31)
+        step[first] = 0
+        offset = numpy.cumsum(step)
+        self.start = offset - offset[numpy.flatnonzero(first)][numpy.cumsum(first) - 1]
+        self.end = self.start + traced_packets.payload_bytes[self.rows]
+
+        # Whether each segment carries bytes beyond all earlier ones of its
+        # direction (i.e. isn't a retransmission).
+        #
+        self.seq_span = int(self.end.max(initial=0)) + 1
+        packed_end = flow * self.seq_span + self.end
+        prior_end = numpy.maximum.accumulate(packed_end)
+        prior_end = numpy.concatenate(([0], prior_end[:-1])) - flow * self.seq_span
+        prior_end[first] = 0
+        is_new = first | (self.start >= prior_end)
+
+        # Direction changes, from the data of both directions in send order.
+        #
+        conn = pcap_scan.flow_keys(traced_packets.take(self.rows).columns())
+        by_conn = numpy.lexsort((traced_packets.send_time_ns[self.rows], conn["hi"],
+                                 conn["lo"]))
+        turn = numpy.ones(len(by_conn), dtype=bool)
+        turn[1:] = ((conn[by_conn][1:] != conn[by_conn][:-1]) |
+                    (flow[by_conn][1:] != flow[by_conn][:-1]))
+        starts_message = numpy.zeros(len(flow), dtype=bool)
+        starts_message[by_conn] = turn
+        starts_message &= is_new
+
+        # Messages of each direction, in send order: first segment (index
+        # into rows) and sequence range.
+        #
+        self.message_first = numpy.flatnonzero(starts_message)
+        message_flow = flow[self.message_first]
+        self.message_start = self.start[self.message_first]
+        self.message_end = numpy.empty(len(self.message_first), dtype=numpy.int64)
+        self.message_end[:-1] = self.message_start[1:]
+        last = numpy.ones(len(self.message_first), dtype=bool)
+        last[:-1] = message_flow[1:] != message_flow[:-1]
+        flow_end = numpy.maximum.reduceat(self.end, numpy.flatnonzero(first)) \
+            if len(flow) else self.end
+        self.message_end[last] = flow_end[message_flow[last]]
+
+        first_rows = self.rows[self.message_first]
+        self.message_index = FlowTimeIndex(traced_packets.src_addr_ip[first_rows],
+                                           traced_packets.src_port_tcp[first_rows],
+                                           traced_packets.dst_addr_ip[first_rows],
+                                           traced_packets.dst_port_tcp[first_rows],
+                                           traced_packets.send_time_ns[first_rows])
+        self.message_flow = message_flow.astype(numpy.int64)
+
+        # Segments of each direction by (start, send time), for byte lookups.
+        #
+        self.by_seq = numpy.lexsort((send_time_ns[order], self.start, flow))
+        self.packed_start = flow[self.by_seq] * self.seq_span + self.start[self.by_seq]
+
+    def segment_at(self, flow, byte):
+        """
+        Returns the index into `rows` of the first-sent segment carrying
+        sequence offset `byte` of direction `flow` (int64 arrays), or -1.
+        """
+        segment = numpy.full(len(flow), -1, dtype=numpy.int64)
+        if len(self.packed_start) == 0:
+            return segment
+
+        # The last segment starting at or before `byte`, then the first sent
+        # of those starting at the same offset.
+        #
+        packed = flow * self.seq_span + byte
+        j = numpy.searchsorted(self.packed_start, packed, side='right') - 1
+        found = j >= 0
+        j = numpy.searchsorted(self.packed_start, self.packed_start[numpy.maximum(j, 0)])
+
+        candidate = self.by_seq[j]
+        found &= ((self.packed_start[j] // self.seq_span == flow) &
+                  (self.end[candidate] > byte))
+        segment[found] = candidate[found]
+        return segment
+
+    def messages(self, src_addr_ip, src_port_tcp, dst_addr_ip, dst_port_tcp, time_ns):
+        """
+        For each query, finds the message of its direction whose first
+        segment was sent closest to `time_ns`, returning the traced packet
+        rows of its first and last segments (-1 if there is none).
+        """
+        message, _dt = self.message_index.nearest(src_addr_ip, src_port_tcp,
+                                                  dst_addr_ip, dst_port_tcp, time_ns)
+        first = numpy.full(len(message), -1, dtype=numpy.int64)
+        last = numpy.full(len(message), -1, dtype=numpy.int64)
+
+        found = numpy.flatnonzero(message >= 0)
+        message = message[found]
+        last_segment = self.segment_at(self.message_flow[message],
+                                       self.message_end[message] - 1)
+
+        found = found[last_segment >= 0]
+        message = message[last_segment >= 0]
+        first[found] = self.rows[self.message_first[message]]
+        last[found] = self.rows[last_segment[last_segment >= 0]]
+        return first, last
 
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
 @dataclass
 class PacketSpacing:
     """
@@ -169,7 +699,49 @@ class PacketSpacing:
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
+class PacketSpacingSampler:
+    """
+    Computes the two-packet samples of packet_spacing_samples over PacketTable
+    batches merged by capture time (see iter_pcap_files), carrying over from
+    one batch to the next only the rows later samples may still need: the
+    copies captured within `window_ns` of the latest batch, the previous
+    sender copy of each host pair, and the receiver copies of the carried
+    sender copies.
+
+    A sample is final once pkt2 was sent more than `window_ns` before the
+    latest capture time: as for pcap_scan.PacketMatcher, every copy of a
+    packet is assumed to be captured within `window_ns` of the others.  Two
+    packets whose identities show up again after that (e.g. pure ACKs, which
+    repeat the same seq and size) make a new sample rather than replacing
+    the first.
+    """
+    def __init__(self, window_ns=MATCH_WINDOW_NS):
+        self.window_ns = window_ns
+        self.carried = PacketTable()
+
+    def add(self, batch):
+        """
+        Feeds a batch, returning the samples it completes (in the same
+        columns as packet_spacing_samples).
+        """
+        if len(batch) == 0:
+            return spacing_samples(batch)[0]
+
+        horizon_ns = int(batch.capture_time_ns.max()) - self.window_ns
+        samples, self.carried = spacing_samples(PacketTable.concat((self.carried, batch)),
+                                                horizon_ns)
+        return samples
+
+    def finish(self):
+        """
+        Returns the samples still pending once every batch has been fed.
+        """
+        samples, self.carried = spacing_samples(self.carried)
+        return samples
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
 @dataclass(eq=True, frozen=True)
 class HostPair:
     """
@@ -189,7 +761,6 @@ class HostPair:
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
 @dataclass
 class TransmitDelta:
     """
@@ -202,30 +773,119 @@ class TransmitDelta:
     stdev: float
     samples: list[tuple[float, int, int]]  # (usec_time, pkt1_size, pkt2_size)
 
+    # Number of samples summarized (samples may be a subset of them).
+    #
+    count: int = 0
+
     def from_samples(packet_spacings, outlier_sigmas=3):
+        import robust_stats
+
         if len(packet_spacings) == 0:
             return None
 
         samples = sorted([(x.delta(), x.pkt1_size, x.pkt2_size)
                           for x in packet_spacings])
 
-        sigma = statistics.stdev(delta for delta, _, _ in samples)
-        median = statistics.median(delta for delta, _, _ in samples)
-
         # Remove outliers.
         #
-        samples = [(delta, pkt1_size, pkt2_size) for delta, pkt1_size, pkt2_size in samples
-                   if abs(delta - median) < sigma * outlier_sigmas]
+        summary = robust_stats.sigma_clip([delta for delta, _, _ in samples],
+                                          outlier_sigmas)
+        samples = [sample for sample, kept in zip(samples, summary.kept.tolist())
+                   if kept]
+
+        return TransmitDelta(mean=summary.mean,
+                            median=summary.median,
+                            stdev=summary.stdev,
+                            samples=samples,
+                            count=summary.count)
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class TransmitDeltaAccumulator:
+    """
+    Online summary of the two-packets samples of one host pair, from which
+    a TransmitDelta is computed without retaining every sample:
+
+     - Moments of all the samples, for the sigma of the outlier bounds;
+     - a QuantileSketch, for the medians and the outlier bounds.  The
+       sigma-clip subtracts the moments of the sketch's buckets outside the
+       bounds from those of all the samples, so it needs no second pass
+       and only the bucket straddling each bound is approximated;
+     - a Reservoir of (delta, pkt1 size, pkt2 size) rows, kept only for the
+       scatter plots (reservoir_size=None keeps them all).
+
+    Accumulators of different shards or time windows of the same host pair
+    merge losslessly.  With relative_accuracy=None and an unbounded
+    reservoir the result is the same as TransmitDelta.from_samples.
+    """
+    def __init__(self, relative_accuracy=TRANSMIT_DELTA_RELATIVE_ACCURACY,
+                 reservoir_size=TRANSMIT_DELTA_RESERVOIR_SIZE, seed=None):
+        import sketches
+
+        self.moments = sketches.Moments()
+        self.quantiles = sketches.QuantileSketch(relative_accuracy)
+        self.reservoir = sketches.Reservoir(reservoir_size, seed)
+
+    def add(self, deltas, pkt1_sizes, pkt2_sizes):
+        self.moments.add(deltas)
+        self.quantiles.add(deltas)
+        self.reservoir.add(deltas, pkt1_sizes, pkt2_sizes)
+        return self
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.quantiles.merge(other.quantiles)
+        self.reservoir.merge(other.reservoir)
+        return self
+
+    def transmit_delta(self, outlier_sigmas=3):
+        """
+        Returns the TransmitDelta of the samples so far, or None if there
+        are fewer than two (no stdev).
+        """
+        import sketches
+
+        if self.moments.count < 2:
+            return None
+
+        sigma = self.moments.stdev()
+        median = self.quantiles.median()
+
+        # Remove outliers, as remove_outliers does: the bounds are median ±
+        # sigma·outlier_sigmas, and whole sketch buckets are kept or dropped
+        # by their bucket mean.  The moments of the dropped buckets (taken
+        # relative to the mean of all samples) are subtracted from the total.
+        #
+        means, counts, m2s = self.quantiles.buckets()
+        inlier = numpy.abs(means - median) < sigma * outlier_sigmas
+        outlier_means = means[~inlier] - self.moments.mean
+        outlier_counts = counts[~inlier]
+
+        count = self.moments.count - int(outlier_counts.sum())
+        if count < 2:
+            return None
+
+        shift = -float((outlier_means * outlier_counts).sum())
+        m2 = (self.moments.m2 - float(m2s[~inlier].sum()) -
+              float((numpy.square(outlier_means) * outlier_counts).sum()) -
+              shift * shift / count)
 
-        return TransmitDelta(mean=statistics.mean(delta for delta, _, _ in samples),
-                            median=statistics.median(delta for delta, _, _ in samples),
-                            stdev=statistics.stdev(delta for delta, _, _ in samples),
-                            samples=samples)
+        deltas, pkt1_sizes, pkt2_sizes = self.reservoir.columns
+        shown = numpy.abs(deltas - median) < sigma * outlier_sigmas
+        order = numpy.lexsort((pkt2_sizes[shown], pkt1_sizes[shown], deltas[shown]))
+
+        return TransmitDelta(mean=self.moments.mean + shift / count,
+                            median=sketches.weighted_median(means[inlier], counts[inlier]),
+                            stdev=math.sqrt(max(m2, 0.0) / (count - 1)),
+                            samples=list(zip(deltas[shown][order].tolist(),
+                                             pkt1_sizes[shown][order].tolist(),
+                                             pkt2_sizes[shown][order].tolist())),
+                            count=count)
 
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
 @dataclass
 class TraceSpan:
     trace_id: str
@@ -238,9 +898,9 @@ class TraceSpan:
     peer_host: str
     peer_port: int
 
-    def from_raw_span(span):
-        span_tags = tags_to_dict(span["tags"])
-        process_tags = tags_to_dict(span["process"]["tags"])
+    def from_raw_span(span, host_to_ip=None):
+        host, kind, peer_host, peer_port = span_endpoints(
+            tags_to_dict(span["tags"]), tags_to_dict(span["process"]["tags"]), host_to_ip)
 
         return TraceSpan(
             trace_id=span["traceID"],
@@ -248,19 +908,226 @@ class TraceSpan:
             start_time_usec=float(span["startTime"]),
             end_time_usec=float(span["startTime"]) + float(span["duration"]),
             children=span["childSpanIds"],
-            host=normalize_host(process_tags.get("host.name")),
-            kind=span_tags.get("span.kind"),
-            peer_host=normalize_host(span_tags.get("net.peer.name") or
-                                     span_tags.get("net.sock.peer.addr")),
-            peer_port=int(span_tags.get("net.peer.port") or
-                          span_tags.get("net.sock.peer.port") or
-                          0)
+            host=host,
+            kind=kind,
+            peer_host=peer_host,
+            peer_port=peer_port
+        )
+
+    def from_record(record):
+        """
+        Returns the TraceSpan of a span record (see span_record).
+        """
+        return TraceSpan(
+            trace_id=record["traceID"],
+            span_id=record["spanID"],
+            start_time_usec=float(record["startTime"]),
+            end_time_usec=float(record["endTime"]),
+            children=record["children"],
+            host=record["host"],
+            kind=record["kind"],
+            peer_host=record["peer.host"],
+            peer_port=int(record["peer.port"] or 0)
         )
 
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
+class SpanTable:
+    """
+    Struct-of-arrays table of trace spans.  Indexing with an int returns a
+    TraceSpan and with a slice a new table, so the table can stand in for a
+    list of TraceSpans; TraceSpan objects are only materialized on demand.
+
+    Hex IDs are stored as integers: span IDs as uint64 and trace IDs (up to
+    128 bits) as their high and low uint64 halves, materialized in Jaeger's
+    canonical form (see format_trace_id).  `host` and `peer_host` are codes
+    indexing `hosts`, and `kind` a code indexing `kinds` (None being a
+    category like any other).  The child span IDs of row i are
+    children[children_offsets[i]:children_offsets[i + 1]].
+    """
+    COLUMNS = {
+        "trace_id_high": numpy.uint64,
+        "trace_id_low": numpy.uint64,
+        "span_id": numpy.uint64,
+        "start_time_usec": numpy.float64,
+        "end_time_usec": numpy.float64,
+        "host": numpy.uint32,
+        "kind": numpy.uint16,
+        "peer_host": numpy.uint32,
+        "peer_port": numpy.uint16,
+    }
+
+    def __init__(self, hosts=(), kinds=(), children=(), children_offsets=(0,),
+                 **columns):
+        self.hosts = list(hosts)
+        self.kinds = list(kinds)
+        self.children = numpy.asarray(children, dtype=numpy.uint64)
+        self.children_offsets = numpy.asarray(children_offsets, dtype=numpy.int64)
+        for name, dtype in SpanTable.COLUMNS.items():
+            setattr(self, name, numpy.asarray(columns.get(name, ()), dtype=dtype))
+
+    def from_trace_spans(spans):
+        spans = list(spans)
+        hosts = {}
+        kinds = {}
+        trace_ids = [int(span.trace_id, 16) for span in spans]
+
+        return SpanTable(
+            hosts, kinds,
+            children=[int(child, 16) for span in spans for child in span.children],
+            children_offsets=numpy.cumsum([0] + [len(span.children) for span in spans]),
+            trace_id_high=[trace_id >> 64 for trace_id in trace_ids],
+            trace_id_low=[trace_id & UINT64_MASK for trace_id in trace_ids],
+            span_id=[int(span.span_id, 16) for span in spans],
+            start_time_usec=[span.start_time_usec for span in spans],
+            end_time_usec=[span.end_time_usec for span in spans],
+            host=[hosts.setdefault(span.host, len(hosts)) for span in spans],
+            kind=[kinds.setdefault(span.kind, len(kinds)) for span in spans],
+            peer_host=[hosts.setdefault(span.peer_host, len(hosts)) for span in spans],
+            peer_port=[span.peer_port for span in spans])
+
+    def from_proto_spans(spans, host_to_ip=None):
+        """
+        Returns a table of proto_scan.ProtoSpans, without children (see
+        span_children); spans whose tags weren't decoded have no kind or
+        peer.
+        """
+        spans = list(spans)
+        hosts = {}
+        kinds = {}
+        endpoints = [span_endpoints(span.span_tags or {}, span.process_tags, host_to_ip)
+                     for span in spans]
+
+        return SpanTable(
+            hosts, kinds,
+            children_offsets=numpy.zeros(len(spans) + 1),
+            trace_id_high=[span.trace_id >> 64 for span in spans],
+            trace_id_low=[span.trace_id & UINT64_MASK for span in spans],
+            span_id=[span.span_id for span in spans],
+            start_time_usec=[float(span.start_time_usec) for span in spans],
+            end_time_usec=[float(span.start_time_usec) + float(span.duration_usec)
+                           for span in spans],
+            host=[hosts.setdefault(host, len(hosts)) for host, _, _, _ in endpoints],
+            kind=[kinds.setdefault(kind, len(kinds)) for _, kind, _, _ in endpoints],
+            peer_host=[hosts.setdefault(peer_host, len(hosts))
+                       for _, _, peer_host, _ in endpoints],
+            peer_port=[peer_port for _, _, _, peer_port in endpoints])
+
+    def __len__(self):
+        return len(self.span_id)
+
+    def __iter__(self):
+        return (self.span(i) for i in range(len(self)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(i)
+        return self.span(i)
+
+    def columns(self):
+        return {name: getattr(self, name) for name in SpanTable.COLUMNS}
+
+    def to_bundle(self):
+        """
+        Returns the table as a dict of arrays for columnar.save (children
+        and categories laid out as in columnar.records_to_columns).
+        """
+        import columnar
+
+        bundle = dict(self.columns(), children=self.children)
+        bundle["children:offsets"] = self.children_offsets
+        for name in ("hosts", "kinds"):
+            bundle[name], null = columnar.values_to_column(getattr(self, name))
+            if null is not None:
+                bundle[name + ":null"] = null
+        return bundle
+
+    def from_bundle(columns):
+        import columnar
+
+        categories = {}
+        for name in ("hosts", "kinds"):
+            values = columnar.column_values(columns[name])
+            if name + ":null" in columns:
+                values = [None if null else value
+                          for value, null in zip(values, columns[name + ":null"].tolist())]
+            categories[name] = values
+
+        return SpanTable(categories["hosts"], categories["kinds"],
+                         children=columns["children"],
+                         children_offsets=columns["children:offsets"],
+                         **{name: columns[name] for name in SpanTable.COLUMNS})
+
+    def take(self, index):
+        """
+        Returns a new table with the rows selected by `index` (a slice, an
+        integer index array or a boolean mask).
+        """
+        rows = numpy.arange(len(self))[index]
+        begins = self.children_offsets[rows]
+        counts = self.children_offsets[rows + 1] - begins
+        offsets = numpy.concatenate(([0], numpy.cumsum(counts)))
+        flat = numpy.repeat(begins - offsets[:-1], counts) + numpy.arange(offsets[-1])
+
+        return SpanTable(self.hosts, self.kinds,
+                         children=self.children[flat],
+                         children_offsets=offsets,
+                         **{name: column[rows]
+                            for name, column in self.columns().items()})
+
+    def concat(tables):
+        """
+        Concatenates tables, merging their host and kind categories.
+        """
+        tables = list(tables)
+        hosts = {}
+        kinds = {}
+        columns = {name: [] for name in SpanTable.COLUMNS}
+        children = []
+        children_offsets = [numpy.zeros(1, dtype=numpy.int64)]
+        child_count = 0
+
+        for table in tables:
+            host_codes = numpy.array([hosts.setdefault(host, len(hosts))
+                                      for host in table.hosts], dtype=numpy.uint32)
+            kind_codes = numpy.array([kinds.setdefault(kind, len(kinds))
+                                      for kind in table.kinds], dtype=numpy.uint16)
+            for name, column in table.columns().items():
+                if len(column) and name in ("host", "peer_host"):
+                    column = host_codes[column]
+                elif len(column) and name == "kind":
+                    column = kind_codes[column]
+                columns[name].append(column)
+
+            children.append(table.children)
+            children_offsets.append(table.children_offsets[1:] + child_count)
+            child_count += len(table.children)
+
+        return SpanTable(hosts, kinds,
+                         children=numpy.concatenate(children) if children else (),
+                         children_offsets=numpy.concatenate(children_offsets),
+                         **{name: numpy.concatenate(parts) if parts else ()
+                            for name, parts in columns.items()})
+
+    def span(self, i):
+        i = range(len(self))[i]
+        begin, end = self.children_offsets[i], self.children_offsets[i + 1]
+
+        return TraceSpan(
+            trace_id=format_trace_id(int(self.trace_id_high[i]), int(self.trace_id_low[i])),
+            span_id=format_span_id(int(self.span_id[i])),
+            start_time_usec=float(self.start_time_usec[i]),
+            end_time_usec=float(self.end_time_usec[i]),
+            children=[format_span_id(child) for child in self.children[begin:end].tolist()],
+            host=self.hosts[self.host[i]],
+            kind=self.kinds[self.kind[i]],
+            peer_host=self.hosts[self.peer_host[i]],
+            peer_port=int(self.peer_port[i]))
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
 @dataclass
 class LinkBias:
     query_bias: float
@@ -286,7 +1153,88 @@ class LinkBias:
 
 #==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
 #
-@dataclass_json
+@dataclass
+class TimeSeries:
+    """
+    An estimate computed over successive time windows, sampled at the
+    middle of each window; `at` interpolates linearly between samples and
+    holds the first/last value beyond the ends.
+    """
+    time_usec: numpy.ndarray
+    value: numpy.ndarray
+
+    def at(self, time_usec):
+        return numpy.interp(time_usec, self.time_usec, self.value)
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclass
+class LinkIntervals:
+    """
+    Bootstrap confidence intervals of the whole-capture estimates of one
+    link (see bootstrap_link_estimates), with the number of RPCs and of
+    two-packets samples in each direction they are computed from.
+    """
+    query_bias: "bootstrap.ConfidenceInterval"
+    clock_skew: "bootstrap.ConfidenceInterval"
+    query_cost: "bootstrap.ConfidenceInterval"
+    reply_cost: "bootstrap.ConfidenceInterval"
+    rpc_count: int
+    query_samples: int
+    reply_samples: int
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclass
+class SweepGrid:
+    """
+    The settings of the per-link estimates swept by sweep_link_estimates,
+    each a sequence of the values to try; every combination is evaluated.
+
+     - outlier_sigmas: sigma-clip of the two-packets TransmitDeltas;
+     - cost_outlier_sigmas: sigma-clip of the query/reply costs;
+     - bias_methods: names in BIAS_METHODS;
+     - packets: names of the packet sets the TransmitDeltas are taken from
+       (e.g. "all" or "rpc" packets);
+     - timestamps: names of the RPC timestamp sources (e.g. "raw" span
+       times or "pts", packet-timestamp corrected).
+
+    The names are checked on construction against BIAS_METHODS and the
+    packet sets and timestamp sources the caller can supply
+    (packet_names and timestamp_names), so that a typo fails before any
+    capture is decoded.
+    """
+    outlier_sigmas: tuple = (3,)
+    cost_outlier_sigmas: tuple = (20,)
+    bias_methods: tuple = BIAS_METHODS
+    packets: tuple = ("all", "rpc")
+    timestamps: tuple = ("raw", "pts")
+    packet_names: tuple = ("all", "rpc")
+    timestamp_names: tuple = ("raw", "pts")
+
+    def __post_init__(self):
+        for setting, names, allowed in (("bias method", self.bias_methods, BIAS_METHODS),
+                                        ("packets", self.packets, self.packet_names),
+                                        ("timestamps", self.timestamps,
+                                         self.timestamp_names)):
+            unknown = [name for name in names if name not in allowed]
+            if unknown:
+                raise ValueError(f"unknown {setting} {', '.join(map(repr, unknown))}; "
+                                 f"expected some of {tuple(allowed)}")
+
+    def configs(self):
+        """
+        Returns every combination of the settings, as a list of (outlier
+        sigmas, cost outlier sigmas, bias method, packets, timestamps).
+        """
+        return list(itertools.product(self.outlier_sigmas, self.cost_outlier_sigmas,
+                                      self.bias_methods, self.packets, self.timestamps))
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
 @dataclass
 class TraceRPC:
     link: HostPair
@@ -322,395 +1270,2094 @@ class TraceRPC:
     #
     # Assuming Cq = Cr,
     #
-    # C = ((Rq - Sq) + e) / Bq
-    # C = ((Rr - Sr) - e) / Br
-    # ((Rq - Sq) + e) / Bq  = ((Rr - Sr) - e) / Br
-    # ((Rq - Sq) + e) * Br  = ((Rr - Sr) - e) * Bq
-    # ((Rq - Sq) * Br + e * Br  = ((Rr - Sr) * Bq - e * Bq
-    # e * Br + e * Bq  = (Rr - Sr) * Bq -(Rq - Sq) * Br
-    # e * (Br + Bq)  = (Rr - Sr) * Bq - (Rq - Sq) * Br
-    # e * 2  = (Rr - Sr) * Bq - (Rq - Sq) * Br
+    # C = ((Rq - Sq) + e) / Bq
+    # C = ((Rr - Sr) - e) / Br
+    # ((Rq - Sq) + e) / Bq  = ((Rr - Sr) - e) / Br
+    # ((Rq - Sq) + e) * Br  = ((Rr - Sr) - e) * Bq
+    # ((Rq - Sq) * Br + e * Br  = ((Rr - Sr) * Bq - e * Bq
+    # e * Br + e * Bq  = (Rr - Sr) * Bq -(Rq - Sq) * Br
+    # e * (Br + Bq)  = (Rr - Sr) * Bq - (Rq - Sq) * Br
+    # e * 2  = (Rr - Sr) * Bq - (Rq - Sq) * Br
+    #
+    # Therefore:
+    # e = (((Rr - Sr) * Bq - ((Rq - Sq) * Br) / 2
+    #
+
+    def query_latency_usec(self):
+        return self.query_recv_time_usec - self.query_send_time_usec
+
+    def reply_latency_usec(self):
+        return self.reply_recv_time_usec - self.reply_send_time_usec
+
+    def query_cost(self, clock_skew, link_bias):
+        return (self.query_latency_usec() + clock_skew) / link_bias.query_bias
+
+    def reply_cost(self, clock_skew, link_bias):
+        return (self.reply_latency_usec() - clock_skew) / link_bias.reply_bias
+
+    def estimate_clock_skew(self, link_bias):
+        return (self.reply_latency_usec() * link_bias.query_bias -
+                self.query_latency_usec() * link_bias.reply_bias) / 2.0
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class TraceRPCTable:
+    """
+    Struct-of-arrays table of TraceRPCs, as made by rpcs_from_trace_spans
+    out of a SpanTable.  Like SpanTable, indexing with an int returns a
+    TraceRPC and with a slice a new table, so the table can stand in for a
+    list of TraceRPCs.  Span IDs are integers and `client_host` and
+    `server_host` codes indexing `hosts` (see SpanTable).
+    """
+    COLUMNS = {
+        "client_span": numpy.uint64,
+        "server_span": numpy.uint64,
+        "client_host": numpy.uint32,
+        "client_port": numpy.uint16,
+        "server_host": numpy.uint32,
+        "server_port": numpy.uint16,
+        "query_send_time_usec": numpy.float64,
+        "query_recv_time_usec": numpy.float64,
+        "reply_send_time_usec": numpy.float64,
+        "reply_recv_time_usec": numpy.float64,
+    }
+
+    def __init__(self, hosts=(), **columns):
+        self.hosts = list(hosts)
+        for name, dtype in TraceRPCTable.COLUMNS.items():
+            setattr(self, name, numpy.asarray(columns.get(name, ()), dtype=dtype))
+
+    def __len__(self):
+        return len(self.client_span)
+
+    def __iter__(self):
+        return (self.rpc(i) for i in range(len(self)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(i)
+        return self.rpc(i)
+
+    def columns(self):
+        return {name: getattr(self, name) for name in TraceRPCTable.COLUMNS}
+
+    def take(self, index):
+        """
+        Returns a new table with the rows selected by `index` (a slice, an
+        integer index array or a boolean mask).
+        """
+        return TraceRPCTable(self.hosts,
+                             **{name: column[index]
+                                for name, column in self.columns().items()})
+
+    def rpc(self, i):
+        i = range(len(self))[i]
+        client_host = self.hosts[self.client_host[i]]
+        server_host = self.hosts[self.server_host[i]]
+
+        return TraceRPC(
+            link=HostPair(src_addr_ip=client_host, dst_addr_ip=server_host),
+            client_span=format_span_id(int(self.client_span[i])),
+            server_span=format_span_id(int(self.server_span[i])),
+            client_host=client_host,
+            client_port=int(self.client_port[i]),
+            server_host=server_host,
+            server_port=int(self.server_port[i]),
+            query_send_time_usec=float(self.query_send_time_usec[i]),
+            query_recv_time_usec=float(self.query_recv_time_usec[i]),
+            reply_send_time_usec=float(self.reply_send_time_usec[i]),
+            reply_recv_time_usec=float(self.reply_recv_time_usec[i]))
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclass(eq=True, order=True, frozen=True)
+class TCPPacketFlowId:
+    """
+    A four-tuple of (ip:port,ip:port) representing a TCP connection;
+    normalized so that the first ip:port pair is less-than the second.
+    """
+    first_addr_ip: str
+    first_port_tcp: int
+    second_addr_ip: str
+    second_port_tcp: int
+
+    def from_endpoints(first_addr_ip, first_port_tcp, second_addr_ip, second_port_tcp):
+        if (first_addr_ip, first_port_tcp) > (second_addr_ip, second_port_tcp):
+            first_addr_ip, second_addr_ip = second_addr_ip, first_addr_ip
+            first_port_tcp, second_port_tcp = second_port_tcp, first_port_tcp
+
+        return TCPPacketFlowId(first_addr_ip=first_addr_ip,
+                               first_port_tcp=first_port_tcp,
+                               second_addr_ip=second_addr_ip,
+                               second_port_tcp=second_port_tcp)
+
+    def from_packet(packet):
+        return TCPPacketFlowId.from_endpoints(
+            packet.src_addr_ip, packet.src_port_tcp,
+            packet.dst_addr_ip, packet.dst_port_tcp
+        )
+
+    def from_rpc(rpc):
+        return TCPPacketFlowId.from_endpoints(
+            rpc.client_host, rpc.client_port,
+            rpc.server_host, rpc.server_port
+        )
+
+    # Integer form used by PacketTable.flow_keys: each endpoint packed as
+    # (ip << 16 | port), ordered so that lo <= hi.
+    #
+    KEY_DTYPE = pcap_scan.FLOW_KEY_DTYPE
+
+    def key(self):
+        return pcap_scan.flow_key(ip_to_int(self.first_addr_ip), self.first_port_tcp,
+                                  ip_to_int(self.second_addr_ip), self.second_port_tcp)
+
+    def keys(flow_ids):
+        return numpy.array([flow_id.key() for flow_id in flow_ids],
+                           dtype=TCPPacketFlowId.KEY_DTYPE)
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Functions
+
+def tags_to_dict(tags):
+    """
+    Converts a list of dicts with "key" and "value" keys into a single dict.
+    """
+    return {t["key"]: t["value"] for t in tags}
+
+
+def format_span_id(span_id):
+    """
+    Returns the 16 hex digit form of an integer span ID, as in Jaeger.
+    """
+    return f"{span_id:016x}"
+
+
+def format_trace_id(high, low):
+    """
+    Returns the hex form of a trace ID given as its high and low 64 bits, as
+    in Jaeger: 16 digits if the high half is zero, else 32.
+    """
+    if high:
+        return f"{high:016x}{low:016x}"
+    return f"{low:016x}"
+
+
+def span_endpoints(span_tags, process_tags, host_to_ip=None):
+    """
+    Returns the (host, kind, peer_host, peer_port) of a span given its span
+    and process tags as dicts, hosts normalized with `host_to_ip`.
+    """
+    return (normalize_host(process_tags.get("host.name"), host_to_ip),
+            span_tags.get("span.kind"),
+            normalize_host(span_tags.get("net.peer.name") or
+                           span_tags.get("net.sock.peer.addr"),
+                           host_to_ip),
+            int(span_tags.get("net.peer.port") or
+                span_tags.get("net.sock.peer.port") or
+                0))
+
+
+def normalize_host(host, host_to_ip=None):
+    """
+    Returns the value in `host_to_ip` (see MeshConfig) for the passed host
+    string, if present, else returns host.
+    """
+    return (host_to_ip or {}).get(host) or host
+
+
+def rpc_link_bias(link_bias, rpc):
+    """
+    Returns the LinkBias measured for the link `rpc` was sent over, or
+    LinkBias.null() if there is none (e.g. the two hosts didn't exchange
+    enough packets in both directions).
+    """
+    return link_bias.get(rpc.link, LinkBias.null())
+
+
+def rpc_link_bias_at(link_bias_series, rpc):
+    """
+    Returns the LinkBias of the link of `rpc` at the time of its query,
+    interpolated from a link_bias_series, or LinkBias.null() if the link
+    has no estimate.
+    """
+    series = link_bias_series.get(rpc.link)
+    if series is None:
+        return LinkBias.null()
+
+    query_bias = float(series.at(rpc.query_send_time_usec))
+    return LinkBias(query_bias=query_bias, reply_bias=2.0 - query_bias)
+
+
+def rpc_clock_skew_at(clock_skew_series, rpc):
+    """
+    Returns the clock skew of the link of `rpc` at the time of its query,
+    interpolated from a clock_skew_series (0 if the link has none).
+    """
+    series = clock_skew_series.get(rpc.link)
+    if series is None:
+        return 0.0
+
+    return float(series.at(rpc.query_send_time_usec))
+
+
+def windowed_mean_series(keys, times_usec, values, windows):
+    """
+    Returns a TimeSeries by key of the mean of `values` in each of
+    `windows` (a sketches.SlidingWindows), for parallel sequences of keys,
+    times and values; windows without values are skipped.
+    """
+    import sketches
+
+    times_usec = numpy.asarray(times_usec, dtype=numpy.float64)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    panes = windows.pane_index(times_usec)
+
+    rows_by_key = collections.defaultdict(list)
+    for row, key in enumerate(keys):
+        rows_by_key[key].append(row)
+
+    series = {}
+    for key, rows in rows_by_key.items():
+        rows = numpy.array(rows)
+        key_panes = panes[rows]
+
+        order = numpy.argsort(key_panes, kind='stable')
+        pane_ids, starts = numpy.unique(key_panes[order], return_index=True)
+        moments = {
+            pane: sketches.Moments().add(pane_values)
+            for pane, pane_values in zip(pane_ids.tolist(),
+                                         numpy.split(values[rows[order]], starts[1:]))
+        }
+
+        window_times = []
+        window_means = []
+        for start, end, window in windows.aggregate(moments, sketches.Moments):
+            if window.count:
+                window_times.append((start + end) / 2)
+                window_means.append(window.mean)
+
+        series[key] = TimeSeries(time_usec=numpy.array(window_times),
+                                 value=numpy.array(window_means))
+
+    return series
+
+
+def clock_skew_series(rpcs, windows, link_bias_series=None):
+    """
+    Returns a TimeSeries by link (HostPair) of the mean estimated clock skew
+    of the TraceRPCs `rpcs` in each of `windows`, each RPC's skew being
+    estimated with the link bias at its own time (see link_bias_series; no
+    bias if None).
+    """
+    link_bias_series = link_bias_series or {}
+
+    return windowed_mean_series(
+        [r.link for r in rpcs],
+        [r.query_send_time_usec for r in rpcs],
+        [r.estimate_clock_skew(rpc_link_bias_at(link_bias_series, r)) for r in rpcs],
+        windows)
+
+
+def usec_to_ns(time_usec):
+    return round(time_usec * NSEC_PER_USEC)
+
+
+def remove_outliers(samples, n_sigmas=3):
+    """
+    Returns the robust_stats.Summary of the samples less than n_sigmas
+    standard deviations away from their median.
+    """
+    import robust_stats
+
+    return robust_stats.sigma_clip(samples, n_sigmas)
+
+
+def read_spans(stream, host_to_ip=None):
+    """
+    Reads the RPC (client and server) spans of a Jaeger trace JSON export
+    from the binary `stream`, a trace at a time (see
+    trace_scan.iter_trace_spans), into a SpanTable; other spans can't be
+    part of a TraceRPC.
+    """
+    import trace_scan
+
+    trace_count = 0
+    tables = []
+    batch = []
+    for trace_spans in trace_scan.iter_trace_spans(stream):
+        trace_count += 1
+        batch.extend(TraceSpan.from_raw_span(s, host_to_ip) for s in trace_spans)
+        if len(batch) >= SPAN_TABLE_BATCH:
+            tables.append(SpanTable.from_trace_spans(batch))
+            batch = []
+    tables.append(SpanTable.from_trace_spans(batch))
+
+    print(f"TRACE COUNT = {trace_count}")
+    return SpanTable.concat(tables)
+
+
+def span_children(spans, parent_span_id):
+    """
+    Returns the (children, children_offsets) of a SpanTable (see SpanTable)
+    given the parent span ID of each of its rows (0: none): the children of
+    a span are the spans of its trace naming it as their parent, in table
+    order.
+    """
+    parent = lookup_rows((spans.trace_id_high, spans.trace_id_low, spans.span_id),
+                         (spans.trace_id_high, spans.trace_id_low, parent_span_id))
+    child_rows = numpy.flatnonzero(parent >= 0)
+    child_rows = child_rows[numpy.argsort(parent[child_rows], kind='stable')]
+    counts = numpy.bincount(parent[child_rows], minlength=len(spans))
+
+    return spans.span_id[child_rows], numpy.concatenate(([0], numpy.cumsum(counts)))
+
+
+def read_proto_spans(stream, trace_format, host_to_ip=None):
+    """
+    Reads the RPC (client and server) spans of a length-delimited protobuf
+    trace file of `trace_format` (see proto_scan) from the binary `stream`
+    into a SpanTable, like read_spans; as these formats only record the
+    parent of each span, children are found by span_children.
+    """
+    import proto_scan
+
+    tables = []
+    parent_span_ids = []
+
+    def add_batch(batch):
+        tables.append(SpanTable.from_proto_spans(batch, host_to_ip))
+        parent_span_ids.append(numpy.array([span.parent_span_id for span in batch],
+                                           dtype=numpy.uint64))
+
+    batch = []
+    for span in proto_scan.iter_spans(stream, trace_format):
+        batch.append(span)
+        if len(batch) >= SPAN_TABLE_BATCH:
+            add_batch(batch)
+            batch = []
+    add_batch(batch)
+
+    spans = SpanTable.concat(tables)
+    spans.children, spans.children_offsets = \
+        span_children(spans, numpy.concatenate(parent_span_ids))
+
+    trace_ids = (spans.trace_id_high, spans.trace_id_low)
+    first_of_trace = lookup_rows(trace_ids, trace_ids) == numpy.arange(len(spans))
+    print(f"TRACE COUNT = {numpy.count_nonzero(first_of_trace)}")
+
+    rpc_kinds = [code for code, kind in enumerate(spans.kinds)
+                 if kind in proto_scan.RPC_SPAN_KINDS]
+    return spans.take(numpy.isin(spans.kind, rpc_kinds))
+
+
+def read_spans_from_trace_file(filename, host_to_ip=None, cache=None,
+                               trace_format=TRACE_FORMAT_JSON):
+    """
+    Reads the spans of a trace file of `trace_format` (one of TRACE_FORMATS)
+    into a SpanTable; if `cache` (an ingest_cache.IngestCache) is given,
+    spans are reused from previous runs on the same file contents.
+    """
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"unknown trace format {trace_format!r}")
+
+    if cache is not None:
+        key = cache.key(f"spans/{SPAN_PARSER_VERSION}", [filename],
+                        [trace_format] + sorted((host_to_ip or {}).items()))
+        columns = cache.get(key)
+        if columns is not None:
+            return SpanTable.from_bundle(columns)
+
+    with open(filename, 'rb') as stream:
+        if trace_format == TRACE_FORMAT_JSON:
+            spans = read_spans(stream, host_to_ip)
+        else:
+            spans = read_proto_spans(stream, trace_format, host_to_ip)
+
+    if cache is not None:
+        cache.put(key, spans.to_bundle())
+
+    return spans
+
+
+def rpc_span_rows(spans):
+    """
+    Joins the client and server spans of a SpanTable into RPCs, returning
+    the (client rows, server rows) of each, in server span order: a server
+    span and its parent, a client span, form an RPC if each span's host is
+    the other's peer and the two hosts differ.
+
+    Children are keyed by their trace and span ID; a child listed by two
+    different spans of its trace is an AssertionError.
+    """
+    counts = numpy.diff(spans.children_offsets)
+    child_parent = numpy.repeat(numpy.arange(len(spans)), counts)
+    child_keys = (spans.trace_id_high[child_parent], spans.trace_id_low[child_parent],
+                  spans.children)
+
+    # Sanity check: every child has a single parent, i.e. the spans listing
+    # the same child all have the same span ID.
+    #
+    order = numpy.lexsort(child_keys[::-1])
+    same_child = numpy.ones(max(len(order) - 1, 0), dtype=bool)
+    for column in child_keys:
+        sorted_column = column[order]
+        same_child &= sorted_column[1:] == sorted_column[:-1]
+    parent_span_id = spans.span_id[child_parent[order]]
+    assert numpy.array_equal(parent_span_id[1:][same_child], parent_span_id[:-1][same_child]), \
+        "span listed as the child of more than one span"
+
+    def kind_mask(kind):
+        return numpy.isin(spans.kind, [code for code, name in enumerate(spans.kinds)
+                                       if name == kind])
+
+    servers = numpy.flatnonzero(kind_mask("server"))
+    child = lookup_rows(child_keys, (spans.trace_id_high[servers],
+                                     spans.trace_id_low[servers],
+                                     spans.span_id[servers]))
+    servers = servers[child >= 0]
+    clients = child_parent[child[child >= 0]]
+
+    host, peer_host = spans.host, spans.peer_host
+    paired = (kind_mask("client")[clients] &
+              (host[clients] != host[servers]) &
+              (host[clients] == peer_host[servers]) &
+              (host[servers] == peer_host[clients]))
+
+    return clients[paired], servers[paired]
+
+
+def rpcs_from_trace_spans(spans):
+    """
+    Joins pairs of client and server spans of a SpanTable (see
+    rpc_span_rows) into a TraceRPCTable.
+    """
+    clients, servers = rpc_span_rows(spans)
+
+    return TraceRPCTable(
+        spans.hosts,
+        client_span=spans.span_id[clients],
+        server_span=spans.span_id[servers],
+        client_host=spans.host[clients],
+        client_port=spans.peer_port[servers],
+        server_host=spans.host[servers],
+        server_port=spans.peer_port[clients],
+        query_send_time_usec=spans.start_time_usec[clients],
+        query_recv_time_usec=spans.start_time_usec[servers],
+        reply_send_time_usec=spans.end_time_usec[servers],
+        reply_recv_time_usec=spans.end_time_usec[clients])
+
+
+def make_packet_filter(flow_ids=None, host_pairs=None, port_ranges=None,
+                       time_windows_usec=None):
+    """
+    Builds a pcap_scan.PacketFilter from TCPPacketFlowIds, HostPairs,
+    inclusive (lo, hi) port ranges and [start, stop) time windows in usec;
+    any criterion left as None is unconstrained.  Passing one to the pcap
+    readers drops non-matching packets while the capture is decoded.
+    """
+    return pcap_scan.PacketFilter(
+        flows=None if flow_ids is None else TCPPacketFlowId.keys(flow_ids),
+        host_pairs=None if host_pairs is None else [
+            (ip_to_int(host_pair.src_addr_ip), ip_to_int(host_pair.dst_addr_ip))
+            for host_pair in host_pairs
+        ],
+        port_ranges=None if port_ranges is None else list(port_ranges),
+        time_windows_ns=None if time_windows_usec is None else [
+            (usec_to_ns(start), usec_to_ns(stop))
+            for start, stop in time_windows_usec
+        ],
+    )
+
+
+def read_pcaps(host, stream, packet_filter=None):
+    return PacketTable.from_columns(
+        host, pcap_scan.read_pcap_stream_columns(ip_to_int(host), stream,
+                                                 packet_filter))
+
+
+def read_pcap_file(host, filename, packet_filter=None):
+    return PacketTable.from_columns(
+        host, pcap_scan.read_pcap_file_columns(ip_to_int(host), filename,
+                                               packet_filter))
+
+
+def read_pcap_files(host_files, workers=INGEST_WORKERS, packet_filter=None,
+                    cache=None):
+    """
+    Reads a list of (capture host, pcap filename) into a single PacketTable,
+    decoding captures in parallel across `workers` processes.  If `cache`
+    (an ingest_cache.IngestCache) is given, the table is reused from
+    previous runs on the same file contents.
+    """
+    host_files = list(host_files)
+
+    if cache is not None:
+        key = cache.key(f"pcap_scan/{pcap_scan.PARSER_VERSION}",
+                        [filename for _host, filename in host_files],
+                        [host for host, _filename in host_files] +
+                        (packet_filter.cache_params() if packet_filter else []))
+        columns = cache.get(key)
+        if columns is not None:
+            return PacketTable.from_bundle(columns)
+
+    host_columns = pcap_scan.read_pcap_files_columns(
+        [(ip_to_int(host), filename) for host, filename in host_files],
+        workers=workers, packet_filter=packet_filter)
+
+    captured = PacketTable.concat(
+        PacketTable.from_columns(host, columns)
+        for (host, _filename), columns in zip(host_files, host_columns)
+    )
+
+    if cache is not None:
+        cache.put(key, captured.to_bundle())
+
+    return captured
+
+
+def iter_pcaps(host, stream, packet_filter=None):
+    """
+    Generator version of read_pcaps: yields PacketTable batches of bounded
+    size as the capture is read.
+    """
+    for columns in pcap_scan.iter_pcap_stream_columns(ip_to_int(host), stream,
+                                                      packet_filter=packet_filter):
+        yield PacketTable.from_columns(host, columns)
+
+
+def iter_pcap_file(host, filename, packet_filter=None):
+    with open(filename, 'rb') as stream:
+        yield from iter_pcaps(host, stream, packet_filter)
+
+
+def iter_pcap_files(host_files, packet_filter=None):
+    """
+    Yields PacketTable batches from a list of (capture host, pcap filename),
+    merged by capture time across the captures (see pcap_scan.merge_columns):
+    the rows of each batch were captured no earlier than those of the
+    batches before it, so that the sender and receiver copies of a packet
+    come close together.
+    """
+    host_files = list(host_files)
+    hosts = [host for host, _filename in host_files]
+    host_addr_ips = numpy.array([ip_to_int(host) for host in hosts], dtype=numpy.uint32)
+    host_streams = [
+        (ip_to_int(host), pcap_scan.iter_pcap_file_columns(ip_to_int(host), filename,
+                                                           packet_filter=packet_filter))
+        for host, filename in host_files
+    ]
+    for columns, capture_host in pcap_scan.merge_columns(host_streams):
+        yield PacketTable(hosts,
+                          capture_host=numpy.argmax(capture_host[:, numpy.newaxis] ==
+                                                    host_addr_ips, axis=1),
+                          **columns)
+
+
+def packet_batches(captured):
+    """
+    Lets packet consumers accept either a single PacketTable or an iterable
+    of PacketTable batches (e.g. from iter_pcap_files).
+    """
+    if isinstance(captured, PacketTable):
+        return (captured,)
+
+    return captured
+
+
+def packet_keys(captured):
+    """
+    Returns the packed packet identity (see pcap_scan.PACKET_KEY_BITS) of
+    each row of a PacketTable; rows captured on the sender and on the
+    receiver of the same packet share the same key.
+    """
+    return pcap_scan.packet_keys(captured.columns())
+
+
+def packet_ids(captured):
+    """
+    Numbers the distinct packet identities (see packet_keys) of a
+    PacketTable, returning (number of identities, the identity of each row).
+    """
+    addrs = ((captured.src_addr_ip.astype(numpy.uint64) << numpy.uint64(32)) |
+             captured.dst_addr_ip.astype(numpy.uint64))
+    ports_seq = ((captured.src_port_tcp.astype(numpy.uint64) << numpy.uint64(48)) |
+                 (captured.dst_port_tcp.astype(numpy.uint64) << numpy.uint64(32)) |
+                 captured.seq_tcp.astype(numpy.uint64))
+
+    order = numpy.lexsort((captured.size_bytes, ports_seq, addrs))
+
+    new_id = numpy.zeros(len(order), dtype=bool)
+    new_id[:1] = True
+    for column in (addrs, ports_seq, captured.size_bytes):
+        sorted_column = column[order]
+        new_id[1:] |= sorted_column[1:] != sorted_column[:-1]
+
+    ids = numpy.empty(len(order), dtype=numpy.int64)
+    ids[order] = numpy.cumsum(new_id) - 1
+    return int(numpy.count_nonzero(new_id)), ids
+
+
+def last_of_runs(keys, rows):
+    """
+    Returns the index (into keys/rows) of the last row, in row order, of
+    each distinct key, together with that of the first.
+    """
+    order = numpy.lexsort((rows, keys))
+    sorted_keys = keys[order]
+    run_start = numpy.ones(len(order), dtype=bool)
+    run_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    run_end = numpy.roll(run_start, -1)
+    return order[run_end], order[run_start]
+
+
+def lookup_rows(keys, queries):
+    """
+    Returns, for each query, the first row of `keys` equal to it, or -1 if
+    there is none; `keys` and `queries` are tuples of parallel columns (e.g.
+    trace ID high and low halves and span ID), compared column by column.
+    Keys and queries are sorted together, so that each query follows the
+    keys equal to it.
+    """
+    key_count = len(keys[0])
+    columns = [numpy.concatenate((key_column, query_column))
+               for key_column, query_column in zip(keys, queries)]
+    is_query = numpy.arange(len(columns[0])) >= key_count
+
+    # lexsort is stable and keys come before queries, so the first row of a
+    # run of equal values is its first key, if it has any.
+    #
+    order = numpy.lexsort(columns[::-1])
+    run_start = numpy.zeros(len(order), dtype=bool)
+    run_start[:1] = True
+    for column in columns:
+        sorted_column = column[order]
+        run_start[1:] |= sorted_column[1:] != sorted_column[:-1]
+
+    first = order[run_start][numpy.cumsum(run_start) - 1]
+    first[first >= key_count] = -1
+
+    rows = numpy.empty(len(order) - key_count, dtype=numpy.int64)
+    sorted_is_query = is_query[order]
+    rows[order[sorted_is_query] - key_count] = first[sorted_is_query]
+    return rows
+
+
+def spacing_samples(captured, horizon_ns=None):
+    """
+    Returns (samples, carried) where samples are the columns returned by
+    packet_spacing_samples for the samples of `captured` whose pkt2 was sent
+    before `horizon_ns` (all of them if None), and carried is the table of
+    the rows that the other samples, or samples with packets yet to be
+    captured, may still need (see PacketSpacingSampler).
+    """
+    time = captured.capture_time_ns.astype(numpy.int64)
+    capture_host = captured.capture_host_addr_ip()
+    host_pair = ((captured.src_addr_ip.astype(numpy.uint64) << numpy.uint64(32)) |
+                 captured.dst_addr_ip.astype(numpy.uint64))
+    id_count, ids = packet_ids(captured)
+
+    # Last receiver copy of each packet, in capture order (-1 if none).
+    #
+    recv_rows = numpy.flatnonzero(capture_host == captured.dst_addr_ip)
+    last_recv, _first = last_of_runs(ids[recv_rows], recv_rows)
+    recv_row = numpy.full(id_count, -1, dtype=numpy.int64)
+    recv_row[ids[recv_rows[last_recv]]] = recv_rows[last_recv]
+
+    # Consecutive sender copies of the same host pair.
+    #
+    send_rows = numpy.flatnonzero(capture_host == captured.src_addr_ip)
+    send_rows = send_rows[numpy.argsort(host_pair[send_rows], kind='stable')]
+    same_pair = host_pair[send_rows[1:]] == host_pair[send_rows[:-1]]
+    pkt1 = send_rows[:-1][same_pair]
+    pkt2 = send_rows[1:][same_pair]
+
+    # Ignore non-positive packet send intervals.
+    #
+    send_ns = time[pkt2] - time[pkt1]
+    positive = send_ns > 0
+    pkt1, pkt2, send_ns = pkt1[positive], pkt2[positive], send_ns[positive]
+
+    # Each pair of packets keeps its last send interval, and is ordered by
+    # its first.
+    #
+    spacing_key = ids[pkt1] * id_count + ids[pkt2]
+    last, first = last_of_runs(spacing_key, pkt2)
+    last = last[numpy.argsort(pkt2[first], kind='stable')]
+    pkt1, pkt2, send_ns = pkt1[last], pkt2[last], send_ns[last]
+
+    carried = captured.take(slice(0, 0))
+    if horizon_ns is not None:
+        # Carry the sender copies past the horizon, each one's predecessor
+        # (pkt1 of its sample) and the last of each host pair (pkt1 of the
+        # next), the receiver copies of those, and the receiver copies past
+        # the horizon, whose sender copies may be yet to come.
+        #
+        recent = time >= horizon_ns
+        carry_send = recent[send_rows]
+        carry_send[:-1] |= carry_send[1:] & same_pair
+        carry_send[:-1] |= ~same_pair
+        carry_send[-1:] = True
+        carry = numpy.zeros(len(captured), dtype=bool)
+        carry[send_rows[carry_send]] = True
+        carry[recv_rows] = (recent[recv_rows] |
+                            numpy.isin(ids[recv_rows], ids[send_rows[carry_send]]))
+        carried = captured.take(carry)
+
+        final = time[pkt2] < horizon_ns
+        pkt1, pkt2, send_ns = pkt1[final], pkt2[final], send_ns[final]
+
+    recv1 = recv_row[ids[pkt1]]
+    recv2 = recv_row[ids[pkt2]]
+    received = (recv1 >= 0) & (recv2 >= 0)
+    recv_ns = numpy.where(received, time[recv2] - time[recv1], 0)
+
+    send_usec = send_ns / NSEC_PER_USEC
+    recv_usec = recv_ns / NSEC_PER_USEC
+
+    # The same validity rule as PacketSpacing.delta().
+    #
+    valid = (received & (recv_ns > 0) &
+             (send_usec <= USEC_PER_SEC / 5) & (recv_usec <= USEC_PER_SEC / 5))
+
+    return (host_pair[pkt1][valid],
+            (recv_usec - send_usec)[valid],
+            captured.size_bytes[pkt1][valid],
+            captured.size_bytes[pkt2][valid],
+            time[pkt2][valid] / NSEC_PER_USEC), carried
+
+
+def packet_spacing_samples(captured):
+    """
+    Returns the valid two-packet samples (see PacketSpacing) of the packets
+    in the PacketTable `captured`, as (host pair, delta usec, pkt1 size,
+    pkt2 size, pkt2 send time usec) columns where host pair is (src ip << 32
+    | dst ip).  Samples are ordered by the first time each pair of packets
+    was sent.
+
+    Same samples as link_bias_from_captured_packets_reference: pkt1 and
+    pkt2 are consecutive rows (in capture order) captured by the sender of
+    the same host pair, at least one nanosecond apart; a pair of packets
+    sent more than once keeps its last send interval, and its receive
+    interval is taken between the last receiver copies of each.
+    """
+    return spacing_samples(captured)[0]
+
+
+def iter_packet_spacing_samples(captured, window_ns=MATCH_WINDOW_NS):
+    """
+    Yields the columns of packet_spacing_samples batch by batch: all at once
+    for a PacketTable, and through a PacketSpacingSampler for an iterable of
+    batches merged by capture time (e.g. from iter_pcap_files), so that only
+    about `window_ns` worth of packets is held at a time.
+    """
+    if isinstance(captured, PacketTable):
+        yield packet_spacing_samples(captured)
+        return
+
+    sampler = PacketSpacingSampler(window_ns)
+    for batch in captured:
+        yield sampler.add(batch)
+    yield sampler.finish()
+
+
+def link_bias_from_transmit_deltas(transmit_deltas_by_host_pair):
+    """
+    Returns the LinkBias of each host pair whose TransmitDelta is known in
+    both directions.
+    """
+    link_bias = {}
+
+    for host_pair, transmit_delta in transmit_deltas_by_host_pair.items():
+        reverse_pair = host_pair.reverse()
+        if reverse_pair not in transmit_deltas_by_host_pair:
+            continue
+
+        reverse_delta = transmit_deltas_by_host_pair[reverse_pair]
+
+        link_bias[host_pair] = LinkBias.from_transmit_deltas(
+            query_delta=transmit_delta,
+            reply_delta=reverse_delta
+        )
+
+    return link_bias
+
+
+def sample_accumulators(samples, **accumulator_args):
+    """
+    Returns a TransmitDeltaAccumulator (built with `accumulator_args`) of
+    the two-packets samples (columns of packet_spacing_samples) of each
+    host pair, by HostPair, in order of their first sample.
+    """
+    host_pairs, deltas, pkt1_sizes, pkt2_sizes, _times = samples
+
+    order = numpy.argsort(host_pairs, kind='stable')
+    pairs, starts = numpy.unique(host_pairs[order], return_index=True)
+    ends = numpy.append(starts[1:], len(order))
+    first = numpy.argsort(order[starts], kind='stable')
+
+    accumulators = {}
+    for pair, start, end in zip(pairs[first].tolist(), starts[first], ends[first]):
+        rows = order[start:end]
+        host_pair = HostPair(src_addr_ip=int_to_ip(pair >> 32),
+                             dst_addr_ip=int_to_ip(pair & 0xffffffff))
+        accumulators[host_pair] = TransmitDeltaAccumulator(**accumulator_args).add(
+            deltas[rows], pkt1_sizes[rows], pkt2_sizes[rows])
+
+    return accumulators
+
+
+def transmit_delta_accumulators(captured, **accumulator_args):
+    """
+    Returns the sample_accumulators of the packets in `captured` (a
+    PacketTable or an iterable of batches merged by capture time).  Each
+    batch's samples are summarized on their own and merged into the
+    running accumulators, so no more than a batch of samples is held.
+    """
+    return merge_transmit_delta_accumulators(
+        sample_accumulators(samples, **accumulator_args)
+        for samples in iter_packet_spacing_samples(captured))
+
+
+def merge_transmit_delta_accumulators(accumulators_list):
+    """
+    Merges dicts of TransmitDeltaAccumulator by HostPair (or by any other
+    key, e.g. (HostPair, pane)), such as those of different batches,
+    captures or time windows, into one; the first accumulator of each key
+    is updated in place.
+    """
+    merged = {}
+    for accumulators in accumulators_list:
+        for host_pair, accumulator in accumulators.items():
+            if host_pair in merged:
+                merged[host_pair].merge(accumulator)
+            else:
+                merged[host_pair] = accumulator
+    return merged
+
+
+def link_bias_from_transmit_delta_accumulators(accumulators, outlier_sigmas=3):
+    """
+    Returns (link bias by HostPair, TransmitDelta by HostPair) from a dict
+    of TransmitDeltaAccumulator by HostPair.
+    """
+    transmit_deltas_by_host_pair = {
+        host_pair: transmit_delta
+        for host_pair, accumulator in accumulators.items()
+        for transmit_delta in (accumulator.transmit_delta(outlier_sigmas),)
+        if transmit_delta is not None
+    }
+
+    return (link_bias_from_transmit_deltas(transmit_deltas_by_host_pair),
+            transmit_deltas_by_host_pair)
+
+
+def link_bias_from_captured_packets(captured, outlier_sigmas=3, **accumulator_args):
+    """
+    Estimates the LinkBias of every host pair seen in both directions in
+    `captured` (a PacketTable or an iterable of batches) using the
+    two-packets method, returning (link bias by HostPair, TransmitDelta by
+    HostPair).  `accumulator_args` are passed to TransmitDeltaAccumulator.
+    """
+    return link_bias_from_transmit_delta_accumulators(
+        transmit_delta_accumulators(captured, **accumulator_args), outlier_sigmas)
+
+
+def link_bias_series(captured, windows, outlier_sigmas=3, **accumulator_args):
+    """
+    Returns a TimeSeries by HostPair of the query bias (see LinkBias; the
+    reply bias is 2 minus it) of each host pair in each of `windows` (a
+    sketches.SlidingWindows) where both it and its reverse have a
+    TransmitDelta.
+
+    Samples are summarized once into a TransmitDeltaAccumulator per host
+    pair and pane (hop), batch by batch of `captured` (a PacketTable or an
+    iterable of batches merged by capture time), and the windows are merged
+    from those.
+    """
+    # Only the statistics of each window are needed, not samples to plot.
+    #
+    accumulator_args.setdefault("reservoir_size", 0)
+
+    def pane_accumulators_of(samples):
+        host_pairs, deltas, pkt1_sizes, pkt2_sizes, times_usec = samples
+        panes = windows.pane_index(times_usec)
+
+        order = numpy.lexsort((panes, host_pairs))
+        sorted_pairs = host_pairs[order]
+        sorted_panes = panes[order]
+        new_group = numpy.ones(len(order), dtype=bool)
+        new_group[1:] = ((sorted_pairs[1:] != sorted_pairs[:-1]) |
+                         (sorted_panes[1:] != sorted_panes[:-1]))
+        starts = numpy.flatnonzero(new_group)
+        ends = numpy.append(starts[1:], len(order))
+
+        # (HostPair, pane) -> TransmitDeltaAccumulator
+        #
+        accumulators = {}
+        for start, end in zip(starts, ends):
+            rows = order[start:end]
+            pair = int(sorted_pairs[start])
+            host_pair = HostPair(src_addr_ip=int_to_ip(pair >> 32),
+                                 dst_addr_ip=int_to_ip(pair & 0xffffffff))
+            accumulators[host_pair, int(sorted_panes[start])] = \
+                TransmitDeltaAccumulator(**accumulator_args).add(
+                    deltas[rows], pkt1_sizes[rows], pkt2_sizes[rows])
+        return accumulators
+
+    # HostPair -> (pane -> TransmitDeltaAccumulator), merged batch by batch.
+    #
+    pane_accumulators = collections.defaultdict(dict)
+    for (host_pair, pane), accumulator in merge_transmit_delta_accumulators(
+            pane_accumulators_of(samples)
+            for samples in iter_packet_spacing_samples(captured)).items():
+        pane_accumulators[host_pair][pane] = accumulator
+
+    # HostPair -> (window start -> TransmitDelta)
+    #
+    window_deltas = {}
+    for host_pair, accumulators in pane_accumulators.items():
+        window_deltas[host_pair] = {
+            start: transmit_delta
+            for start, _end, accumulator in windows.aggregate(
+                accumulators, lambda: TransmitDeltaAccumulator(**accumulator_args))
+            for transmit_delta in (accumulator.transmit_delta(outlier_sigmas),)
+            if transmit_delta is not None
+        }
+
+    series = {}
+    for host_pair, deltas_by_start in window_deltas.items():
+        reverse_deltas = window_deltas.get(host_pair.reverse(), {})
+        window_starts = sorted(deltas_by_start.keys() & reverse_deltas.keys())
+        if not window_starts:
+            continue
+
+        series[host_pair] = TimeSeries(
+            time_usec=numpy.array(window_starts) + windows.width / 2,
+            value=numpy.array([
+                LinkBias.from_transmit_deltas(query_delta=deltas_by_start[start],
+                                              reply_delta=reverse_deltas[start]).query_bias
+                for start in window_starts
+            ]))
+
+    return series
+
+
+def link_estimates(datasets, outlier_sigmas=3, cost_outlier_sigmas=20):
+    """
+    The bootstrap statistic of bootstrap_link_estimates: from the
+    (resampled) two-packets samples of a link in the query and reply
+    directions, as bootstrap.Grouped buckets of a TransmitDeltaAccumulator
+    with (mean, variance) columns, and (replicates, n) arrays of the query
+    and reply latencies of its RPCs, returns the (query bias, clock skew,
+    query cost, reply cost) of each replicate.
+
+    The same estimates as main's: the mean TransmitDelta (sigma-clipped)
+    of each direction gives the LinkBias (LinkBias.null() if either is
+    missing, as rpc_link_bias), the clock skew is the mean of the RPCs'
+    estimate_clock_skew with that bias, and the costs are the sigma-clipped
+    means of the RPCs' query_cost and reply_cost with that skew and bias.
+    """
+    import robust_stats
+
+    query_deltas, reply_deltas, (query_latency, reply_latency) = datasets
+
+    query_delta = robust_stats.grouped_sigma_clipped_means(
+        *query_deltas.columns, query_deltas.counts, outlier_sigmas)
+    reply_delta = robust_stats.grouped_sigma_clipped_means(
+        *reply_deltas.columns, reply_deltas.counts, outlier_sigmas)
+    total_delta = query_delta + reply_delta
+    measured = ~numpy.isnan(total_delta)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        query_bias = numpy.where(measured, 2.0 * query_delta / total_delta, 1.0)
+        reply_bias = numpy.where(measured, 2.0 * reply_delta / total_delta, 1.0)
+
+    query_bias = query_bias[:, numpy.newaxis]
+    reply_bias = reply_bias[:, numpy.newaxis]
+
+    clock_skew = ((reply_latency * query_bias - query_latency * reply_bias) / 2.0).mean(
+        axis=1, keepdims=True)
+    query_cost = (query_latency + clock_skew) / query_bias
+    reply_cost = (reply_latency - clock_skew) / reply_bias
+
+    return numpy.column_stack((
+        query_bias[:, 0],
+        clock_skew[:, 0],
+        robust_stats.sigma_clipped_means(query_cost, cost_outlier_sigmas),
+        robust_stats.sigma_clipped_means(reply_cost, cost_outlier_sigmas),
+    ))
+
+
+def transmit_delta_groups(accumulator):
+    """
+    Returns the two-packets samples summarized by a TransmitDeltaAccumulator
+    (None: no samples) as bootstrap.Grouped (mean, variance) buckets.
+    """
+    import bootstrap
+
+    if accumulator is None:
+        return bootstrap.Grouped(counts=numpy.empty(0, dtype=numpy.int64),
+                                 columns=(numpy.empty(0), numpy.empty(0)))
+
+    means, counts, m2s = accumulator.quantiles.buckets()
+    return bootstrap.Grouped(counts=counts, columns=(means, m2s / counts))
+
+
+def bootstrap_link_estimates(rpcs, captured, replicates=BOOTSTRAP_REPLICATES,
+                             confidence=BOOTSTRAP_CONFIDENCE, seed=BOOTSTRAP_SEED,
+                             workers=BOOTSTRAP_WORKERS, outlier_sigmas=3,
+                             cost_outlier_sigmas=20,
+                             relative_accuracy=TRANSMIT_DELTA_RELATIVE_ACCURACY):
+    """
+    Returns the LinkIntervals of each link (HostPair) of the TraceRPCs
+    `rpcs`, from bootstrap resamples of its RPCs and of the two-packets
+    samples in `captured` (a PacketTable or an iterable of batches) of the
+    link in each direction; see link_estimates.
+
+    Each replicate resamples the three independently of each other, so the
+    uncertainty of the link bias carries over into the skew and costs.  The
+    RPCs are resampled by index; the two-packets samples, which are far
+    more numerous, by bucket of their TransmitDeltaAccumulator (built with
+    `relative_accuracy`; None resamples every distinct value), see
+    bootstrap.Grouped.  Replicates are computed in chunks across `workers`
+    processes; the intervals depend only on `seed`.
+    """
+    import bootstrap
+
+    accumulators = transmit_delta_accumulators(captured, relative_accuracy=relative_accuracy,
+                                               reservoir_size=0)
+
+    rpcs_by_link = collections.defaultdict(list)
+    for r in rpcs:
+        rpcs_by_link[r.link].append(r)
+
+    statistic = functools.partial(link_estimates, outlier_sigmas=outlier_sigmas,
+                                  cost_outlier_sigmas=cost_outlier_sigmas)
+
+    links = sorted(rpcs_by_link, key=lambda link: (link.src_addr_ip, link.dst_addr_ip))
+    seeds = numpy.random.SeedSequence(seed).spawn(len(links))
+
+    link_intervals = {}
+    with bootstrap.process_pool(workers) as executor:
+        for link, link_seed in zip(links, seeds):
+            link_rpcs = rpcs_by_link[link]
+            query_deltas = transmit_delta_groups(accumulators.get(link))
+            reply_deltas = transmit_delta_groups(accumulators.get(link.reverse()))
+            datasets = [
+                query_deltas,
+                reply_deltas,
+                (numpy.array([r.query_latency_usec() for r in link_rpcs]),
+                 numpy.array([r.reply_latency_usec() for r in link_rpcs])),
+            ]
+
+            query_bias, clock_skew, query_cost, reply_cost = bootstrap.intervals(
+                bootstrap.estimate(statistic, datasets),
+                bootstrap.replicate(statistic, datasets, replicates, link_seed, executor),
+                confidence)
+
+            link_intervals[link] = LinkIntervals(query_bias=query_bias,
+                                                 clock_skew=clock_skew,
+                                                 query_cost=query_cost,
+                                                 reply_cost=reply_cost,
+                                                 rpc_count=len(link_rpcs),
+                                                 query_samples=int(query_deltas.counts.sum()),
+                                                 reply_samples=int(reply_deltas.counts.sum()))
+
+    return link_intervals
+
+
+def sweep_config_records(configs, links, accumulators_by_packets, latencies_by_timestamps):
+    """
+    Evaluates `configs` (SweepGrid.configs) for sweep_link_estimates,
+    returning its records; the TransmitDeltas of each packet set and
+    outlier_sigmas are computed once, however many configurations use them.
+    """
+    import robust_stats
+
+    # (packets, outlier sigmas) -> TransmitDelta by HostPair
+    #
+    transmit_deltas = {}
+
+    records = []
+    for outlier_sigmas, cost_outlier_sigmas, bias_method, packets, timestamps in configs:
+        if (packets, outlier_sigmas) not in transmit_deltas:
+            transmit_deltas[packets, outlier_sigmas] = {
+                host_pair: accumulator.transmit_delta(outlier_sigmas)
+                for host_pair, accumulator in accumulators_by_packets[packets].items()
+            }
+        deltas = transmit_deltas[packets, outlier_sigmas]
+
+        query_bias = numpy.ones(len(links))
+        for i, link in enumerate(links):
+            query_delta = deltas.get(link)
+            reply_delta = deltas.get(link.reverse())
+            if (bias_method != "null" and
+                query_delta is not None and reply_delta is not None):
+                query_bias[i] = LinkBias.from_transmit_deltas(
+                    query_delta, reply_delta,
+                    method=lambda delta: getattr(delta, bias_method)).query_bias
+        reply_bias = 2.0 - query_bias
+
+        # Per-RPC skew and costs, as TraceRPC.estimate_clock_skew,
+        # query_cost and reply_cost (with the mean skew of the link).
+        #
+        link_index, query_latency, reply_latency = latencies_by_timestamps[timestamps]
+        rpc_count = numpy.bincount(link_index, minlength=len(links))
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            clock_skew = numpy.bincount(
+                link_index,
+                (reply_latency * query_bias[link_index] -
+                 query_latency * reply_bias[link_index]) / 2.0,
+                minlength=len(links)) / rpc_count
+        query_cost = (query_latency + clock_skew[link_index]) / query_bias[link_index]
+        reply_cost = (reply_latency - clock_skew[link_index]) / reply_bias[link_index]
+
+        for i, link in enumerate(links):
+            rows = link_index == i
+            records.append({
+                "outlier_sigmas": outlier_sigmas,
+                "cost_outlier_sigmas": cost_outlier_sigmas,
+                "bias_method": bias_method,
+                "packets": packets,
+                "timestamps": timestamps,
+                "src_addr_ip": link.src_addr_ip,
+                "dst_addr_ip": link.dst_addr_ip,
+                "rpc_count": int(rpc_count[i]),
+                "query_bias": float(query_bias[i]),
+                "reply_bias": float(reply_bias[i]),
+                "clock_skew_usec": float(clock_skew[i]),
+                "query_cost": robust_stats.sigma_clip(query_cost[rows],
+                                                      cost_outlier_sigmas).mean,
+                "reply_cost": robust_stats.sigma_clip(reply_cost[rows],
+                                                      cost_outlier_sigmas).mean,
+            })
+
+    return records
+
+
+def sweep_link_estimates(rpcs_by_timestamps, captured_by_packets, grid=None,
+                         workers=SWEEP_WORKERS):
+    """
+    Evaluates the per-link estimates of main (link bias, mean clock skew
+    and sigma-clipped query/reply costs) under every combination of the
+    settings of `grid` (a SweepGrid), returning a tidy table: a list of
+    records (see columnar.write_records), one per configuration and link,
+    in the order of grid.configs() and then of the links.
+
+    `rpcs_by_timestamps` maps the names in grid.timestamps to lists of
+    TraceRPCs (e.g. the raw and the packet-timestamp corrected ones), and
+    `captured_by_packets` the names in grid.packets to the PacketTables the
+    two-packets TransmitDeltas are estimated from.
+
+    Everything that doesn't depend on the settings is computed once: a
+    TransmitDeltaAccumulator per packet set and host pair (from which the
+    TransmitDelta of any outlier_sigmas follows without the samples), and
+    the link and latencies of every RPC as arrays.  The configurations are
+    then evaluated in chunks across `workers` processes.
+    """
+    import bootstrap
+
+    grid = grid or SweepGrid(packet_names=tuple(captured_by_packets),
+                             timestamp_names=tuple(rpcs_by_timestamps))
+    configs = grid.configs()
+
+    accumulators_by_packets = {
+        packets: transmit_delta_accumulators(captured_by_packets[packets], reservoir_size=0)
+        for packets in grid.packets
+    }
+
+    links = sorted(set(r.link for timestamps in grid.timestamps
+                       for r in rpcs_by_timestamps[timestamps]),
+                   key=lambda link: (link.src_addr_ip, link.dst_addr_ip))
+    link_number = {link: i for i, link in enumerate(links)}
+
+    # timestamps -> (link number, query latency, reply latency) of each RPC
+    #
+    latencies_by_timestamps = {
+        timestamps: (numpy.array([link_number[r.link] for r in rpcs], dtype=numpy.int64),
+                     numpy.array([r.query_latency_usec() for r in rpcs]),
+                     numpy.array([r.reply_latency_usec() for r in rpcs]))
+        for timestamps in grid.timestamps
+        for rpcs in (rpcs_by_timestamps[timestamps],)
+    }
+
+    with bootstrap.process_pool(workers) as executor:
+        if executor is None:
+            return sweep_config_records(configs, links, accumulators_by_packets,
+                                        latencies_by_timestamps)
+
+        futures = [executor.submit(sweep_config_records,
+                                   configs[start:start + SWEEP_CHUNK_CONFIGS],
+                                   links, accumulators_by_packets, latencies_by_timestamps)
+                   for start in range(0, len(configs), SWEEP_CHUNK_CONFIGS)]
+
+        return [record for future in futures for record in future.result()]
+
+
+def link_bias_from_captured_packets_reference(captured, outlier_sigmas=3):
+    """
+    The original per-packet implementation of
+    link_bias_from_captured_packets, kept as the reference for
+    check_link_bias_parity.
+    """
+    # (pkt1 << PACKET_KEY_BITS | pkt2) -> PacketSpacing
+    #
+    packet_spacing = collections.defaultdict(lambda: PacketSpacing())
+
+    # capture_host -> (packet -> capture_time_ns)
+    #
+    capture_time_by_host_packet = collections.defaultdict(dict)
+
+    # (src, dst) -> (packet, capture_time_ns) of the previous packet sent
+    #
+    prev_by_pair = {}
+
+    # First pass: Populate packet_spacing (send only) and capture_time_by_packet.
+    #
+    for batch in packet_batches(captured):
+        capture_hosts = batch.capture_host_addr_ip().tolist()
+        capture_times = batch.capture_time_ns.tolist()
+
+        for key, src_addr_ip, dst_addr_ip, capture_host, capture_time in zip(
+                packet_keys(batch), batch.src_addr_ip.tolist(), batch.dst_addr_ip.tolist(),
+                capture_hosts, capture_times):
+            capture_time_by_host_packet[capture_host][key] = capture_time
+
+            # If this packet was captured by the sending host, add an entry to the packet spacing map.
+            #
+            if capture_host == src_addr_ip:
+                host_pair = (src_addr_ip << 32) | dst_addr_ip
+                prev = prev_by_pair.get(host_pair)
+
+                if prev is not None:
+                    prev_key, prev_time = prev
+                    delta = capture_time - prev_time
+
+                    # Ignore non-positive packet send intervals.
+                    #
+                    if delta > 0:
+                        spacing = packet_spacing[(prev_key << pcap_scan.PACKET_KEY_BITS) | key]
+                        spacing.send_interval_usec = delta / NSEC_PER_USEC
+                        spacing.pkt1_size = prev_key & pcap_scan.PACKET_KEY_SIZE_MASK
+                        spacing.pkt2_size = key & pcap_scan.PACKET_KEY_SIZE_MASK
+
+                prev_by_pair[host_pair] = (key, capture_time)
+
+    # Second pass: Fill in missing recv_interval_usec fields in packet_spacing values.
+    #
+    for pkt_pair, spacing in packet_spacing.items():
+        pkt1 = pkt_pair >> pcap_scan.PACKET_KEY_BITS
+        pkt2 = pkt_pair & pcap_scan.PACKET_KEY_MASK
+        dst_host = (pkt1 >> pcap_scan.PACKET_KEY_DST_SHIFT) & pcap_scan.PACKET_KEY_ADDR_MASK
+        recv_times = capture_time_by_host_packet[dst_host]
+
+        pkt1_recv_time_ns = recv_times.get(pkt1)
+        if pkt1_recv_time_ns is None:
+            continue
+
+        pkt2_recv_time_ns = recv_times.get(pkt2)
+        if pkt2_recv_time_ns is None:
+            continue
+
+        delta = pkt2_recv_time_ns - pkt1_recv_time_ns
+
+        if delta > 0:
+            spacing.recv_interval_usec = delta / NSEC_PER_USEC
+
+    # Group the valid (delta() != None) PacketSpacing values by host pair.
+    #
+    packet_spacing_by_pair = collections.defaultdict(lambda: [])
+    for pkt_pair, spacing in packet_spacing.items():
+        if spacing.delta() is not None:
+            src_addr_ip, dst_addr_ip, *_ = pcap_scan.unpack_packet_key(
+                pkt_pair >> pcap_scan.PACKET_KEY_BITS)
+            packet_spacing_by_pair[
+                HostPair(src_addr_ip=int_to_ip(src_addr_ip),
+                         dst_addr_ip=int_to_ip(dst_addr_ip))
+            ].append(spacing)
+
+    # Compute the final result.
+    #
+    transmit_deltas_by_host_pair = {
+        host_pair: transmit_delta
+        for host_pair, samples in packet_spacing_by_pair.items()
+        for transmit_delta in (TransmitDelta.from_samples(samples, outlier_sigmas),)
+        if transmit_delta is not None
+    }
+
+    return (link_bias_from_transmit_deltas(transmit_deltas_by_host_pair),
+            transmit_deltas_by_host_pair)
+
+
+def check_link_bias_parity(captured, outlier_sigmas=3, rel_tol=1e-9):
+    """
+    Runs link_bias_from_captured_packets and the reference implementation
+    on the same packets, returning a list of their differences (empty if
+    they agree).  Floats are compared to `rel_tol`, as the accumulators'
+    streamed moments and the reference's whole-sample statistics don't
+    round sums the same way.
+
+    The TransmitDeltaAccumulators are set to summarize every sample
+    exactly, so that any difference is a bug rather than sketch error.
+    """
+    captured = PacketTable.concat(packet_batches(captured))
+    link_bias, transmit_deltas = link_bias_from_captured_packets(
+        captured, outlier_sigmas, relative_accuracy=None, reservoir_size=None)
+    expected_link_bias, expected_transmit_deltas = \
+        link_bias_from_captured_packets_reference(captured, outlier_sigmas)
+
+    def differ(a, b):
+        return not math.isclose(a, b, rel_tol=rel_tol, abs_tol=rel_tol)
+
+    diffs = []
+
+    if list(transmit_deltas) != list(expected_transmit_deltas):
+        diffs.append(f"transmit delta host pairs: {list(transmit_deltas)} != "
+                     f"{list(expected_transmit_deltas)}")
+
+    for host_pair in transmit_deltas.keys() & expected_transmit_deltas.keys():
+        delta = transmit_deltas[host_pair]
+        expected = expected_transmit_deltas[host_pair]
+        if delta.count != expected.count:
+            diffs.append(f"{host_pair} count: {delta.count} != {expected.count}")
+        for name in ("mean", "median", "stdev"):
+            if differ(getattr(delta, name), getattr(expected, name)):
+                diffs.append(f"{host_pair} {name}: {getattr(delta, name)} != "
+                             f"{getattr(expected, name)}")
+        if (len(delta.samples) != len(expected.samples) or
+                any(differ(x[0], y[0]) or x[1:] != y[1:]
+                    for x, y in zip(delta.samples, expected.samples))):
+            diffs.append(f"{host_pair} samples differ ({len(delta.samples)} vs "
+                         f"{len(expected.samples)})")
+
+    if list(link_bias) != list(expected_link_bias):
+        diffs.append(f"link bias host pairs: {list(link_bias)} != "
+                     f"{list(expected_link_bias)}")
+
+    for host_pair in link_bias.keys() & expected_link_bias.keys():
+        bias = link_bias[host_pair]
+        expected = expected_link_bias[host_pair]
+        for name in ("query_bias", "reply_bias"):
+            if differ(getattr(bias, name), getattr(expected, name)):
+                diffs.append(f"{host_pair} {name}: {getattr(bias, name)} != "
+                             f"{getattr(expected, name)}")
+
+    return diffs
+
+
+def addr_ip_str_rank(addr_ips):
+    """
+    Returns the rank of each uint32 IP in the string order of the dotted
+    IPs, for sorting tables consistently with the string IPs of Packet.
+    """
+    addrs, inverse = numpy.unique(addr_ips, return_inverse=True)
+    by_str = sorted(range(len(addrs)), key=lambda i: int_to_ip(addrs[i]))
+
+    rank = numpy.empty(len(addrs), dtype=numpy.int64)
+    rank[by_str] = numpy.arange(len(addrs))
+    return rank[inverse]
+
+
+def captured_to_traced_packets(captured, window_ns=MATCH_WINDOW_NS):
+    """
+    Matches the copies of each packet captured on its sender and on its
+    receiver, returning a TracedPacketTable.
+
+    Rows of a PacketTable are sorted by packet identity, capture role
+    (sender copies first) and capture time; within an identity, the i-th
+    receiver copy is paired with the i-th sender copy.  An iterable of
+    batches merged by capture time (e.g. from iter_pcap_files) is instead
+    matched as it is read, by traced_packet_batches.
+    """
+    if not isinstance(captured, PacketTable):
+        return TracedPacketTable.concat(traced_packet_batches(captured,
+                                                              window_ns)).sorted()
+
+    capture_host = captured.capture_host_addr_ip()
+
+    # 0: captured by the sender, 1: by the receiver, 2: by neither.
+    #
+    role = numpy.where(capture_host == captured.src_addr_ip, 0,
+                       numpy.where(capture_host == captured.dst_addr_ip, 1, 2))
+
+    # Packet identity as (src ip, dst ip) and (src port, dst port, seq) words
+    # plus the size, which shares its word with the role.
+    #
+    addrs = ((captured.src_addr_ip.astype(numpy.uint64) << numpy.uint64(32)) |
+             captured.dst_addr_ip.astype(numpy.uint64))
+    ports_seq = ((captured.src_port_tcp.astype(numpy.uint64) << numpy.uint64(48)) |
+                 (captured.dst_port_tcp.astype(numpy.uint64) << numpy.uint64(32)) |
+                 captured.seq_tcp.astype(numpy.uint64))
+    size_role = ((captured.size_bytes.astype(numpy.uint64) << numpy.uint64(2)) |
+                 role.astype(numpy.uint64))
+
+    order = numpy.lexsort((captured.capture_time_ns, size_role, ports_seq, addrs))
+    sorted_role = role[order]
+
+    # Number the runs of equal identity ("groups") in sorted order.
     #
-    # Therefore:
-    # e = (((Rr - Sr) * Bq - ((Rq - Sq) * Br) / 2
+    new_group = numpy.zeros(len(order), dtype=bool)
+    new_group[:1] = True
+    for column in (addrs, ports_seq, size_role >> numpy.uint64(2)):
+        sorted_column = column[order]
+        new_group[1:] |= sorted_column[1:] != sorted_column[:-1]
+    group = numpy.cumsum(new_group) - 1
+    group_start = numpy.flatnonzero(new_group)
+
+    send_count = numpy.bincount(group[sorted_role == 0], minlength=len(group_start))
+    recv_count = numpy.bincount(group[sorted_role == 1], minlength=len(group_start))
+
+    # The receiver copies of a group directly follow its sender copies.
     #
+    recv_rows = numpy.flatnonzero(sorted_role == 1)
+    recv_group = group[recv_rows]
+    rank = recv_rows - group_start[recv_group] - send_count[recv_group]
+    paired = rank < send_count[recv_group]
+
+    recv_index = order[recv_rows[paired]]
+    send_index = order[group_start[recv_group[paired]] + rank[paired]]
+
+    columns = {
+        name: getattr(captured, name)[send_index]
+        for name in ("src_addr_ip", "dst_addr_ip", "src_port_tcp", "dst_port_tcp",
+                     "seq_tcp", "size_bytes", "payload_bytes")
+    }
+    columns["send_time_ns"] = captured.capture_time_ns[send_index]
+    columns["recv_time_ns"] = captured.capture_time_ns[recv_index]
 
-    def query_latency_usec(self):
-        return self.query_recv_time_usec - self.query_send_time_usec
+    return TracedPacketTable(
+        unmatched=len(captured) - 2 * len(send_index),
+        duplicates=int(numpy.maximum(send_count - 1, 0).sum() +
+                       numpy.maximum(recv_count - 1, 0).sum()),
+        **columns).sorted()
 
-    def reply_latency_usec(self):
-        return self.reply_recv_time_usec - self.reply_send_time_usec
 
-    def query_cost(self, clock_skew, link_bias):
-        return (self.query_latency_usec() + clock_skew) / link_bias.query_bias
+def traced_packet_batches(captured, window_ns=MATCH_WINDOW_NS):
+    """
+    Streaming version of captured_to_traced_packets over PacketTable batches
+    merged by capture time: yields TracedPacketTable batches (in completion
+    order, not sorted) as packets are matched.  A copy whose counterpart
+    hasn't shown up within `window_ns` of the latest capture time is counted
+    as unmatched (see pcap_scan.match_columns), so memory stays proportional
+    to the window rather than to the captures.
+    """
+    merged = ((batch.columns(), batch.capture_host_addr_ip()) for batch in captured)
+    for columns, unmatched, duplicates in pcap_scan.match_columns(merged, window_ns):
+        yield TracedPacketTable(unmatched, duplicates, **columns)
 
-    def reply_cost(self, clock_skew, link_bias):
-        return (self.reply_latency_usec() - clock_skew) / link_bias.reply_bias
 
-    def estimate_clock_skew(self, link_bias):
-        return (self.reply_latency_usec() * link_bias.query_bias -
-                self.query_latency_usec() * link_bias.reply_bias) / 2.0
+def stream_traced_packets(host_files, window_ns=MATCH_WINDOW_NS, packet_filter=None):
+    """
+    traced_packet_batches of a list of (capture host, pcap filename), merged
+    by capture time by iter_pcap_files.
+    """
+    return traced_packet_batches(iter_pcap_files(host_files, packet_filter), window_ns)
 
 
-#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
-#
-@dataclass_json
-@dataclass(eq=True, order=True, frozen=True)
-class TCPPacketFlowId:
+def addr_ip_column(hosts):
     """
-    A four-tuple of (ip:port,ip:port) representing a TCP connection;
-    normalized so that the first ip:port pair is less-than the second.
+    Returns the uint32 IPs of a list of host strings.  Hosts that aren't IPs
+    (e.g. names missing from the mesh config) become 0.0.0.0, which is never
+    captured, so that flow lookups simply miss.
     """
-    first_addr_ip: str
-    first_port_tcp: int
-    second_addr_ip: str
-    second_port_tcp: int
+    addr_ips = {}
+    for host in set(hosts):
+        try:
+            addr_ips[host] = ip_to_int(host)
+        except OSError:
+            addr_ips[host] = 0
 
-    def from_endpoints(first_addr_ip, first_port_tcp, second_addr_ip, second_port_tcp):
-        if (first_addr_ip, first_port_tcp) > (second_addr_ip, second_port_tcp):
-            first_addr_ip, second_addr_ip = second_addr_ip, first_addr_ip
-            first_port_tcp, second_port_tcp = second_port_tcp, first_port_tcp
+    return numpy.array([addr_ips[host] for host in hosts], dtype=numpy.uint32)
 
-        return TCPPacketFlowId(first_addr_ip=first_addr_ip,
-                               first_port_tcp=first_port_tcp,
-                               second_addr_ip=second_addr_ip,
-                               second_port_tcp=second_port_tcp)
 
-    def from_packet(packet):
-        return TCPPacketFlowId.from_endpoints(
-            packet.src_addr_ip, packet.src_port_tcp,
-            packet.dst_addr_ip, packet.dst_port_tcp
-        )
+def nearest_rpc_packets(rpcs, traced_packets):
+    """
+    Finds the traced packets (TracedPacketTable) sent closest to the query
+    and reply send times of each TraceRPC, returning (query rows, query dt,
+    reply rows, reply dt) columns as FlowTimeIndex.nearest does (dt in ns).
+    """
+    index = traced_packets.send_time_index()
 
-    def from_rpc(rpc):
-        return TCPPacketFlowId.from_endpoints(
-            rpc.client_host, rpc.client_port,
-            rpc.server_host, rpc.server_port
-        )
+    client_ip = addr_ip_column([rpc.client_host for rpc in rpcs])
+    server_ip = addr_ip_column([rpc.server_host for rpc in rpcs])
+    client_port = numpy.array([rpc.client_port for rpc in rpcs], dtype=numpy.uint16)
+    server_port = numpy.array([rpc.server_port for rpc in rpcs], dtype=numpy.uint16)
 
+    query_rows, query_dt = index.nearest(
+        client_ip, client_port, server_ip, server_port,
+        [usec_to_ns(rpc.query_send_time_usec) for rpc in rpcs])
+    reply_rows, reply_dt = index.nearest(
+        server_ip, server_port, client_ip, client_port,
+        [usec_to_ns(rpc.reply_send_time_usec) for rpc in rpcs])
 
-#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
-# Functions
+    return query_rows, query_dt, reply_rows, reply_dt
 
-def tags_to_dict(tags):
+
+def rpc_message_packets(rpcs, traced_packets):
     """
-    Converts a list of dicts with "key" and "value" keys into a single dict.
+    Resolves the query and reply of each TraceRPC to their first and last
+    wire segments (see TCPSeqIndex.messages), returning (query first, query
+    last, reply first, reply last) columns of traced packet rows, -1 where
+    a message couldn't be resolved.
     """
-    return {t["key"]: t["value"] for t in tags}
+    index = traced_packets.seq_index()
+
+    client_ip = addr_ip_column([rpc.client_host for rpc in rpcs])
+    server_ip = addr_ip_column([rpc.server_host for rpc in rpcs])
+    client_port = numpy.array([rpc.client_port for rpc in rpcs], dtype=numpy.uint16)
+    server_port = numpy.array([rpc.server_port for rpc in rpcs], dtype=numpy.uint16)
 
+    query_first, query_last = index.messages(
+        client_ip, client_port, server_ip, server_port,
+        [usec_to_ns(rpc.query_send_time_usec) for rpc in rpcs])
+    reply_first, reply_last = index.messages(
+        server_ip, server_port, client_ip, client_port,
+        [usec_to_ns(rpc.reply_send_time_usec) for rpc in rpcs])
 
-def normalize_host(host):
+    return query_first, query_last, reply_first, reply_last
+
+
+def rpcs_with_packet_times(rpcs, traced_packets, query_send_rows, query_recv_rows,
+                           reply_send_rows, reply_recv_rows):
     """
-    Returns the value in HOST_TO_IP for the passed host string, if present, else
-    returns host.
+    Returns the TraceRPCs with their span timestamps replaced by the send
+    and receive times of the given rows of traced_packets (query send,
+    query receive, reply send and reply receive row columns).  RPCs with
+    any row -1 are dropped: their span timestamps are not wire times.
     """
-    return HOST_TO_IP.get(host) or host
+    send_time_usec = traced_packets.send_time_ns / NSEC_PER_USEC
+    recv_time_usec = traced_packets.recv_time_ns / NSEC_PER_USEC
 
+    resolved = ((query_send_rows >= 0) & (query_recv_rows >= 0) &
+                (reply_send_rows >= 0) & (reply_recv_rows >= 0))
+    if not resolved.any():
+        return []
 
-def remove_outliers(samples, n_sigmas=3):
-    sigma = statistics.stdev(samples)
-    median = statistics.median(samples)
-    return [x for x in samples
-            if abs(x - median) < sigma * n_sigmas]
+    return [
+        dataclasses.replace(
+            rpc,
+            query_send_time_usec=query_send,
+            query_recv_time_usec=query_recv,
+            reply_send_time_usec=reply_send,
+            reply_recv_time_usec=reply_recv)
+        for rpc, ok, query_send, query_recv, reply_send, reply_recv in zip(
+                rpcs, resolved.tolist(),
+                send_time_usec[query_send_rows].tolist(),
+                recv_time_usec[query_recv_rows].tolist(),
+                send_time_usec[reply_send_rows].tolist(),
+                recv_time_usec[reply_recv_rows].tolist())
+        if ok
+    ]
 
 
-def read_spans(stream):
-    raw_trace = json.load(stream)
-    print(f"TRACE COUNT = {len(raw_trace['data'])}")
-    raw_spans = [span
-                 for trace in raw_trace["data"]
-                 for span in trace["spans"]]
+def replace_message_timestamps(rpcs, traced_packets):
+    """
+    Replaces the span timestamps of each TraceRPC with the wire times of its
+    messages: query/reply send times from their first segment and receive
+    times from their last (see rpc_message_packets).  RPCs whose messages
+    couldn't be resolved fall back to the packets closest to them (see
+    replace_packet_timestamps), and RPCs without either are dropped.
+    """
+    query_first, query_last, reply_first, reply_last = rpc_message_packets(
+        rpcs, traced_packets)
+    query_rows, _query_dt, reply_rows, _reply_dt = nearest_rpc_packets(
+        rpcs, traced_packets)
 
-    return [TraceSpan.from_raw_span(s) for s in raw_spans]
+    resolved = (query_first >= 0) & (reply_first >= 0)
 
+    return rpcs_with_packet_times(rpcs, traced_packets,
+                                  numpy.where(resolved, query_first, query_rows),
+                                  numpy.where(resolved, query_last, query_rows),
+                                  numpy.where(resolved, reply_first, reply_rows),
+                                  numpy.where(resolved, reply_last, reply_rows))
 
-def read_spans_from_trace_file(filename):
-    with open(TRACE_FILE, 'r') as stream:
-        return read_spans(stream)
 
+def replace_packet_timestamps(rpcs, traced_packets):
+    """
+    Replaces the span timestamps of each TraceRPC with those of the traced
+    packets closest to them (see nearest_rpc_packets).  RPCs whose query or
+    reply connection wasn't traced are dropped.
+    """
+    query_rows, _query_dt, reply_rows, _reply_dt = nearest_rpc_packets(
+        rpcs, traced_packets)
 
-def rpcs_from_trace_spans(spans):
-    # Build a lookup table to quickly find any span by its ID.
-    #
-    spans_by_id = {
-        span.span_id: span
-        for span in spans
-    }
+    return rpcs_with_packet_times(rpcs, traced_packets,
+                                  query_rows, query_rows, reply_rows, reply_rows)
 
-    # Build a lookup table to find the parent ID of any span (by ID).
-    #
-    span_parent = {
-        child: span.span_id
-        for span in spans
-        for child in span.children
-    }
 
-    # Sanity check: the mapped parent of every child of a span must be that span.
-    #
-    for span in spans:
-        parent = span.span_id
-        for child in span.children:
-            assert span_parent[child] == parent
+def print_link_intervals(link_intervals, confidence=BOOTSTRAP_CONFIDENCE):
+    """
+    Prints the LinkIntervals by link of bootstrap_link_estimates.
+    """
+    def interval(ci):
+        return f"{ci.estimate:.3f} [{ci.lower:.3f}, {ci.upper:.3f}]"
 
-    # Join pairs of client and server spans to form a list of objects that contain
-    # information about individual RPCs.
-    #
-    rpcs = [
-        TraceRPC(
-            link=HostPair(src_addr_ip=client_span.host,
-                          dst_addr_ip=server_span.host),
-            client_span=client_span.span_id,
-            server_span=server_span.span_id,
-            client_host=client_span.host,
-            client_port=int(server_span.peer_port or 0),
-            server_host=server_span.host,
-            server_port=int(client_span.peer_port or 0),
-            query_send_time_usec=client_span.start_time_usec,
-            query_recv_time_usec=server_span.start_time_usec,
-            reply_send_time_usec=server_span.end_time_usec,
-            reply_recv_time_usec=client_span.end_time_usec
-        )
-        for server_span in spans
-        if (server_span.kind == "server" and server_span.span_id in span_parent)
-        for client_span in (spans_by_id[span_parent[server_span.span_id]],)
-        if (client_span.kind == "client" and
-            client_span.host != server_span.host and
-            client_span.host == server_span.peer_host and
-            server_span.host == client_span.peer_host)
-    ]
+    for link, intervals in link_intervals.items():
+        print(f"{link.src_addr_ip} -> {link.dst_addr_ip}: "
+              f"{round(confidence * 100)}% bootstrap CI "
+              f"(rpcs={intervals.rpc_count}, 2pm samples={intervals.query_samples}/"
+              f"{intervals.reply_samples})")
+        print(f"  query_bias={interval(intervals.query_bias)}")
+        print(f"  clock_skew={interval(intervals.clock_skew)}usec")
+        print(f"  query_cost={interval(intervals.query_cost)}, "
+              f"reply_cost={interval(intervals.reply_cost)}")
+
+
+def pretty_json(dataclass_value):
+    return json.dumps(dataclasses.asdict(dataclass_value), indent=2)
+
+
+def add_to_hist(ax, bins, summary, label):
+    """
+    Adds the values of a robust_stats.Summary to a histogram, labelled with
+    their mean and stdev.
+    """
+    ax.hist(summary.values, bins, alpha=0.5,
+            label=(f"{label} (avg={round(summary.mean, 1)}" +
+                   f" σ={round(summary.stdev, 2)})"))
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Pipeline stages
+#
+# The steps run by the Makefile (see tracedoppler.py), on plain records: spans
+# and RPCs are dicts and traced packets are tuples in PACKET_* field order.
+
+PACKET_SRC_IP = 0
+PACKET_SRC_PORT = 1
+PACKET_DST_IP = 2
+PACKET_DST_PORT = 3
+PACKET_SEND_TIME = 4
+PACKET_RECV_TIME = 5
+PACKET_SEQ = 6
+PACKET_SIZE = 7
+
+# Field names of the columns of a packets file written with --format=npz, in
+# PACKET_* order.
+#
+PACKET_COLUMNS = (
+    "src.addr.ip",
+    "src.port.tcp",
+    "dst.addr.ip",
+    "dst.port.tcp",
+    "send.time.usec",
+    "recv.time.usec",
+    "seq.tcp",
+    "size.bytes",
+)
+
+
+def span_record(span, host_to_ip=None):
+    """
+    Returns the span record of a raw Jaeger span, discarding information we
+    don't think we will use.
+    """
+    span_tags = tags_to_dict(span["tags"])
+    process_tags = tags_to_dict(span["process"]["tags"])
+
+    return {
+        "traceID": span["traceID"],
+        "spanID": span["spanID"],
+        "startTime": span["startTime"],
+        "endTime": span["startTime"] + span["duration"],
+        "tags": span_tags,
+        "children": span["childSpanIds"],
+        "host": normalize_host(process_tags.get("host.name"), host_to_ip),
+        "kind": span_tags.get("span.kind"),
+        "peer.host": normalize_host(span_tags.get("net.peer.name") or
+                                    span_tags.get("net.sock.peer.addr"),
+                                    host_to_ip),
+        "peer.port": (span_tags.get("net.peer.port") or
+                      span_tags.get("net.sock.peer.port")),
+    }
 
-    return rpcs
 
+def read_span_records(stream, host_to_ip=None):
+    """
+    Reads the span records of the RPC (client and server) spans of a Jaeger
+    trace JSON export from the binary `stream`, a trace at a time (see
+    trace_scan.iter_trace_spans); their "tags" only keep
+    trace_scan.SPAN_TAG_KEYS.
+    """
+    import trace_scan
 
-def read_pcaps(host, stream):
-    raw_pcaps = dpkt.pcap.Reader(stream)
     return [
-        captured
-        for ts_sec, buf in raw_pcaps
-        for captured in (CapturedPacket.from_pcap(host, ts_sec, buf),)
-        if (captured.packet is not None and
-            (host == captured.packet.src_addr_ip or
-             host == captured.packet.dst_addr_ip))
+        span_record(span, host_to_ip)
+        for trace_spans in trace_scan.iter_trace_spans(stream)
+        for span in trace_spans
     ]
 
 
-def read_pcap_file(host, filename):
-    with open(filename, 'rb') as stream:
-        return read_pcaps(host, stream)
+def update_rpc_latencies(rpc):
+    query_send_time_usec = rpc["query.send.time.usec"]
+    query_recv_time_usec = rpc["query.recv.time.usec"]
+    reply_send_time_usec = rpc["reply.send.time.usec"]
+    reply_recv_time_usec = rpc["reply.recv.time.usec"]
 
+    query_latency_usec = query_recv_time_usec - query_send_time_usec
+    reply_latency_usec = reply_recv_time_usec - reply_send_time_usec
 
-def link_bias_from_captured_packets(captured_packets, outlier_sigmas=3):
-    # (pkt1, pkt2) -> PacketSpacing
-    #
-    packet_spacing = collections.defaultdict(lambda: PacketSpacing())
+    rpc["query.latency.usec"] = query_latency_usec
+    rpc["reply.latency.usec"] = reply_latency_usec
+    rpc["avg.latency.usec"] = (query_latency_usec + reply_latency_usec) / 2.0
+    rpc["split.skew.usec"] = (query_latency_usec - reply_latency_usec) / 2.0
 
-    # capture_host -> (packet -> capture_time_usec)
-    #
-    capture_time_by_host_packet = collections.defaultdict(lambda: collections.defaultdict(lambda: 0.0))
+    return rpc
 
-    # HostPair -> Packet
-    #
-    prev_by_pair = collections.defaultdict(lambda: None)
 
-    # First pass: Populate packet_spacing (send only) and capture_time_by_packet.
-    #
-    for captured in captured_packets:
-        assert captured is not None
+def rpc_records_from_span_records(spans):
+    """
+    Joins pairs of client and server span records into RPC records (see
+    rpc_span_rows).
+    """
+    clients, servers = rpc_span_rows(SpanTable.from_trace_spans(
+        TraceSpan.from_record(span) for span in spans))
 
-        host_pair = HostPair.from_packet(captured.packet)
+    return [
+        update_rpc_latencies({
+            "link": ','.join((client_span["host"], server_span["host"])),
+            "client.span": client_span["spanID"],
+            "server.span": server_span["spanID"],
+            "client.host": client_span["host"],
+            "client.port": int(server_span["peer.port"] or 0),
+            "server.host": server_span["host"],
+            "server.port": int(client_span["peer.port"] or 0),
+            "query.send.time.usec": client_span["startTime"], # t0
+            "query.recv.time.usec": server_span["startTime"], # t1
+            "reply.send.time.usec": server_span["endTime"], # t2
+            "reply.recv.time.usec": client_span["endTime"], # t3
+        })
+        for client_span, server_span in zip([spans[i] for i in clients.tolist()],
+                                            [spans[i] for i in servers.tolist()])
+    ]
 
-        capture_time_by_host_packet[captured.capture_host_ip][captured.packet] = captured.capture_time_usec
 
-        # If this packet was captured by the sending host, add an entry to the packet spacing map.
-        #
-        captured_by_sender = (captured.capture_host_ip == captured.packet.src_addr_ip)
-        if captured_by_sender:
-            prev = prev_by_pair[host_pair]
+def correct_rpc_record_skew(rpc, avg_skew_usec):
+    query_latency_usec = rpc["query.latency.usec"]
+    reply_latency_usec = rpc["reply.latency.usec"]
 
-            if prev is not None:
-                delta = captured.capture_time_usec - prev.capture_time_usec
+    rpc["query.latency.usec"] = query_latency_usec - avg_skew_usec
+    rpc["reply.latency.usec"] = reply_latency_usec + avg_skew_usec
 
-                # Ignore non-positive packet send intervals.
-                #
-                if delta > 0.0:
-                    packet_pair = (prev.packet, captured.packet)
-                    packet_spacing[packet_pair].send_interval_usec = delta
-                    packet_spacing[packet_pair].pkt1_size = prev.packet.size_bytes
-                    packet_spacing[packet_pair].pkt2_size = captured.packet.size_bytes
+    return rpc
 
-            prev_by_pair[host_pair] = captured
 
-    # Second pass: Fill in missing recv_interval_usec fields in packet_spacing values.
-    #
-    for (pkt1, pkt2) in packet_spacing:
-        assert pkt1.src_addr_ip == pkt2.src_addr_ip
-        assert pkt1.dst_addr_ip == pkt2.dst_addr_ip
+def correct_rpc_records_skew(rpcs, windows=None):
+    """
+    Removes the average split skew of `rpcs` from their query and reply
+    latencies.
+
+    If `windows` (a sketches.SlidingWindows) is given, the average is taken
+    per link and window instead, and each RPC is corrected by that of its
+    link interpolated at the time of its query, so that clock drift over a
+    long capture is followed.
+    """
+    if not rpcs:
+        return rpcs
+
+    if windows is not None:
+        skew_series = windowed_mean_series(
+            [rpc["link"] for rpc in rpcs],
+            [rpc["query.send.time.usec"] for rpc in rpcs],
+            [rpc["split.skew.usec"] for rpc in rpcs],
+            windows)
+
+        return [
+            correct_rpc_record_skew(
+                rpc, float(skew_series[rpc["link"]].at(rpc["query.send.time.usec"])))
+            for rpc in rpcs
+        ]
+
+    avg_skew_usec = (
+        float(sum([rpc["split.skew.usec"] for rpc in rpcs])) /
+        float(len(rpcs))
+    )
 
-        dst_host = pkt1.dst_addr_ip
+    return [correct_rpc_record_skew(rpc, avg_skew_usec) for rpc in rpcs]
 
-        pkt1_recv_time_usec = capture_time_by_host_packet[dst_host][pkt1]
-        if pkt1_recv_time_usec == 0.0:
-            continue
 
-        pkt2_recv_time_usec = capture_time_by_host_packet[dst_host][pkt2]
-        if pkt2_recv_time_usec == 0.0:
+def correct_rpc_records_using_packets(rpcs, packets):
+    """
+    Replaces the span timestamps of each RPC record with those of the
+    traced packet rows (in PACKET_* order) sent closest to its query and
+    reply; RPCs whose connection has no packets are dropped.
+    """
+    if not rpcs:
+        return rpcs
+
+    src_ip, src_port, dst_ip, dst_port, send_time, recv_time, _seq, _size = (
+        list(column) for column in zip(*packets)) if packets else ([],) * 8
+    index = FlowTimeIndex(addr_ip_column(src_ip), src_port,
+                          addr_ip_column(dst_ip), dst_port, send_time)
+
+    client_ip = addr_ip_column([rpc["client.host"] for rpc in rpcs])
+    server_ip = addr_ip_column([rpc["server.host"] for rpc in rpcs])
+    client_port = [rpc["client.port"] for rpc in rpcs]
+    server_port = [rpc["server.port"] for rpc in rpcs]
+
+    query_rows, _query_dt = index.nearest(
+        client_ip, client_port, server_ip, server_port,
+        [rpc["query.send.time.usec"] for rpc in rpcs])
+    reply_rows, _reply_dt = index.nearest(
+        server_ip, server_port, client_ip, client_port,
+        [rpc["reply.send.time.usec"] for rpc in rpcs])
+
+    corrected = []
+    for rpc, query_row, reply_row in zip(rpcs, query_rows.tolist(),
+                                         reply_rows.tolist()):
+        if query_row < 0 or reply_row < 0:
             continue
 
-        delta = pkt2_recv_time_usec - pkt1_recv_time_usec
+        rpc["query.send.time.usec"] = send_time[query_row]
+        rpc["query.recv.time.usec"] = recv_time[query_row]
+        rpc["reply.send.time.usec"] = send_time[reply_row]
+        rpc["reply.recv.time.usec"] = recv_time[reply_row]
 
-        if delta > 0.0:
-            packet_spacing[(pkt1, pkt2)].recv_interval_usec = delta
+        update_rpc_latencies(rpc)
+        corrected.append(rpc)
 
-    # Filter out any invalid (==None) PacketSpacing delta values.
-    #
-    packet_spacing = {
-        packet_pair: spacing
-        for packet_pair, spacing in packet_spacing.items()
-        if spacing.delta() is not None
-    }
+    return corrected
 
-    # Compute the final result.
+
+def packet_records_from_columns(columns):
+    """
+    Converts decoded pcap columns (see pcap_scan.COLUMNS) to the JSON
+    records written by the pcap2json command.
+    """
+    # Convert each distinct address to a string once, not once per packet.
     #
-    packet_spacing_by_pair = collections.defaultdict(lambda: [])
-    for (packet, _), spacing in packet_spacing.items():
-        packet_spacing_by_pair[
-            HostPair(src_addr_ip = packet.src_addr_ip,
-                     dst_addr_ip = packet.dst_addr_ip)
-        ].append(spacing)
+    addrs, addr_index = numpy.unique(
+        numpy.concatenate((columns["src_addr_ip"], columns["dst_addr_ip"])),
+        return_inverse=True)
+    addr_strs = [int_to_ip(addr) for addr in addrs.tolist()]
+    src_index, dst_index = numpy.split(addr_index, 2)
 
-    transmit_deltas_by_host_pair = {
-        host_pair: transmit_delta
-        for host_pair, samples in packet_spacing_by_pair.items()
-        for transmit_delta in (TransmitDelta.from_samples(samples, outlier_sigmas),)
-        if transmit_delta is not None
-    }
+    return [
+        {
+            "time.usec": time_ns // NSEC_PER_USEC,
+            "time.nsec": time_ns,
+            "size.bytes": size_bytes,
+            "src.addr.ip": addr_strs[src],
+            "src.port.tcp": src_port,
+            "dst.addr.ip": addr_strs[dst],
+            "dst.port.tcp": dst_port,
+            "seq.tcp": seq,
+        }
+        for time_ns, size_bytes, src, src_port, dst, dst_port, seq in zip(
+                columns["capture_time_ns"].tolist(),
+                columns["size_bytes"].tolist(),
+                src_index.tolist(),
+                columns["src_port_tcp"].tolist(),
+                dst_index.tolist(),
+                columns["dst_port_tcp"].tolist(),
+                columns["seq_tcp"].tolist())
+    ]
 
-    link_bias = {}
 
-    for host_pair, transmit_delta in transmit_deltas_by_host_pair.items():
-        reverse_pair = host_pair.reverse()
-        if reverse_pair not in transmit_deltas_by_host_pair:
-            continue
+def iter_packet_records(host, stream):
+    """
+    Yields the packet records (see packet_records_from_columns) of a pcap
+    stream captured on `host`, decoding it in bounded-size batches.
+    """
+    for columns in pcap_scan.iter_pcap_stream_columns(ip_to_int(host), stream):
+        yield from packet_records_from_columns(columns)
 
-        reverse_delta = transmit_deltas_by_host_pair[reverse_pair]
 
-        link_bias[host_pair] = LinkBias.from_transmit_deltas(
-            query_delta=transmit_delta,
-            reply_delta=reverse_delta
-        )
+def rpc_packet_filter(rpcs):
+    """
+    Returns a PacketFilter that only keeps packets of the TCP connections
+    used by `rpcs` (RPC records).
+    """
+    return pcap_scan.PacketFilter(flows=numpy.array(sorted(set(
+        pcap_scan.flow_key(ip_to_int(rpc["client.host"]), rpc["client.port"],
+                           ip_to_int(rpc["server.host"]), rpc["server.port"])
+        for rpc in rpcs
+    )), dtype=pcap_scan.FLOW_KEY_DTYPE))
 
-    return link_bias, transmit_deltas_by_host_pair
 
+def traced_packet_table_rows(traced):
+    """
+    Returns the rows, in PACKET_* order, of the packets of a
+    TracedPacketTable (times truncated to usec).
+    """
+    addrs, inverse = numpy.unique(numpy.concatenate((traced.src_addr_ip,
+                                                     traced.dst_addr_ip)),
+                                  return_inverse=True)
+    addr_strs = numpy.array([int_to_ip(addr) for addr in addrs.tolist()], dtype=object)
+    src_ips, dst_ips = numpy.split(addr_strs[inverse], 2)
+
+    return list(zip(src_ips.tolist(),
+                    traced.src_port_tcp.tolist(),
+                    dst_ips.tolist(),
+                    traced.dst_port_tcp.tolist(),
+                    (traced.send_time_ns // NSEC_PER_USEC).tolist(),
+                    (traced.recv_time_ns // NSEC_PER_USEC).tolist(),
+                    traced.seq_tcp.tolist(),
+                    traced.size_bytes.tolist()))
+
+
+def traced_packet_row_batches(host_pcap_files, window_ns=MATCH_WINDOW_NS,
+                              packet_filter=None):
+    """
+    Streaming version of traced_packet_rows: yields the rows of each batch
+    of stream_traced_packets as packets are matched (in match order, not
+    sorted), holding only `window_ns` worth of unmatched packets in memory.
+    """
+    for traced in stream_traced_packets(list(host_pcap_files.items()), window_ns,
+                                        packet_filter):
+        yield traced_packet_table_rows(traced)
 
-def captured_to_traced_packets(all_captured):
-    # The final result.
-    #
-    traced_packets = []
 
-    # Use a dict to match up packets captured on the sender and receiver.
-    #
-    match_by_packet = {}
+def traced_packet_rows(host_pcap_files, workers=INGEST_WORKERS, packet_filter=None):
+    """
+    Matches the packets of {host IP: pcap filename} captured on both their
+    sender and receiver (see captured_to_traced_packets), returning sorted
+    rows in PACKET_* order.  Captures are decoded whole, in parallel across
+    `workers` processes; see traced_packet_row_batches to stream them
+    instead.
+    """
+    captured = read_pcap_files(host_pcap_files.items(), workers=workers,
+                               packet_filter=packet_filter)
+    return sorted(traced_packet_table_rows(captured_to_traced_packets(captured)))
 
-    for captured in all_captured:
 
-        # If we haven't seen this packet before, add it and move on.
-        #
-        if captured.packet not in match_by_packet:
-            match_by_packet[captured.packet] = captured
-            continue
+def plot_rpc_latency_hist(rpcs, output_image_filename=None):
+    """
+    Plots the distribution of query and reply latencies of RPC records, to
+    `output_image_filename` or else to the screen.
+    """
+    from matplotlib import pyplot
 
-        # This packet has already been seen.  Verify we have both sender
-        # and receiver CapturedPacket and create a single TracedPacket
-        # with the timestamps of both.
-        #
-        matched = match_by_packet[captured.packet]
+    all_latencies = [
+        latency_usec
+        for rpc in rpcs
+        for latency_usec in (rpc["query.latency.usec"],
+                             rpc["reply.latency.usec"])
+    ]
 
-        if matched.capture_host_ip == captured.packet.src_addr_ip:
-            sent, received = matched, captured
-        else:
-            assert matched.capture_host_ip == captured.packet.dst_addr_ip
-            sent, received = captured, matched
+    min_latency_usec = min(all_latencies)
+    max_latency_usec = max(all_latencies)
 
-        traced_packets.append(
-            TracedPacket(send_time_usec=sent.capture_time_usec,
-                         recv_time_usec=received.capture_time_usec,
-                         packet=sent.packet))
+    min_latency_usec -= min_latency_usec % 10
+    max_latency_usec += 9
+    max_latency_usec -= max_latency_usec % 10
 
-        del(match_by_packet[captured.packet])
+    print("min=", min_latency_usec)
+    print("max=", max_latency_usec)
 
-    return sorted(traced_packets, key=TracedPacket.ordinal)
+    query_latency_usec = [rpc["query.latency.usec"] for rpc in rpcs]
+    reply_latency_usec = [rpc["reply.latency.usec"] for rpc in rpcs]
 
+    bins = numpy.linspace(min_latency_usec, max_latency_usec, 100)
 
-def replace_packet_timestamps(rpcs, traced_packets):
-    result = []
+    fig, ax = pyplot.subplots()
 
-    for rpc in rpcs:
-        query_packet, _dt = TracedPacket.find_closest(
-            traced_packets,
-            rpc.client_host, rpc.client_port,
-            rpc.server_host, rpc.server_port,
-            rpc.query_send_time_usec
-        )
-        reply_packet, _dt = TracedPacket.find_closest(
-            traced_packets,
-            rpc.server_host, rpc.server_port,
-            rpc.client_host, rpc.client_port,
-            rpc.reply_send_time_usec
-        )
-        result.append(dataclasses.replace(
-            rpc,
-            query_send_time_usec=query_packet.send_time_usec,
-            query_recv_time_usec=query_packet.recv_time_usec,
-            reply_send_time_usec=reply_packet.send_time_usec,
-            reply_recv_time_usec=reply_packet.recv_time_usec
-        ))
+    ax.hist(query_latency_usec, bins, alpha=0.5, label='query')
+    ax.hist(reply_latency_usec, bins, alpha=0.5, label='reply')
+    ax.legend(loc='upper right')
+    ax.set_xlabel('Network Delay (usec)')
+    ax.set_ylabel('Count')
 
-    return result
+    if output_image_filename:
+        fig.savefig(output_image_filename)
+        pyplot.close(fig)
+    else:
+        pyplot.show()
 
 
-def pretty_json(dataclass_value):
-    return json.dumps(dataclass_value.to_dict(), indent=2)
+def plot_rpc_skew_hist(rpcs, output_image_filename=None):
+    """
+    Plots the distribution of the split skew of RPC records, to
+    `output_image_filename` or else to the screen.
+    """
+    from matplotlib import pyplot
+
+    skews_usec = [
+        rpc["split.skew.usec"]
+        for rpc in rpcs
+    ]
+
+    min_skew_usec = min(skews_usec)
+    max_skew_usec = max(skews_usec)
+
+    min_skew_usec -= min_skew_usec % 10
+    max_skew_usec += 9
+    max_skew_usec -= max_skew_usec % 10
+
+    print("min=", min_skew_usec)
+    print("max=", max_skew_usec)
 
+    bins = numpy.linspace(min_skew_usec, max_skew_usec, 100)
 
-def add_to_hist(ax, bins, data, label):
-    ax.hist(data, bins, alpha=0.5,
-            label=(f"{label} (avg={round(statistics.mean(data), 1)}" +
-                   f" σ={round(statistics.stdev(data), 2)})"))
+    fig, ax = pyplot.subplots()
+
+    ax.hist(skews_usec, bins, alpha=0.5, label=None)
+    #ax.legend(loc='upper right')
+    ax.set_xlabel('Server-side Clock Skew (usec)')
+    ax.set_ylabel('Count')
+
+    if output_image_filename:
+        fig.savefig(output_image_filename)
+        pyplot.close(fig)
+    else:
+        pyplot.show()
 
 
 #=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
 
 def main(args):
+    import ingest_cache
+    import robust_stats
+    import sketches
+
+    # matplotlib takes longer to import than everything else put together, so
+    # only the commands that plot pay for it.
+    #
+    from matplotlib import pyplot
+
     pyplot.rc('font', family='serif')
     pyplot.rc('font', serif='Times New Roman')
     pyplot.rc('text', usetex='false')
     pyplot.rcParams.update({'font.size': 12})
 
-    # Load all captured packets.
+    # Usage: pipeline.py [--config=MESH_JSON] [--window-ms=MS] [--no-bootstrap]
     #
-    all_captured = [
-        p
-        for host, filename in PCAP_FILES
-        for p in read_pcap_file(host, filename)
-    ]
-
-    # Calculate transmit deltas using the "Two Packets Method."
+    config_file = CONFIG_FILE
+    window_ns = None
+    bootstrap_intervals = True
+    for arg in args[1:]:
+        if arg.startswith("--config="):
+            config_file = arg[len("--config="):]
+        elif arg.startswith("--window-ms="):
+            window_ns = int(float(arg[len("--window-ms="):]) * NSEC_PER_USEC * 1000)
+        elif arg == "--no-bootstrap":
+            bootstrap_intervals = False
+
+    mesh = MeshConfig.from_file(config_file)
+    cache = ingest_cache.IngestCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+    # Calculate transmit deltas using the "Two Packets Method," streaming the
+    # captures so that only the packets within the match window are held.
     #
-    link_bias, transmit_deltas = link_bias_from_captured_packets(all_captured)
+    link_bias, transmit_deltas = link_bias_from_captured_packets(
+        iter_pcap_files(mesh.pcap_files))
     print("len(link_bias)=", len(link_bias))
 
     for host_pair, bias in link_bias.items():
         print(host_pair, bias)
 
-    # Trace captured packets from sender to receiver.
-    #
-    traced_packets = captured_to_traced_packets(all_captured)
-    for p in traced_packets[:3]:
-        print(pretty_json(p))
+    for host_pair, delta in transmit_deltas.items():
+        print(f"{host_pair.src_addr_ip} -> {host_pair.dst_addr_ip}: "
+              f"mean={delta.mean}, median={delta.median}, samples={delta.count}")
 
     # Load spans.
     #
-    spans = read_spans_from_trace_file(TRACE_FILE)
+    spans = read_spans_from_trace_file(mesh.trace_file, mesh.host_to_ip, cache=cache,
+                                       trace_format=mesh.trace_format)
     for s in spans[:5]:
         print(pretty_json(s))
 
@@ -718,14 +3365,40 @@ def main(args):
     #
     rpcs = rpcs_from_trace_spans(spans)
 
-    # Extract RPC flow ids and filter packets.
+    # Extract RPC flow ids and load only their packets: the filter drops the
+    # others while the captures are decoded.
     #
     rpc_flow_ids = set(TCPPacketFlowId.from_rpc(r) for r in rpcs)
-    rpc_packets = [p for p in all_captured
-                   if TCPPacketFlowId.from_packet(p.packet) in rpc_flow_ids]
+    rpc_filter = make_packet_filter(flow_ids=rpc_flow_ids)
+
+    # Trace captured packets from sender to receiver.  If a match window is
+    # given, the RPC packets are never loaded whole: the captures are
+    # streamed again for each consumer of rpc_packet_batches() instead.
+    #
+    if window_ns is None:
+        rpc_packets = read_pcap_files(mesh.pcap_files, packet_filter=rpc_filter, cache=cache)
+        traced_packets = captured_to_traced_packets(rpc_packets)
+    else:
+        rpc_packets = None
+        traced_packets = TracedPacketTable.concat(
+            stream_traced_packets(mesh.pcap_files, window_ns, rpc_filter)).sorted()
+
+    def rpc_packet_batches():
+        if rpc_packets is not None:
+            return rpc_packets
+        return iter_pcap_files(mesh.pcap_files, rpc_filter)
+
+    print(f"len(traced_packets)={len(traced_packets)}, "
+          f"unmatched={traced_packets.unmatched}, duplicates={traced_packets.duplicates}")
+    for host_pair, count in traced_packets.host_pair_counts().items():
+        print(f"{host_pair.src_addr_ip} -> {host_pair.dst_addr_ip}: {count} traced packets")
+    for p in traced_packets[:3]:
+        print(pretty_json(p))
 
-    print(f"\nlen(all_captured)={len(all_captured)}, len(rpc_packets)={len(rpc_packets)}")
-    filtered_link_bias, filtered_transmit_deltas = link_bias_from_captured_packets(rpc_packets)
+    if rpc_packets is not None:
+        print(f"\nlen(rpc_packets)={len(rpc_packets)}")
+    filtered_link_bias, filtered_transmit_deltas = link_bias_from_captured_packets(
+        rpc_packet_batches())
     print("len(filtered_link_bias)=", len(filtered_link_bias))
     for host_pair, bias in filtered_link_bias.items():
         print(host_pair, bias)
@@ -733,7 +3406,7 @@ def main(args):
     # Print some RPCs and derived information.
     #
     def print_rpc_summary(r):
-        bias = link_bias[r.link]
+        bias = rpc_link_bias(link_bias, r)
         clock_skew = r.estimate_clock_skew(bias)
 
         print("\nRPC:")
@@ -747,21 +3420,25 @@ def main(args):
     for r in rpcs[:5]:
         print_rpc_summary(r)
 
-    packet_ts_rpcs = replace_packet_timestamps(rpcs, traced_packets)
-    print("\nPacket Timestamp-Corrected RPCS:")
+    packet_ts_rpcs = replace_message_timestamps(rpcs, traced_packets)
+    print(f"\nPacket Timestamp-Corrected RPCS ({len(rpcs) - len(packet_ts_rpcs)} of "
+          f"{len(rpcs)} without traced packets dropped):")
     for r in packet_ts_rpcs[:5]:
         print_rpc_summary(r)
 
-    skew_no_bias = remove_outliers(
+    # Unbiased skew estimates, summarized once and reused below.
+    #
+    skew_no_bias_all = robust_stats.summarize(
         [r.estimate_clock_skew(LinkBias.null())
          for r in rpcs]
     )
+    skew_no_bias = remove_outliers(skew_no_bias_all.values)
 
     #skew_all_packets_bias = [r.estimate_clock_skew(link_bias[r.link])
     #                         for r in rpcs]
 
     skew_rpc_packets_bias = remove_outliers(
-        [r.estimate_clock_skew(link_bias[r.link])
+        [r.estimate_clock_skew(rpc_link_bias(link_bias, r))
          for r in rpcs]
     )
 
@@ -774,16 +3451,16 @@ def main(args):
     #                         for r in packet_ts_rpcs]
 
     skew_rpc_packets_bias_pts = remove_outliers(
-        [r.estimate_clock_skew(link_bias[r.link])
+        [r.estimate_clock_skew(rpc_link_bias(link_bias, r))
          for r in packet_ts_rpcs]
     )
 
     #+++++++++++-+-+--+----- --- -- -  -  -   -
     #
-    data = skew_no_bias + skew_no_bias_pts + skew_rpc_packets_bias_pts + skew_rpc_packets_bias
+    data = numpy.concatenate([skew_no_bias.values, skew_no_bias_pts.values, skew_rpc_packets_bias_pts.values, skew_rpc_packets_bias.values])
 
-    min_value = min(data)
-    max_value = max(data)
+    min_value = data.min()
+    max_value = data.max()
 
     min_value -= min_value % 10
     max_value += 9
@@ -807,26 +3484,54 @@ def main(args):
 
     #+++++++++++-+-+--+----- --- -- -  -  -   -
     #
-    avg_clock_skew_pts_2pm = statistics.mean([
-        r.estimate_clock_skew(filtered_link_bias[r.link])
-        for r in packet_ts_rpcs
-    ])
+    # Time-varying link bias and clock skew: each RPC is corrected with the
+    # estimates of its link interpolated at its own time, so that clock
+    # drift over the capture is followed.
+    #
+    windows = sketches.SlidingWindows(SKEW_WINDOW_USEC, SKEW_HOP_USEC)
+    filtered_link_bias_series = link_bias_series(rpc_packet_batches(), windows)
+    skew_series = clock_skew_series(packet_ts_rpcs, windows, filtered_link_bias_series)
+
+    for host_pair, series in skew_series.items():
+        print(f"{host_pair.src_addr_ip} -> {host_pair.dst_addr_ip}: clock skew over "
+              f"{len(series.value)} windows, min={series.value.min()}, "
+              f"max={series.value.max()}")
 
     query_cost_pts_2pm = remove_outliers([
-        r.query_cost(avg_clock_skew_pts_2pm, filtered_link_bias[r.link])
+        r.query_cost(rpc_clock_skew_at(skew_series, r),
+                     rpc_link_bias_at(filtered_link_bias_series, r))
         for r in packet_ts_rpcs
     ], 20)
 
     reply_cost_pts_2pm = remove_outliers([
-        r.reply_cost(avg_clock_skew_pts_2pm, filtered_link_bias[r.link])
+        r.reply_cost(rpc_clock_skew_at(skew_series, r),
+                     rpc_link_bias_at(filtered_link_bias_series, r))
         for r in packet_ts_rpcs
     ], 20)
 
+    # Error bars of the per-link (whole capture) estimates, so that shifts
+    # between runs can be told apart from noise (about a second per link
+    # with the default replicates and process pool).
+    #
+    if bootstrap_intervals:
+        print_link_intervals(bootstrap_link_estimates(packet_ts_rpcs,
+                                                      rpc_packet_batches()))
+
     #----- --- -- -  -  -   -
-    avg_clock_skew_raw = statistics.mean([
-        r.estimate_clock_skew(LinkBias.null())
-        for r in rpcs
-    ])
+    fig, ax = pyplot.subplots()
+
+    fig.suptitle('Clock Skew over Time (PTS,2PM)')
+
+    for host_pair, series in skew_series.items():
+        ax.plot((series.time_usec - series.time_usec[0]) / USEC_PER_SEC, series.value,
+                marker='.', label=f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip}")
+
+    ax.legend(loc='upper left')
+    ax.set_xlabel("Time (sec; window middle)")
+    ax.set_ylabel("Clock Skew (usec; client - server)")
+
+    #----- --- -- -  -  -   -
+    avg_clock_skew_raw = skew_no_bias_all.mean
 
     query_cost_raw = remove_outliers([
         r.query_cost(avg_clock_skew_raw, LinkBias.null())
@@ -839,10 +3544,10 @@ def main(args):
     ], 20)
 
     #----- --- -- -  -  -   -
-    data = query_cost_raw + reply_cost_raw
+    data = numpy.concatenate([query_cost_raw.values, reply_cost_raw.values])
 
-    min_value = min(data)
-    max_value = max(data)
+    min_value = data.min()
+    max_value = data.max()
 
     min_value -= min_value % 10
     max_value += 9
@@ -864,10 +3569,10 @@ def main(args):
     ax.set_title(f"Mean clock skew (client - server) = {round(avg_clock_skew_raw, 1)} usec")
 
     #----- --- -- -  -  -   -
-    data = query_cost_pts_2pm + reply_cost_pts_2pm + query_cost_raw + reply_cost_raw
+    data = numpy.concatenate([query_cost_pts_2pm.values, reply_cost_pts_2pm.values, query_cost_raw.values, reply_cost_raw.values])
 
-    min_value = min(data)
-    max_value = max(data)
+    min_value = data.min()
+    max_value = data.max()
 
     min_value -= min_value % 10
     max_value += 9
@@ -891,83 +3596,84 @@ def main(args):
 
     #+++++++++++-+-+--+----- --- -- -  -  -   -
     #
-    query_latency_pts = remove_outliers([
-        r.query_latency_usec()
-        for r in packet_ts_rpcs
-    ])
+    # The packet timestamp (PTS) figures need RPCs matched to traced packets.
+    #
+    if packet_ts_rpcs:
+        query_latency_pts = remove_outliers([
+            r.query_latency_usec()
+            for r in packet_ts_rpcs
+        ])
 
-    reply_latency_pts = remove_outliers([
-        r.reply_latency_usec()
-        for r in packet_ts_rpcs
-    ])
+        reply_latency_pts = remove_outliers([
+            r.reply_latency_usec()
+            for r in packet_ts_rpcs
+        ])
 
-    #----- --- -- -  -  -   -
-    data = query_latency_pts + reply_latency_pts
+        #----- --- -- -  -  -   -
+        data = numpy.concatenate([query_latency_pts.values, reply_latency_pts.values])
 
-    min_value = min(data)
-    max_value = max(data)
+        min_value = data.min()
+        max_value = data.max()
 
-    min_value -= min_value % 10
-    max_value += 9
-    max_value -= max_value % 10
+        min_value -= min_value % 10
+        max_value += 9
+        max_value -= max_value % 10
 
-    bins = numpy.linspace(min_value, max_value, HIST_BINS)
+        bins = numpy.linspace(min_value, max_value, HIST_BINS)
 
-    #----- --- -- -  -  -   -
-    fig, ax = pyplot.subplots()
+        #----- --- -- -  -  -   -
+        fig, ax = pyplot.subplots()
 
-    fig.suptitle('Histogram of Packet Network Latency (Query + Reply)')
+        fig.suptitle('Histogram of Packet Network Latency (Query + Reply)')
 
-    add_to_hist(ax, bins, query_latency_pts, "Query")
-    add_to_hist(ax, bins, reply_latency_pts, "Reply")
+        add_to_hist(ax, bins, query_latency_pts, "Query")
+        add_to_hist(ax, bins, reply_latency_pts, "Reply")
 
-    ax.legend(loc='upper left')
-    ax.set_xlabel("Packet Latency (usec; recv_time - sent_time)")
-    ax.set_ylabel("Count (Messages)")
-    ax.set_title(f"({-min(query_latency_pts)} usec < Clock Skew < {min(reply_latency_pts)} usec)")
+        ax.legend(loc='upper left')
+        ax.set_xlabel("Packet Latency (usec; recv_time - sent_time)")
+        ax.set_ylabel("Count (Messages)")
+        ax.set_title(f"({-query_latency_pts.values.min()} usec < Clock Skew < "
+                     f"{reply_latency_pts.values.min()} usec)")
 
 
-    #+++++++++++-+-+--+----- --- -- -  -  -   -
-    #
-    avg_clock_skew_pts = statistics.mean(remove_outliers(
-        [r.estimate_clock_skew(LinkBias.null())
-         for r in packet_ts_rpcs]
-    ))
+        #+++++++++++-+-+--+----- --- -- -  -  -   -
+        #
+        avg_clock_skew_pts = skew_no_bias_pts.mean
 
-    query_cost_pts = remove_outliers([
-        r.query_cost(avg_clock_skew_pts, LinkBias.null())
-        for r in packet_ts_rpcs
-    ])
+        query_cost_pts = remove_outliers([
+            r.query_cost(avg_clock_skew_pts, LinkBias.null())
+            for r in packet_ts_rpcs
+        ])
 
-    reply_cost_pts = remove_outliers([
-        r.reply_cost(avg_clock_skew_pts, LinkBias.null())
-        for r in packet_ts_rpcs
-    ])
+        reply_cost_pts = remove_outliers([
+            r.reply_cost(avg_clock_skew_pts, LinkBias.null())
+            for r in packet_ts_rpcs
+        ])
 
-    #----- --- -- -  -  -   -
-    data = query_cost_pts + reply_cost_pts
+        #----- --- -- -  -  -   -
+        data = numpy.concatenate([query_cost_pts.values, reply_cost_pts.values])
 
-    min_value = min(data)
-    max_value = max(data)
+        min_value = data.min()
+        max_value = data.max()
 
-    min_value -= min_value % 10
-    max_value += 9
-    max_value -= max_value % 10
+        min_value -= min_value % 10
+        max_value += 9
+        max_value -= max_value % 10
 
-    bins = numpy.linspace(min_value, max_value, HIST_BINS)
+        bins = numpy.linspace(min_value, max_value, HIST_BINS)
 
-    #----- --- -- -  -  -   -
-    fig, ax = pyplot.subplots()
+        #----- --- -- -  -  -   -
+        fig, ax = pyplot.subplots()
 
-    fig.suptitle('Histogram of Packet Cost (Query + Reply)')
+        fig.suptitle('Histogram of Packet Cost (Query + Reply)')
 
-    add_to_hist(ax, bins, query_cost_pts, "Query")
-    add_to_hist(ax, bins, reply_cost_pts, "Reply")
+        add_to_hist(ax, bins, query_cost_pts, "Query")
+        add_to_hist(ax, bins, reply_cost_pts, "Reply")
 
-    ax.legend(loc='upper right')
-    ax.set_xlabel("Packet Cost (unitless)")
-    ax.set_ylabel("Count (Messages)")
-    ax.set_title(f"Mean clock skew (client - server) = {round(avg_clock_skew_pts, 1)} usec")
+        ax.legend(loc='upper right')
+        ax.set_xlabel("Packet Cost (unitless)")
+        ax.set_ylabel("Count (Messages)")
+        ax.set_title(f"Mean clock skew (client - server) = {round(avg_clock_skew_pts, 1)} usec")
 
     #+++++++++++-+-+--+----- --- -- -  -  -   -
     #
@@ -982,10 +3688,10 @@ def main(args):
     ])
 
     #----- --- -- -  -  -   -
-    data = query_latency_raw + reply_latency_raw
+    data = numpy.concatenate([query_latency_raw.values, reply_latency_raw.values])
 
-    min_value = min(data)
-    max_value = max(data)
+    min_value = data.min()
+    max_value = data.max()
 
     min_value -= min_value % 10
     max_value += 9
@@ -1004,7 +3710,8 @@ def main(args):
     ax.legend(loc='upper left')
     ax.set_xlabel("Network Latency (usec; recv_time - sent_time)")
     ax.set_ylabel("Count (Messages)")
-    ax.set_title(f"({-min(query_latency_raw)} usec < Clock Skew < {min(reply_latency_raw)} usec)")
+    ax.set_title(f"({-query_latency_raw.values.min()} usec < Clock Skew < "
+                 f"{reply_latency_raw.values.min()} usec)")
 
     #+++++++++++-+-+--+----- --- -- -  -  -   -
 
@@ -1021,7 +3728,7 @@ def main(args):
             samples = transmit_delta.samples
             x = [size  for _, _, size  in samples]
             y = [delta for delta, _, _ in samples]
-            cf = statistics.correlation(x, y)
+            cf = robust_stats.correlation(x, y)
             axs[i].scatter(x, y)
             axs[i].set_title(f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip} (ρ = {round(cf, 2)})")
             axs[i].set_ylabel("Extra Packet Delay (usec)")
@@ -1048,7 +3755,7 @@ def main(args):
             samples = transmit_delta.samples
             x = [size  for _, size, _  in samples]
             y = [delta for delta, _, _ in samples]
-            cf = statistics.correlation(x, y)
+            cf = robust_stats.correlation(x, y)
             axs[i].scatter(x, y)
             axs[i].set_title(f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip} (ρ = {round(cf, 2)})")
             axs[i].set_ylabel("Extra Packet Delay (usec)")
@@ -1062,9 +3769,10 @@ def main(args):
 
     #+++++++++++-+-+--+----- --- -- -  -  -   -
 
-    assert len(transmit_deltas) == 2
-
-    fig, axs = pyplot.subplots(2, 1)
+    # One row per directed host pair of the mesh.
+    #
+    fig, axs = pyplot.subplots(len(transmit_deltas), 1, squeeze=False)
+    axs = axs[:, 0]
 
     fig.suptitle('Scatter Plot of Packet Size vs Extra Delay (2PM, All Packets)')
 
@@ -1074,7 +3782,7 @@ def main(args):
         samples = transmit_delta.samples
         x = [pkt2_size - pkt1_size  for delta, pkt1_size, pkt2_size  in samples]
         y = [delta for delta, _, _ in samples]
-        cf = statistics.correlation(x, y)
+        cf = robust_stats.correlation(x, y)
         axs[i].scatter(x, y)
         axs[i].set_title(f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip} (ρ = {round(cf, 2)})")
         axs[i].set_ylabel("Extra Packet Delay (usec)")
@@ -1101,7 +3809,7 @@ def main(args):
             samples = transmit_delta.samples
             x = [size  for _, _, size  in samples]
             y = [delta for delta, _, _ in samples]
-            cf = statistics.correlation(x, y)
+            cf = robust_stats.correlation(x, y)
             axs[i].scatter(x, y)
             axs[i].set_title(f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip} (ρ = {round(cf, 2)})")
             axs[i].set_ylabel("Extra Packet Delay (usec)")
@@ -1128,7 +3836,7 @@ def main(args):
             samples = transmit_delta.samples
             x = [size  for _, size, _  in samples]
             y = [delta for delta, _, _ in samples]
-            cf = statistics.correlation(x, y)
+            cf = robust_stats.correlation(x, y)
             axs[i].scatter(x, y)
             axs[i].set_title(f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip} (ρ = {round(cf, 2)})")
             axs[i].set_ylabel("Extra Packet Delay (usec)")
@@ -1155,7 +3863,7 @@ def main(args):
             samples = transmit_delta.samples
             x = [pkt2_size - pkt1_size  for _, pkt1_size, pkt2_size  in samples]
             y = [delta for delta, _, _ in samples]
-            cf = statistics.correlation(x, y)
+            cf = robust_stats.correlation(x, y)
             axs[i].scatter(x, y)
             axs[i].set_title(f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip} (ρ = {round(cf, 2)})")
             axs[i].set_ylabel("Extra Packet Delay (usec)")
@@ -1169,19 +3877,19 @@ def main(args):
 
     #+++++++++++-+-+--+----- --- -- -  -  -   -
     #
-    transmit_deltas_c2s = ([ #remove_outliers([
-        delta for delta, _, _ in list(transmit_deltas.values())[0].samples
-    ])
-
-    transmit_deltas_s2c = ([ #remove_outliers([
-        delta for delta, _, _ in list(transmit_deltas.values())[1].samples
-    ])
+    transmit_deltas_by_link = {
+        host_pair: [ #remove_outliers([
+            delta for delta, _, _ in transmit_delta.samples
+        ]
+        for host_pair, transmit_delta in transmit_deltas.items()
+    }
 
     #----- --- -- -  -  -   -
-    data = transmit_deltas_c2s + transmit_deltas_s2c
+    data = numpy.array([delta for deltas in transmit_deltas_by_link.values()
+                        for delta in deltas])
 
-    min_value = min(data)
-    max_value = max(data)
+    min_value = data.min()
+    max_value = data.max()
 
     min_value -= min_value % 10
     max_value += 9
@@ -1194,8 +3902,9 @@ def main(args):
 
     fig.suptitle('Histogram of Extra Delay (2PM)')
 
-    add_to_hist(ax, bins, transmit_deltas_c2s, "Query")
-    add_to_hist(ax, bins, transmit_deltas_s2c, "Reply")
+    for host_pair, deltas in transmit_deltas_by_link.items():
+        add_to_hist(ax, bins, robust_stats.summarize(deltas),
+                    f"{host_pair.src_addr_ip} to {host_pair.dst_addr_ip}")
 
     ax.legend(loc='upper right')
     ax.set_xlabel("Extra Latency (usec; receiver interval - sender)")
@@ -0,0 +1,689 @@
+import dataclasses
+import struct
+
+from typing import Optional
+
+
+# Readers of binary trace files: length-delimited streams of protobuf
+# messages (each message preceded by its length as a varint, as written by
+# protobuf's writeDelimitedTo), either OTLP TracesData (or the identical
+# ExportTraceServiceRequest) or Jaeger api_v2 Batch messages.
+#
+# The protobuf wire format is decoded directly, without generated classes:
+# only the fields we use are decoded, and the attributes of a span are only
+# decoded if its kind is one we keep.  Spans come out as ProtoSpans, holding
+# the same tags as the pruned spans of trace_scan, so that pipeline turns
+# them into the same TraceSpans as a Jaeger JSON export of the same traces.
+#
+# The writers at the end encode Jaeger JSON spans in either format, to
+# convert exports (e.g. for benchmarking the readers on the same traces).
+#
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Constants
+
+FORMAT_OTLP = "otlp"
+FORMAT_JAEGER = "jaeger_proto"
+FORMATS = (FORMAT_OTLP, FORMAT_JAEGER)
+
+DEFAULT_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Spans of other kinds can't be either end of an RPC (see trace_scan).
+#
+RPC_SPAN_KINDS = ("client", "server")
+
+# Tags kept, as in trace_scan (span.kind is an OTLP span field, not a tag).
+#
+SPAN_TAG_KEYS = frozenset(("span.kind", "net.peer.name", "net.peer.port",
+                           "net.sock.peer.addr", "net.sock.peer.port"))
+PROCESS_TAG_KEYS = frozenset(("host.name",))
+
+WIRE_VARINT = 0
+WIRE_I64 = 1
+WIRE_LEN = 2
+WIRE_I32 = 5
+
+MAX_VARINT_BYTES = 10
+
+# OTLP field numbers (opentelemetry/proto/trace/v1/trace.proto and
+# common/v1/common.proto).
+#
+OTLP_TRACES_RESOURCE_SPANS = 1
+OTLP_RESOURCE_SPANS_RESOURCE = 1
+OTLP_RESOURCE_SPANS_SCOPE_SPANS = 2
+OTLP_RESOURCE_ATTRIBUTES = 1
+OTLP_SCOPE_SPANS_SPANS = 2
+OTLP_SPAN_TRACE_ID = 1
+OTLP_SPAN_SPAN_ID = 2
+OTLP_SPAN_PARENT_SPAN_ID = 4
+OTLP_SPAN_NAME = 5
+OTLP_SPAN_KIND = 6
+OTLP_SPAN_START_TIME = 7
+OTLP_SPAN_END_TIME = 8
+OTLP_SPAN_ATTRIBUTES = 9
+OTLP_KEY_VALUE_KEY = 1
+OTLP_KEY_VALUE_VALUE = 2
+OTLP_VALUE_STRING = 1
+OTLP_VALUE_BOOL = 2
+OTLP_VALUE_INT = 3
+OTLP_VALUE_DOUBLE = 4
+OTLP_VALUE_BYTES = 7
+
+# Span.SpanKind values, named as in Jaeger's span.kind tag.
+#
+OTLP_SPAN_KINDS = {1: "internal", 2: "server", 3: "client", 4: "producer", 5: "consumer"}
+OTLP_SPAN_KIND_VALUES = {name: value for value, name in OTLP_SPAN_KINDS.items()}
+
+# Jaeger field numbers (jaeger-idl proto/api_v2/model.proto).
+#
+JAEGER_BATCH_SPANS = 1
+JAEGER_BATCH_PROCESS = 2
+JAEGER_SPAN_TRACE_ID = 1
+JAEGER_SPAN_SPAN_ID = 2
+JAEGER_SPAN_OPERATION_NAME = 3
+JAEGER_SPAN_REFERENCES = 4
+JAEGER_SPAN_START_TIME = 6
+JAEGER_SPAN_DURATION = 7
+JAEGER_SPAN_TAGS = 8
+JAEGER_SPAN_PROCESS = 10
+JAEGER_REF_TRACE_ID = 1
+JAEGER_REF_SPAN_ID = 2
+JAEGER_REF_TYPE = 3
+JAEGER_REF_CHILD_OF = 0
+JAEGER_PROCESS_SERVICE_NAME = 1
+JAEGER_PROCESS_TAGS = 2
+JAEGER_KEY_VALUE_KEY = 1
+JAEGER_KEY_VALUE_TYPE = 2
+JAEGER_KEY_VALUE_STR = 3
+JAEGER_KEY_VALUE_BOOL = 4
+JAEGER_KEY_VALUE_INT64 = 5
+JAEGER_KEY_VALUE_FLOAT64 = 6
+JAEGER_KEY_VALUE_BINARY = 7
+JAEGER_TIMESTAMP_SECONDS = 1
+JAEGER_TIMESTAMP_NANOS = 2
+
+# ValueType of Jaeger's KeyValue, by the "type" of Jaeger JSON tags.
+#
+JAEGER_VALUE_TYPES = {"string": 0, "bool": 1, "int64": 2, "float64": 3, "binary": 4}
+
+NSEC_PER_USEC = 1000
+USEC_PER_SEC = 1000 * 1000
+
+DOUBLE = struct.Struct("<d")
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclasses.dataclass
+class ProtoSpan:
+    """
+    A span read from a protobuf trace file: its IDs as integers (0: no
+    parent), its start time and duration in whole usec (as in Jaeger's
+    JSON), and its span and process tags as dicts of the kept keys.
+    span_tags is None for spans of a kind we don't keep, whose tags aren't
+    decoded.
+    """
+    trace_id: int
+    span_id: int
+    parent_span_id: int
+    start_time_usec: int
+    duration_usec: int
+    span_tags: Optional[dict]
+    process_tags: dict
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Decoding
+
+def varint(buf, pos):
+    """
+    Returns the varint at buf[pos] and the position after it.
+    """
+    value = buf[pos]
+    pos += 1
+    if value < 0x80:
+        return value, pos
+
+    value &= 0x7f
+    shift = 7
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def signed64(value):
+    """
+    Returns a varint-encoded int64 (two's complement) as a Python int.
+    """
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def fields(buf, pos, end):
+    """
+    Yields (field number, wire type, start, end) of each field of the
+    message buf[pos:end], buf[start:end] being the field's payload (for a
+    varint, the varint itself).
+    """
+    while pos < end:
+        key, pos = varint(buf, pos)
+        wire_type = key & 7
+        if wire_type == WIRE_VARINT:
+            start = pos
+            while buf[pos] >= 0x80:
+                pos += 1
+            pos += 1
+        elif wire_type == WIRE_LEN:
+            length, start = varint(buf, pos)
+            pos = start + length
+        elif wire_type == WIRE_I64:
+            start = pos
+            pos += 8
+        elif wire_type == WIRE_I32:
+            start = pos
+            pos += 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire_type}")
+
+        if pos > end:
+            raise ValueError("protobuf field runs past the end of its message")
+        yield key >> 3, wire_type, start, pos
+
+
+def otlp_any_value(buf, pos, end):
+    for number, _wire_type, start, stop in fields(buf, pos, end):
+        if number == OTLP_VALUE_STRING:
+            return buf[start:stop].decode()
+        if number == OTLP_VALUE_INT:
+            return signed64(varint(buf, start)[0])
+        if number == OTLP_VALUE_BOOL:
+            return bool(varint(buf, start)[0])
+        if number == OTLP_VALUE_DOUBLE:
+            return DOUBLE.unpack_from(buf, start)[0]
+        if number == OTLP_VALUE_BYTES:
+            return buf[start:stop]
+    return None
+
+
+def otlp_attributes(buf, ranges, keys):
+    """
+    Returns the OTLP KeyValues at `ranges` ((start, end) of each message)
+    whose key is in `keys`, as a dict.
+    """
+    attributes = {}
+    for pos, end in ranges:
+        key = value = None
+        for number, _wire_type, start, stop in fields(buf, pos, end):
+            if number == OTLP_KEY_VALUE_KEY:
+                key = buf[start:stop].decode()
+            elif number == OTLP_KEY_VALUE_VALUE:
+                value = (start, stop)
+        if key in keys and value is not None:
+            attributes[key] = otlp_any_value(buf, *value)
+    return attributes
+
+
+def otlp_span(buf, pos, end, process_tags, kinds):
+    trace_id = span_id = parent_span_id = kind = 0
+    start_time_ns = end_time_ns = 0
+    attributes = []
+
+    for number, _wire_type, start, stop in fields(buf, pos, end):
+        if number == OTLP_SPAN_ATTRIBUTES:
+            attributes.append((start, stop))
+        elif number == OTLP_SPAN_TRACE_ID:
+            trace_id = int.from_bytes(buf[start:stop], 'big')
+        elif number == OTLP_SPAN_SPAN_ID:
+            span_id = int.from_bytes(buf[start:stop], 'big')
+        elif number == OTLP_SPAN_PARENT_SPAN_ID:
+            parent_span_id = int.from_bytes(buf[start:stop], 'big')
+        elif number == OTLP_SPAN_KIND:
+            kind = varint(buf, start)[0]
+        elif number == OTLP_SPAN_START_TIME:
+            start_time_ns = int.from_bytes(buf[start:stop], 'little')
+        elif number == OTLP_SPAN_END_TIME:
+            end_time_ns = int.from_bytes(buf[start:stop], 'little')
+
+    kind = OTLP_SPAN_KINDS.get(kind)
+    span_tags = None
+    if kinds is None or kind in kinds:
+        span_tags = otlp_attributes(buf, attributes, SPAN_TAG_KEYS)
+        if kind is not None:
+            span_tags["span.kind"] = kind
+
+    # Jaeger truncates the start time and the duration to usec separately.
+    #
+    return ProtoSpan(trace_id=trace_id,
+                     span_id=span_id,
+                     parent_span_id=parent_span_id,
+                     start_time_usec=start_time_ns // NSEC_PER_USEC,
+                     duration_usec=(end_time_ns - start_time_ns) // NSEC_PER_USEC,
+                     span_tags=span_tags,
+                     process_tags=process_tags)
+
+
+def otlp_spans(buf, kinds=RPC_SPAN_KINDS):
+    """
+    Returns the ProtoSpans of an OTLP TracesData message, with the
+    "host.name" attribute of their resource as process tag.
+    """
+    spans = []
+    for number, _wire_type, pos, end in fields(buf, 0, len(buf)):
+        if number != OTLP_TRACES_RESOURCE_SPANS:
+            continue
+
+        resource_attributes = []
+        scope_spans = []
+        for number, _wire_type, start, stop in fields(buf, pos, end):
+            if number == OTLP_RESOURCE_SPANS_RESOURCE:
+                resource_attributes.extend(
+                    (attribute_start, attribute_stop)
+                    for attribute_number, _wire_type, attribute_start, attribute_stop
+                    in fields(buf, start, stop)
+                    if attribute_number == OTLP_RESOURCE_ATTRIBUTES)
+            elif number == OTLP_RESOURCE_SPANS_SCOPE_SPANS:
+                scope_spans.append((start, stop))
+
+        process_tags = otlp_attributes(buf, resource_attributes, PROCESS_TAG_KEYS)
+        for start, stop in scope_spans:
+            for number, _wire_type, span_start, span_stop in fields(buf, start, stop):
+                if number == OTLP_SCOPE_SPANS_SPANS:
+                    spans.append(otlp_span(buf, span_start, span_stop, process_tags, kinds))
+
+    return spans
+
+
+def jaeger_tags(buf, ranges, keys):
+    """
+    Returns the Jaeger KeyValues at `ranges` ((start, end) of each message)
+    whose key is in `keys`, as a dict.
+    """
+    tags = {}
+    for pos, end in ranges:
+        key = None
+        value_type = 0
+        values = {}
+        for number, _wire_type, start, stop in fields(buf, pos, end):
+            if number == JAEGER_KEY_VALUE_KEY:
+                key = buf[start:stop].decode()
+            elif number == JAEGER_KEY_VALUE_TYPE:
+                value_type = varint(buf, start)[0]
+            else:
+                values[number] = (start, stop)
+        if key not in keys:
+            continue
+
+        # ValueType: STRING, BOOL, INT64, FLOAT64, BINARY; missing values
+        # are the type's zero value.
+        #
+        start, stop = values.get(JAEGER_KEY_VALUE_STR + value_type, (0, 0))
+        if value_type == 0:
+            tags[key] = buf[start:stop].decode()
+        elif value_type == 1:
+            tags[key] = bool(varint(buf, start)[0]) if stop else False
+        elif value_type == 2:
+            tags[key] = signed64(varint(buf, start)[0]) if stop else 0
+        elif value_type == 3:
+            tags[key] = DOUBLE.unpack_from(buf, start)[0] if stop else 0.0
+        else:
+            tags[key] = buf[start:stop]
+    return tags
+
+
+def jaeger_process_tags(buf, pos, end):
+    return jaeger_tags(buf,
+                       [(start, stop)
+                        for number, _wire_type, start, stop in fields(buf, pos, end)
+                        if number == JAEGER_PROCESS_TAGS],
+                       PROCESS_TAG_KEYS)
+
+
+def jaeger_usec(buf, pos, end):
+    """
+    Returns a google.protobuf Timestamp or Duration in whole usec.
+    """
+    seconds = nanos = 0
+    for number, _wire_type, start, _stop in fields(buf, pos, end):
+        if number == JAEGER_TIMESTAMP_SECONDS:
+            seconds = signed64(varint(buf, start)[0])
+        elif number == JAEGER_TIMESTAMP_NANOS:
+            nanos = signed64(varint(buf, start)[0])
+    return seconds * USEC_PER_SEC + nanos // NSEC_PER_USEC
+
+
+def jaeger_parent_span_id(buf, references, trace_id):
+    """
+    Returns the span ID of the first CHILD_OF reference to a span of the
+    same trace (as Jaeger's Span.ParentSpanID), 0 if none.
+    """
+    for pos, end in references:
+        ref_trace_id = ref_span_id = 0
+        ref_type = JAEGER_REF_CHILD_OF
+        for number, _wire_type, start, stop in fields(buf, pos, end):
+            if number == JAEGER_REF_TRACE_ID:
+                ref_trace_id = int.from_bytes(buf[start:stop], 'big')
+            elif number == JAEGER_REF_SPAN_ID:
+                ref_span_id = int.from_bytes(buf[start:stop], 'big')
+            elif number == JAEGER_REF_TYPE:
+                ref_type = varint(buf, start)[0]
+        if ref_type == JAEGER_REF_CHILD_OF and ref_trace_id == trace_id:
+            return ref_span_id
+    return 0
+
+
+def jaeger_span(buf, pos, end, batch_process_tags, kinds):
+    trace_id = span_id = start_time_usec = duration_usec = 0
+    process_tags = batch_process_tags
+    references = []
+    tags = []
+
+    for number, _wire_type, start, stop in fields(buf, pos, end):
+        if number == JAEGER_SPAN_TAGS:
+            tags.append((start, stop))
+        elif number == JAEGER_SPAN_TRACE_ID:
+            trace_id = int.from_bytes(buf[start:stop], 'big')
+        elif number == JAEGER_SPAN_SPAN_ID:
+            span_id = int.from_bytes(buf[start:stop], 'big')
+        elif number == JAEGER_SPAN_REFERENCES:
+            references.append((start, stop))
+        elif number == JAEGER_SPAN_START_TIME:
+            start_time_usec = jaeger_usec(buf, start, stop)
+        elif number == JAEGER_SPAN_DURATION:
+            duration_usec = jaeger_usec(buf, start, stop)
+        elif number == JAEGER_SPAN_PROCESS:
+            process_tags = jaeger_process_tags(buf, start, stop)
+
+    span_tags = jaeger_tags(buf, tags, SPAN_TAG_KEYS)
+    if kinds is not None and span_tags.get("span.kind") not in kinds:
+        span_tags = None
+
+    return ProtoSpan(trace_id=trace_id,
+                     span_id=span_id,
+                     parent_span_id=jaeger_parent_span_id(buf, references, trace_id),
+                     start_time_usec=start_time_usec,
+                     duration_usec=duration_usec,
+                     span_tags=span_tags,
+                     process_tags=process_tags)
+
+
+def jaeger_spans(buf, kinds=RPC_SPAN_KINDS):
+    """
+    Returns the ProtoSpans of a Jaeger Batch message (spans without a
+    process of their own have the batch's).
+    """
+    process_tags = {}
+    spans = []
+    for number, _wire_type, start, stop in fields(buf, 0, len(buf)):
+        if number == JAEGER_BATCH_PROCESS:
+            process_tags = jaeger_process_tags(buf, start, stop)
+        elif number == JAEGER_BATCH_SPANS:
+            spans.append((start, stop))
+
+    return [jaeger_span(buf, start, stop, process_tags, kinds) for start, stop in spans]
+
+
+def iter_delimited(stream, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Yields the messages of a length-delimited stream of protobuf messages,
+    as bytes.
+    """
+    buf = b""
+    pos = 0
+    eof = False
+    while True:
+        if len(buf) - pos < MAX_VARINT_BYTES and not eof:
+            block = stream.read(block_bytes)
+            eof = not block
+            buf = buf[pos:] + block
+            pos = 0
+        if pos == len(buf):
+            return
+
+        try:
+            length, start = varint(buf, pos)
+        except IndexError:
+            raise ValueError("protobuf stream ends inside of a message length") from None
+
+        while start + length > len(buf) and not eof:
+            block = stream.read(max(block_bytes, start + length - len(buf)))
+            eof = not block
+            buf = buf[pos:] + block
+            start -= pos
+            pos = 0
+        if start + length > len(buf):
+            raise ValueError("protobuf stream ends inside of a message")
+
+        yield buf[start:start + length]
+        pos = start + length
+
+
+def iter_spans(stream, trace_format, kinds=RPC_SPAN_KINDS):
+    """
+    Yields the ProtoSpans of a length-delimited protobuf trace file of
+    `trace_format` (FORMAT_OTLP or FORMAT_JAEGER), in file order; the tags
+    of spans whose kind isn't in `kinds` (None: all kinds) aren't decoded.
+    """
+    if trace_format == FORMAT_OTLP:
+        message_spans = otlp_spans
+    elif trace_format == FORMAT_JAEGER:
+        message_spans = jaeger_spans
+    else:
+        raise ValueError(f"unknown protobuf trace format {trace_format!r}")
+
+    for message in iter_delimited(stream):
+        try:
+            yield from message_spans(message, kinds)
+        except IndexError:
+            raise ValueError("truncated protobuf message") from None
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Encoding
+
+def encode_varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_field(number, wire_type, payload):
+    """
+    Returns an encoded field: `payload` is an int for WIRE_VARINT (two's
+    complement if negative) and bytes (or str) for the other wire types.
+    """
+    key = encode_varint(number << 3 | wire_type)
+    if wire_type == WIRE_VARINT:
+        return key + encode_varint(payload & ((1 << 64) - 1))
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if wire_type == WIRE_LEN:
+        return key + encode_varint(len(payload)) + payload
+    return key + payload
+
+
+def encode_delimited(message):
+    return encode_varint(len(message)) + message
+
+
+def trace_id_bytes(trace_id):
+    return int(trace_id, 16).to_bytes(16, 'big')
+
+
+def span_id_bytes(span_id):
+    return int(span_id, 16).to_bytes(8, 'big')
+
+
+def parent_reference(span):
+    """
+    Returns the first CHILD_OF reference of a Jaeger JSON span to a span of
+    its trace, or None.
+    """
+    for reference in span["references"]:
+        if reference["refType"] == "CHILD_OF" and reference["traceID"] == span["traceID"]:
+            return reference
+    return None
+
+
+def otlp_any_value_bytes(tag):
+    value = tag["value"]
+    if tag["type"] == "bool":
+        return encode_field(OTLP_VALUE_BOOL, WIRE_VARINT, int(value))
+    if tag["type"] == "int64":
+        return encode_field(OTLP_VALUE_INT, WIRE_VARINT, value)
+    if tag["type"] == "float64":
+        return encode_field(OTLP_VALUE_DOUBLE, WIRE_I64, DOUBLE.pack(value))
+    return encode_field(OTLP_VALUE_STRING, WIRE_LEN, str(value))
+
+
+def otlp_key_value_bytes(tag):
+    return (encode_field(OTLP_KEY_VALUE_KEY, WIRE_LEN, tag["key"]) +
+            encode_field(OTLP_KEY_VALUE_VALUE, WIRE_LEN, otlp_any_value_bytes(tag)))
+
+
+def otlp_span_bytes(span):
+    out = [encode_field(OTLP_SPAN_TRACE_ID, WIRE_LEN, trace_id_bytes(span["traceID"])),
+           encode_field(OTLP_SPAN_SPAN_ID, WIRE_LEN, span_id_bytes(span["spanID"]))]
+
+    parent = parent_reference(span)
+    if parent is not None:
+        out.append(encode_field(OTLP_SPAN_PARENT_SPAN_ID, WIRE_LEN,
+                                span_id_bytes(parent["spanID"])))
+
+    out.append(encode_field(OTLP_SPAN_NAME, WIRE_LEN, span["operationName"]))
+    for tag in span["tags"]:
+        if tag["key"] == "span.kind":
+            out.append(encode_field(OTLP_SPAN_KIND, WIRE_VARINT,
+                                    OTLP_SPAN_KIND_VALUES.get(tag["value"], 0)))
+
+    start_time_ns = span["startTime"] * NSEC_PER_USEC
+    end_time_ns = (span["startTime"] + span["duration"]) * NSEC_PER_USEC
+    out.append(encode_field(OTLP_SPAN_START_TIME, WIRE_I64, start_time_ns.to_bytes(8, 'little')))
+    out.append(encode_field(OTLP_SPAN_END_TIME, WIRE_I64, end_time_ns.to_bytes(8, 'little')))
+
+    out.extend(encode_field(OTLP_SPAN_ATTRIBUTES, WIRE_LEN, otlp_key_value_bytes(tag))
+               for tag in span["tags"] if tag["key"] != "span.kind")
+    return b"".join(out)
+
+
+def otlp_traces_data(spans):
+    """
+    Encodes Jaeger JSON spans as an OTLP TracesData message, one
+    ResourceSpans per distinct process.
+    """
+    processes = {}
+    for span in spans:
+        process = span["process"]
+        key = (process["serviceName"], repr(process["tags"]))
+        processes.setdefault(key, (process, []))[1].append(span)
+
+    resource_spans = []
+    for process, process_spans in processes.values():
+        service_name = {"key": "service.name", "type": "string",
+                        "value": process["serviceName"]}
+        resource = b"".join(encode_field(OTLP_RESOURCE_ATTRIBUTES, WIRE_LEN,
+                                         otlp_key_value_bytes(tag))
+                            for tag in [service_name] + process["tags"])
+        scope_spans = b"".join(encode_field(OTLP_SCOPE_SPANS_SPANS, WIRE_LEN,
+                                            otlp_span_bytes(span))
+                               for span in process_spans)
+        resource_spans.append(encode_field(
+            OTLP_TRACES_RESOURCE_SPANS, WIRE_LEN,
+            encode_field(OTLP_RESOURCE_SPANS_RESOURCE, WIRE_LEN, resource) +
+            encode_field(OTLP_RESOURCE_SPANS_SCOPE_SPANS, WIRE_LEN, scope_spans)))
+
+    return b"".join(resource_spans)
+
+
+def jaeger_key_value_bytes(tag):
+    value_type = JAEGER_VALUE_TYPES.get(tag["type"], 0)
+    value = tag["value"]
+    if value_type == 1:
+        encoded = encode_field(JAEGER_KEY_VALUE_BOOL, WIRE_VARINT, int(value))
+    elif value_type == 2:
+        encoded = encode_field(JAEGER_KEY_VALUE_INT64, WIRE_VARINT, value)
+    elif value_type == 3:
+        encoded = encode_field(JAEGER_KEY_VALUE_FLOAT64, WIRE_I64, DOUBLE.pack(value))
+    else:
+        value_type = 0
+        encoded = encode_field(JAEGER_KEY_VALUE_STR, WIRE_LEN, str(value))
+
+    return (encode_field(JAEGER_KEY_VALUE_KEY, WIRE_LEN, tag["key"]) +
+            encode_field(JAEGER_KEY_VALUE_TYPE, WIRE_VARINT, value_type) +
+            encoded)
+
+
+def jaeger_usec_bytes(usec):
+    seconds, usec = divmod(usec, USEC_PER_SEC)
+    return (encode_field(JAEGER_TIMESTAMP_SECONDS, WIRE_VARINT, seconds) +
+            encode_field(JAEGER_TIMESTAMP_NANOS, WIRE_VARINT, usec * NSEC_PER_USEC))
+
+
+def jaeger_span_bytes(span):
+    out = [encode_field(JAEGER_SPAN_TRACE_ID, WIRE_LEN, trace_id_bytes(span["traceID"])),
+           encode_field(JAEGER_SPAN_SPAN_ID, WIRE_LEN, span_id_bytes(span["spanID"])),
+           encode_field(JAEGER_SPAN_OPERATION_NAME, WIRE_LEN, span["operationName"])]
+
+    for reference in span["references"]:
+        ref_type = 0 if reference["refType"] == "CHILD_OF" else 1
+        out.append(encode_field(JAEGER_SPAN_REFERENCES, WIRE_LEN,
+                                encode_field(JAEGER_REF_TRACE_ID, WIRE_LEN,
+                                             trace_id_bytes(reference["traceID"])) +
+                                encode_field(JAEGER_REF_SPAN_ID, WIRE_LEN,
+                                             span_id_bytes(reference["spanID"])) +
+                                encode_field(JAEGER_REF_TYPE, WIRE_VARINT, ref_type)))
+
+    out.append(encode_field(JAEGER_SPAN_START_TIME, WIRE_LEN,
+                            jaeger_usec_bytes(span["startTime"])))
+    out.append(encode_field(JAEGER_SPAN_DURATION, WIRE_LEN,
+                            jaeger_usec_bytes(span["duration"])))
+    out.extend(encode_field(JAEGER_SPAN_TAGS, WIRE_LEN, jaeger_key_value_bytes(tag))
+               for tag in span["tags"])
+    return b"".join(out)
+
+
+def jaeger_process_bytes(process):
+    return (encode_field(JAEGER_PROCESS_SERVICE_NAME, WIRE_LEN, process["serviceName"]) +
+            b"".join(encode_field(JAEGER_PROCESS_TAGS, WIRE_LEN, jaeger_key_value_bytes(tag))
+                     for tag in process["tags"]))
+
+
+def jaeger_batches(spans):
+    """
+    Encodes Jaeger JSON spans as Jaeger Batch messages, one per distinct
+    process.
+    """
+    processes = {}
+    for span in spans:
+        process = span["process"]
+        key = (process["serviceName"], repr(process["tags"]))
+        processes.setdefault(key, (process, []))[1].append(span)
+
+    return [encode_field(JAEGER_BATCH_PROCESS, WIRE_LEN, jaeger_process_bytes(process)) +
+            b"".join(encode_field(JAEGER_BATCH_SPANS, WIRE_LEN, jaeger_span_bytes(span))
+                     for span in process_spans)
+            for process, process_spans in processes.values()]
+
+
+def write_spans(traces, stream, trace_format):
+    """
+    Writes the spans of Jaeger JSON traces (the "data" of an export) to the
+    binary `stream` as a length-delimited protobuf trace file of
+    `trace_format`, one message per trace (per trace and process for
+    FORMAT_JAEGER).
+    """
+    for trace in traces:
+        if trace_format == FORMAT_OTLP:
+            messages = [otlp_traces_data(trace["spans"])]
+        elif trace_format == FORMAT_JAEGER:
+            messages = jaeger_batches(trace["spans"])
+        else:
+            raise ValueError(f"unknown protobuf trace format {trace_format!r}")
+
+        for message in messages:
+            stream.write(encode_delimited(message))
@@ -0,0 +1,212 @@
+import dataclasses
+import math
+import numpy
+
+
+# Robust summaries of samples (outlier removal plus mean/median/stdev) on
+# numpy arrays.  Every function returns a Summary of the values it kept, so
+# the statistics of a clipped sample are computed once and passed around
+# (e.g. to pipeline.add_to_hist) rather than recomputed by each consumer.
+#
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Constants
+
+# Scales the median absolute deviation to the standard deviation of a
+# normal distribution (1 / Phi^-1(3/4)).
+#
+MAD_TO_SIGMA = 1.4826
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+@dataclasses.dataclass
+class Summary:
+    """
+    Statistics of the values kept out of a sample: those in the open
+    interval (lower, upper), (-inf, inf) if nothing was clipped.  `kept` is
+    a mask over the input sample and `values` the kept values, in input
+    order.  stdev is the sample standard deviation (nan for fewer than two
+    values).
+    """
+    count: int
+    mean: float
+    median: float
+    stdev: float
+    lower: float
+    upper: float
+    kept: numpy.ndarray
+    values: numpy.ndarray
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def as_sample(values):
+    return numpy.asarray(values, dtype=numpy.float64)
+
+
+def summary_of(values, kept, lower=-math.inf, upper=math.inf):
+    """
+    Returns the Summary of values[kept].
+    """
+    kept_values = values[kept]
+    count = len(kept_values)
+    return Summary(count=count,
+                   mean=float(kept_values.mean()) if count else math.nan,
+                   median=float(numpy.median(kept_values)) if count else math.nan,
+                   stdev=float(kept_values.std(ddof=1)) if count >= 2 else math.nan,
+                   lower=lower,
+                   upper=upper,
+                   kept=kept,
+                   values=kept_values)
+
+
+def summarize(values):
+    """
+    Returns the Summary of all of `values`.
+    """
+    values = as_sample(values)
+    return summary_of(values, numpy.ones(len(values), dtype=bool))
+
+
+def sigma_clip(values, n_sigmas=3, max_iterations=1):
+    """
+    Keeps the values less than n_sigmas standard deviations away from the
+    median, repeating on the kept values until none is removed or after
+    max_iterations rounds (None: until none is removed).  One round is the
+    classic pipeline.remove_outliers.
+    """
+    values = as_sample(values)
+    kept = numpy.ones(len(values), dtype=bool)
+    lower, upper = -math.inf, math.inf
+
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        iteration += 1
+
+        current = values[kept]
+        if len(current) < 2:
+            break
+
+        median = numpy.median(current)
+        bound = current.std(ddof=1) * n_sigmas
+
+        within = numpy.abs(values - median) < bound
+        lower, upper = median - bound, median + bound
+        if numpy.array_equal(within & kept, kept):
+            break
+        kept &= within
+
+    return summary_of(values, kept, lower, upper)
+
+
+def sigma_clipped_means(samples, n_sigmas=3):
+    """
+    Returns the mean of each row of the 2-D array `samples` after one round
+    of sigma_clip (the Summary.mean of sigma_clip(row, n_sigmas)), for all
+    rows at once; nan for rows of fewer than two values.
+    """
+    samples = as_sample(samples)
+    rows, n = samples.shape
+    if n < 2:
+        return numpy.full(rows, math.nan)
+
+    median = numpy.median(samples, axis=1, keepdims=True)
+    bound = samples.std(axis=1, ddof=1, keepdims=True) * n_sigmas
+
+    kept = numpy.abs(samples - median) < bound
+    count = kept.sum(axis=1)
+    total = numpy.where(kept, samples, 0.0).sum(axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return numpy.where(count > 0, total / count, math.nan)
+
+
+def grouped_sigma_clipped_means(values, variances, counts, n_sigmas=3):
+    """
+    sigma_clipped_means of samples given as groups of values (e.g. the
+    buckets of a sketches.QuantileSketch): the groups' means `values`, in
+    increasing order, the `variances` of the values within each group
+    (their m2 / count), and a 2-D array of the `counts` of each group in
+    each sample, one row per sample.  Groups are kept or clipped whole, by
+    their mean, and the median is the weighted median of the means (as
+    pipeline.TransmitDeltaAccumulator.transmit_delta).
+    """
+    values = as_sample(values)
+    variances = as_sample(variances)
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    if len(values) == 0:
+        return numpy.full(len(counts), math.nan)
+
+    weights = counts.astype(numpy.float64)
+    total = counts.sum(axis=1)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        mean = weights @ values / total
+        m2 = (weights @ variances +
+              (weights * numpy.square(values - mean[:, numpy.newaxis])).sum(axis=1))
+        bound = numpy.sqrt(m2 / (total - 1)) * n_sigmas
+
+        # Weighted median: the mean of the values of rank (total - 1) // 2
+        # and total // 2.
+        #
+        cumulative = numpy.cumsum(counts, axis=1)
+        lo = (cumulative <= ((total - 1) // 2)[:, numpy.newaxis]).sum(axis=1)
+        hi = (cumulative <= (total // 2)[:, numpy.newaxis]).sum(axis=1)
+        last = len(values) - 1
+        median = (values[numpy.minimum(lo, last)] + values[numpy.minimum(hi, last)]) / 2
+
+        kept = numpy.abs(values - median[:, numpy.newaxis]) < bound[:, numpy.newaxis]
+        kept_weights = numpy.where(kept, weights, 0.0)
+        kept_count = kept_weights.sum(axis=1)
+        clipped_mean = kept_weights @ values / kept_count
+
+    return numpy.where((total >= 2) & (kept_count > 0), clipped_mean, math.nan)
+
+
+def mad_clip(values, n_sigmas=3):
+    """
+    Keeps the values less than n_sigmas robust standard deviations
+    (MAD_TO_SIGMA times the median absolute deviation) away from the
+    median; unlike sigma_clip, the bounds aren't inflated by the outliers
+    themselves.
+    """
+    values = as_sample(values)
+    if len(values) == 0:
+        return summarize(values)
+
+    median = numpy.median(values)
+    bound = MAD_TO_SIGMA * numpy.median(numpy.abs(values - median)) * n_sigmas
+
+    return summary_of(values, numpy.abs(values - median) < bound,
+                      median - bound, median + bound)
+
+
+def trimmed(values, proportion=0.1):
+    """
+    Drops the `proportion` smallest and largest values (each), selecting
+    them with numpy.argpartition in O(n) rather than by sorting; the
+    Summary's mean is the trimmed mean.  Bounds are the smallest and largest
+    values dropped (-inf/inf if none).
+    """
+    values = as_sample(values)
+    n = len(values)
+    cut = int(n * proportion)
+    if cut == 0 or n - 2 * cut < 1:
+        return summarize(values)
+
+    order = numpy.argpartition(values, (cut - 1, cut, n - cut - 1, n - cut))
+    kept = numpy.zeros(n, dtype=bool)
+    kept[order[cut:n - cut]] = True
+
+    # argpartition puts the cut-1'th and n-cut'th smallest values in place.
+    #
+    return summary_of(values, kept, float(values[order[cut - 1]]),
+                      float(values[order[n - cut]]))
+
+
+def correlation(x, y):
+    """
+    Pearson's correlation coefficient of two samples (as
+    statistics.correlation).
+    """
+    return float(numpy.corrcoef(as_sample(x), as_sample(y))[0, 1])
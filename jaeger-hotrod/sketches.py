@@ -0,0 +1,299 @@
+import copy
+import math
+import numpy
+
+
+# Mergeable one-pass summaries of streams of float samples: running moments
+# (Moments), approximate quantiles (QuantileSketch) and a bounded uniform
+# sample (Reservoir).  Each has an `add` taking a numpy array (a batch of
+# the stream) and a `merge` folding in a summary of another part of the
+# stream (another shard, another time window, ...); merging two summaries
+# gives the same result as summarizing the concatenated streams (for
+# Reservoir, a sample of the same distribution).
+#
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Constants
+
+# Default relative accuracy of QuantileSketch: quantiles are within 1% of
+# a value of the right rank.
+#
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Values closer than this to zero share a single QuantileSketch bucket.
+#
+DEFAULT_MIN_VALUE = 1e-9
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def weighted_median(values, weights):
+    """
+    Returns the median of sorted `values` with integer `weights`: the
+    middle value, or the mean of the two middle values if the total weight
+    is even (the same as statistics.median for unit weights).
+    """
+    cumulative = numpy.cumsum(weights)
+    total = int(cumulative[-1])
+    lo = numpy.searchsorted(cumulative, (total - 1) // 2, side='right')
+    hi = numpy.searchsorted(cumulative, total // 2, side='right')
+    return (float(values[lo]) + float(values[hi])) / 2
+
+
+def merge_moments(keys, counts, means, m2s):
+    """
+    Combines the (count, mean, m2) of groups with equal `keys`, returning
+    (keys, counts, means, m2s) sorted by key.
+    """
+    keys, inverse = numpy.unique(keys, return_inverse=True)
+    total_counts = numpy.bincount(inverse, counts)
+    total_means = numpy.bincount(inverse, counts * means) / total_counts
+    total_m2s = numpy.bincount(inverse,
+                               m2s + counts * numpy.square(means - total_means[inverse]))
+    return keys, total_counts.astype(numpy.int64), total_means, total_m2s
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class Moments:
+    """
+    Running count, mean and variance of a stream (Welford's algorithm, with
+    the pairwise update of Chan et al. for batches and merges).
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if len(values) == 0:
+            return self
+
+        batch = Moments()
+        batch.count = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(numpy.square(values - batch.mean).sum())
+        return self.merge(batch)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        return self
+
+    def variance(self):
+        """
+        Sample variance (as statistics.variance); needs two values.
+        """
+        return self.m2 / (self.count - 1)
+
+    def stdev(self):
+        return math.sqrt(self.variance())
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class QuantileSketch:
+    """
+    A relative-error quantile sketch in the manner of DDSketch (Masson, Rim
+    and Lee, "DDSketch: A Fast and Fully-Mergeable Quantile Sketch with
+    Relative-Error Guarantees", 2019), whose buckets also keep the moments
+    (count, mean, m2) of their values.
+
+    Values are bucketed on a fixed logarithmic grid, |x| in
+    (min_value * g^(i-1), min_value * g^i] with g = (1 + a) / (1 - a), so a
+    bucket's values are all within a relative accuracy `a` of each other;
+    the number of buckets grows with the log of the range of the values,
+    not with their count.  As the grid doesn't depend on the data, merging
+    sketches is exact: the same as sketching the concatenated streams.
+
+    relative_accuracy=None buckets values by their exact value instead
+    (unbounded, for checking against exact statistics).
+    """
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY,
+                 min_value=DEFAULT_MIN_VALUE):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.keys = numpy.empty(0)
+        self.counts = numpy.empty(0, dtype=numpy.int64)
+        self.means = numpy.empty(0)
+        self.m2s = numpy.empty(0)
+        self.count = 0
+
+    def bucket_keys(self, values):
+        """
+        Returns the bucket of each value, as keys in the order of the values.
+        """
+        if self.relative_accuracy is None:
+            return values
+
+        log_gamma = math.log((1 + self.relative_accuracy) / (1 - self.relative_accuracy))
+        magnitude = numpy.abs(values)
+        index = numpy.ceil(numpy.log(numpy.maximum(magnitude, self.min_value) /
+                                     self.min_value) / log_gamma) + 1
+        return numpy.sign(values) * numpy.where(magnitude < self.min_value, 0, index)
+
+    def add(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64)
+        keys, inverse = numpy.unique(self.bucket_keys(values), return_inverse=True)
+        counts = numpy.bincount(inverse)
+        means = numpy.bincount(inverse, values) / counts
+        m2s = numpy.bincount(inverse, numpy.square(values - means[inverse]))
+        self.merge_buckets(keys, counts, means, m2s)
+        return self
+
+    def merge(self, other):
+        self.merge_buckets(other.keys, other.counts, other.means, other.m2s)
+        return self
+
+    def merge_buckets(self, keys, counts, means, m2s):
+        (self.keys, self.counts,
+         self.means, self.m2s) = merge_moments(numpy.concatenate((self.keys, keys)),
+                                               numpy.concatenate((self.counts, counts)),
+                                               numpy.concatenate((self.means, means)),
+                                               numpy.concatenate((self.m2s, m2s)))
+        self.count = int(self.counts.sum())
+
+    def buckets(self):
+        """
+        Returns (means, counts, m2s) of the buckets, sorted by value.
+        """
+        return self.means, self.counts, self.m2s
+
+    def quantile(self, q):
+        """
+        Returns the mean of the bucket holding the value of rank
+        q * (count - 1).
+        """
+        cumulative = numpy.cumsum(self.counts)
+        rank = int(q * (int(cumulative[-1]) - 1))
+        return float(self.means[numpy.searchsorted(cumulative, rank, side='right')])
+
+    def median(self):
+        return weighted_median(self.means, self.counts)
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class Reservoir:
+    """
+    A uniform random sample of at most `size` rows of a stream of columns
+    (all rows if size is None).
+
+    Every row gets an independent uniform random priority and the `size`
+    lowest are kept ("bottom-k" sampling), so merging two reservoirs
+    gives a uniform sample of the union of their streams.
+    """
+    def __init__(self, size=None, seed=None):
+        self.size = size
+        self.rng = numpy.random.default_rng(seed)
+        self.priority = numpy.empty(0)
+        self.columns = None
+
+    def add(self, *columns):
+        self.keep(self.rng.random(len(columns[0])), columns)
+        return self
+
+    def merge(self, other):
+        if other.columns is not None:
+            self.keep(other.priority, other.columns)
+        return self
+
+    def keep(self, priority, columns):
+        if self.columns is not None:
+            priority = numpy.concatenate((self.priority, priority))
+            columns = [numpy.concatenate((mine, theirs))
+                       for mine, theirs in zip(self.columns, columns)]
+
+        if self.size is not None and len(priority) > self.size:
+            kept = numpy.argpartition(priority, self.size)[:self.size]
+            priority = priority[kept]
+            columns = [column[kept] for column in columns]
+
+        self.priority = priority
+        self.columns = [numpy.asarray(column) for column in columns]
+
+    def __len__(self):
+        return len(self.priority)
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class SlidingWindows:
+    """
+    Windows `width` long starting every `hop` (tumbling windows if hop is
+    None or equal to width) over a time axis; width must be a whole number
+    of hops.
+
+    Windows are aggregated from per-pane summaries, a pane being the hop
+    starting at a multiple of `hop`, with the two-stacks sliding-window
+    algorithm: each pane summary is merged a constant number of times
+    (amortized) however many panes a window spans, instead of every window
+    being recomputed from its panes.
+    """
+    def __init__(self, width, hop=None):
+        hop = width if hop is None else hop
+        panes_per_window = int(round(width / hop))
+        if panes_per_window < 1 or not math.isclose(panes_per_window * hop, width):
+            raise ValueError(f"window width {width} is not a multiple of its hop {hop}")
+
+        self.width = width
+        self.hop = hop
+        self.panes_per_window = panes_per_window
+
+    def pane_index(self, times):
+        """
+        Returns the pane of each of `times`.
+        """
+        return numpy.floor(numpy.asarray(times) / self.hop).astype(numpy.int64)
+
+    def aggregate(self, panes, empty):
+        """
+        Yields (start, end, summary) of each window from the first to the
+        last overlapping any of `panes` (a dict of pane index -> summary),
+        in time order; summary merges the panes of the window (and is empty
+        for windows over a gap).  `empty()` returns an empty summary.  The
+        summaries in `panes` are not modified.
+        """
+        if not panes:
+            return
+
+        first = min(panes)
+        last = max(panes) + self.panes_per_window - 1
+
+        # The window's panes are split between `front`, a stack of suffix
+        # merges of the oldest panes (front[-1] merges all of them), and
+        # `back`, the newest panes, merged into back_summary as they come.
+        #
+        front = []
+        back = []
+        back_summary = empty()
+
+        for pane in range(first, last + 1):
+            summary = panes.get(pane)
+            back.append(summary)
+            if summary is not None:
+                back_summary.merge(summary)
+
+            if len(front) + len(back) > self.panes_per_window:
+                if not front:
+                    suffix = empty()
+                    for back_pane in reversed(back):
+                        if back_pane is not None:
+                            suffix = copy.deepcopy(suffix).merge(back_pane)
+                        front.append(suffix)
+                    back = []
+                    back_summary = empty()
+                front.pop()
+
+            start = (pane - self.panes_per_window + 1) * self.hop
+            window_summary = copy.deepcopy(back_summary)
+            if front:
+                window_summary.merge(front[-1])
+            yield start, start + self.width, window_summary
@@ -0,0 +1,39 @@
+import io
+
+import pytest
+
+import columnar
+
+
+RECORDS = [
+    {"name": "a", "count": 1, "ratio": 0.5, "ok": True, "peer": None,
+     "children": ["b", "c"], "tags": {"k": "v"}},
+    {"name": "b", "count": 2, "ratio": None, "ok": False, "peer": "10.0.0.2",
+     "children": [], "tags": {}},
+]
+
+NAMES = ("src", "port", "time")
+ROWS = [("10.0.0.1", 8080, 1.5), ("10.0.0.2", 40000, 2.5)]
+
+
+def written(write, *args, fmt):
+    stream = io.BytesIO()
+    write(*args, stream, fmt)
+    return io.BufferedReader(io.BytesIO(stream.getvalue()))
+
+
+@pytest.mark.parametrize("fmt", columnar.FORMATS)
+@pytest.mark.parametrize("records", [RECORDS, [], [{}, {}]])
+def test_records_round_trip(records, fmt):
+    assert columnar.read_records(written(columnar.write_records, records, fmt=fmt)) == records
+
+
+@pytest.mark.parametrize("fmt", columnar.FORMATS)
+@pytest.mark.parametrize("rows", [ROWS, []])
+def test_rows_round_trip(rows, fmt):
+    assert columnar.read_rows(written(columnar.write_rows, rows, NAMES, fmt=fmt),
+                              NAMES) == rows
+
+    batches = [rows[:1], [], rows[1:]]
+    assert columnar.read_rows(written(columnar.write_row_batches, batches, NAMES, fmt=fmt),
+                              NAMES) == rows
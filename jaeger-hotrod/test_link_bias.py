@@ -0,0 +1,155 @@
+import numpy
+import pytest
+
+import pipeline
+
+
+CLIENT = "10.0.0.1"
+SERVER = "10.0.0.2"
+
+START_NS = 1_700_000_000_000_000_000
+
+
+def direction_columns(rng, count, src, dst, src_port, dst_port, seq, clock_offset_ns):
+    """
+    Returns the (sender copies, receiver copies) columns of `count` packets
+    sent from src to dst, where the receiver's clock is `clock_offset_ns`
+    ahead of the sender's.  About 3% of the packets are lost before the
+    receiver, and a few are retransmitted.
+    """
+    payload = rng.integers(1, 1448, count)
+    send_ns = START_NS + numpy.cumsum(rng.integers(20_000, 400_000, count))
+    latency_ns = 50_000 + (payload + 66) * 8 + rng.exponential(10_000, count).astype(int)
+
+    columns = {
+        "src_addr_ip": numpy.full(count, pipeline.ip_to_int(src)),
+        "dst_addr_ip": numpy.full(count, pipeline.ip_to_int(dst)),
+        "src_port_tcp": numpy.full(count, src_port),
+        "dst_port_tcp": numpy.full(count, dst_port),
+        "seq_tcp": seq + numpy.cumsum(payload) - payload,
+        "size_bytes": payload + 66,
+        "payload_bytes": payload,
+    }
+
+    retransmitted = rng.choice(count, count // 50, replace=False)
+    sent = numpy.concatenate((numpy.arange(count), retransmitted))
+    sent_ns = numpy.concatenate((send_ns, send_ns[retransmitted] + 3_000_000))
+
+    received = rng.random(len(sent)) >= 0.03
+    recv_ns = sent_ns + latency_ns[sent] + clock_offset_ns
+
+    sender = {name: column[sent] for name, column in columns.items()}
+    sender["capture_time_ns"] = sent_ns
+    receiver = {name: column[sent[received]] for name, column in columns.items()}
+    receiver["capture_time_ns"] = recv_ns[received]
+    return sender, receiver
+
+
+def synthetic_packets(count=500, clock_offset_ns=2_000_000, seed=1):
+    """
+    Returns a PacketTable of the captures of the client and of the server
+    of one connection, each sorted by capture time.
+    """
+    rng = numpy.random.default_rng(seed)
+    query_sent, query_received = direction_columns(
+        rng, count, CLIENT, SERVER, 40000, 8080, 1000, clock_offset_ns)
+    reply_sent, reply_received = direction_columns(
+        rng, count, SERVER, CLIENT, 8080, 40000, 5000, -clock_offset_ns)
+
+    def capture(host, parts):
+        columns = {name: numpy.concatenate([part[name] for part in parts])
+                   for name in parts[0]}
+        order = numpy.argsort(columns["capture_time_ns"], kind='stable')
+        return pipeline.PacketTable.from_columns(
+            host, {name: column[order] for name, column in columns.items()})
+
+    return pipeline.PacketTable.concat((capture(CLIENT, (query_sent, reply_received)),
+                                        capture(SERVER, (reply_sent, query_received))))
+
+
+def merged_batches(captured, batch_rows):
+    """
+    Splits a PacketTable into batches merged by capture time, as
+    iter_pcap_files yields them.
+    """
+    order = numpy.argsort(captured.capture_time_ns, kind='stable')
+    return [captured.take(order[start:start + batch_rows])
+            for start in range(0, len(order), batch_rows)]
+
+
+def test_link_bias_matches_reference():
+    captured = synthetic_packets()
+
+    link_bias, transmit_deltas = pipeline.link_bias_from_captured_packets(
+        captured, relative_accuracy=None, reservoir_size=None)
+    expected_link_bias, expected_transmit_deltas = \
+        pipeline.link_bias_from_captured_packets_reference(captured)
+
+    assert len(expected_link_bias) == 2
+    assert list(transmit_deltas) == list(expected_transmit_deltas)
+    for host_pair, expected in expected_transmit_deltas.items():
+        delta = transmit_deltas[host_pair]
+        assert delta.count == expected.count
+        assert delta.mean == pytest.approx(expected.mean, rel=1e-9)
+        assert delta.median == pytest.approx(expected.median, rel=1e-9)
+        assert delta.stdev == pytest.approx(expected.stdev, rel=1e-9)
+        assert [sample[1:] for sample in delta.samples] == \
+            [sample[1:] for sample in expected.samples]
+        assert [sample[0] for sample in delta.samples] == \
+            pytest.approx([sample[0] for sample in expected.samples], rel=1e-9)
+
+    assert list(link_bias) == list(expected_link_bias)
+    for host_pair, expected in expected_link_bias.items():
+        assert link_bias[host_pair].query_bias == pytest.approx(expected.query_bias,
+                                                                rel=1e-9)
+        assert link_bias[host_pair].reply_bias == pytest.approx(expected.reply_bias,
+                                                                rel=1e-9)
+
+
+def test_check_link_bias_parity():
+    assert pipeline.check_link_bias_parity(synthetic_packets(seed=2)) == []
+
+
+def test_streamed_spacing_samples_match_whole_table():
+    captured = synthetic_packets()
+    expected = pipeline.packet_spacing_samples(captured)
+
+    # A window shorter than the captures, so that rows are carried over
+    # between batches, but longer than the clock offset plus the latency.
+    #
+    batches = merged_batches(captured, 64)
+    samples = [numpy.concatenate(column) for column in zip(
+        *pipeline.iter_packet_spacing_samples(batches, window_ns=10_000_000))]
+
+    def by_pair_and_time(columns):
+        order = numpy.lexsort((columns[4], columns[0]))
+        return [column[order] for column in columns]
+
+    assert len(samples[0]) == len(expected[0])
+    for column, expected_column in zip(by_pair_and_time(samples),
+                                       by_pair_and_time(expected)):
+        numpy.testing.assert_array_equal(column, expected_column)
+
+
+def test_merged_shard_accumulators_match_combined():
+    samples = pipeline.packet_spacing_samples(synthetic_packets())
+    half = len(samples[0]) // 2
+    shards = [[column[:half] for column in samples], [column[half:] for column in samples]]
+
+    merged = pipeline.merge_transmit_delta_accumulators(
+        pipeline.sample_accumulators(shard) for shard in shards)
+    combined = pipeline.sample_accumulators(samples)
+    exact = pipeline.sample_accumulators(samples, relative_accuracy=None)
+
+    relative_accuracy = pipeline.TRANSMIT_DELTA_RELATIVE_ACCURACY
+    assert list(merged) == list(combined)
+    for host_pair, accumulator in combined.items():
+        delta = merged[host_pair].transmit_delta()
+        expected = accumulator.transmit_delta()
+        assert delta.count == expected.count
+        assert delta.mean == pytest.approx(expected.mean, rel=relative_accuracy)
+        assert delta.median == pytest.approx(expected.median, rel=relative_accuracy)
+        assert delta.stdev == pytest.approx(expected.stdev, rel=relative_accuracy)
+
+        exact_delta = exact[host_pair].transmit_delta()
+        assert delta.median == pytest.approx(exact_delta.median, rel=relative_accuracy)
@@ -0,0 +1,69 @@
+import os
+
+import numpy
+
+import pipeline
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data-2")
+
+SAMPLE_CAPTURES = [
+    ("192.168.1.195", os.path.join(DATA_DIR, "trace.epyc3451.2024-03-24T21-30-38.pcap")),
+    ("192.168.1.187", os.path.join(DATA_DIR, "trace.thebeast.2024-03-24T17-30-40.pcap")),
+]
+
+
+def test_streamed_traced_packets_match_whole_captures():
+    expected = pipeline.captured_to_traced_packets(
+        pipeline.read_pcap_files(SAMPLE_CAPTURES, workers=1))
+    traced = pipeline.TracedPacketTable.concat(
+        pipeline.stream_traced_packets(SAMPLE_CAPTURES)).sorted()
+
+    assert len(expected) > 0
+    assert traced.unmatched == expected.unmatched
+    for name, column in expected.columns().items():
+        numpy.testing.assert_array_equal(getattr(traced, name), column, err_msg=name)
+
+
+def test_streamed_packet_rows_match_whole_captures():
+    expected = pipeline.traced_packet_table_rows(pipeline.captured_to_traced_packets(
+        pipeline.read_pcap_files(SAMPLE_CAPTURES, workers=1)))
+    rows = [row
+            for batch in pipeline.traced_packet_row_batches(dict(SAMPLE_CAPTURES))
+            for row in batch]
+
+    assert sorted(rows) == sorted(expected)
+    assert pipeline.traced_packet_rows(dict(SAMPLE_CAPTURES), workers=1) == sorted(expected)
+
+
+def rpc(client_port, query_send_usec, reply_send_usec):
+    return pipeline.TraceRPC(
+        link=pipeline.HostPair(src_addr_ip="10.0.0.1", dst_addr_ip="10.0.0.2"),
+        client_span="c", server_span="s",
+        client_host="10.0.0.1", client_port=client_port,
+        server_host="10.0.0.2", server_port=8080,
+        query_send_time_usec=query_send_usec, query_recv_time_usec=query_send_usec + 5,
+        reply_send_time_usec=reply_send_usec, reply_recv_time_usec=reply_send_usec + 5)
+
+
+def test_rpcs_without_traced_packets_are_dropped():
+    client, server = pipeline.ip_to_int("10.0.0.1"), pipeline.ip_to_int("10.0.0.2")
+
+    # The query and reply of a connection from port 40000; nothing was
+    # traced from port 40001.
+    #
+    traced = pipeline.TracedPacketTable(
+        src_addr_ip=[client, server], dst_addr_ip=[server, client],
+        src_port_tcp=[40000, 8080], dst_port_tcp=[8080, 40000],
+        seq_tcp=[1, 1], size_bytes=[166, 166], payload_bytes=[100, 100],
+        send_time_ns=[1_000_000, 2_000_000], recv_time_ns=[1_030_000, 2_040_000]).sorted()
+    rpcs = [rpc(40000, 1001.0, 2001.0), rpc(40001, 1001.0, 2001.0)]
+
+    for replace in (pipeline.replace_message_timestamps,
+                    pipeline.replace_packet_timestamps):
+        corrected = replace(rpcs, traced)
+        assert [r.client_port for r in corrected] == [40000]
+        assert (corrected[0].query_send_time_usec, corrected[0].query_recv_time_usec,
+                corrected[0].reply_send_time_usec, corrected[0].reply_recv_time_usec) == \
+            (1000.0, 1030.0, 2000.0, 2040.0)
+        assert replace(rpcs, pipeline.TracedPacketTable()) == []
@@ -0,0 +1,378 @@
+import json
+import numpy
+import re
+
+
+# Streaming reader of Jaeger trace JSON exports ({"data": [trace, ...]}),
+# yielding only the RPC spans and only the fields and tags the pipeline uses.
+#
+# json.load of an export builds every span in full, and most of an export is
+# what we don't use: each span's "references" embed a full copy of its parent
+# span (which embeds its own parent, ...), typically 80% of the bytes.  Here
+# the text is indexed with numpy instead (the quotes, and the brackets outside
+# strings with their nesting level and matching bracket; see
+# StructuralIndex), which locates the keys of each span without decoding
+# anything; only the values of the keys we use are handed to json.loads, and
+# a span whose "span.kind" isn't an RPC kind is dropped before the rest of its
+# values are decoded.
+#
+# The export is read in blocks and processed a trace at a time, so memory is
+# bounded by the block size and the largest trace rather than by the export.
+#
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Constants
+
+DEFAULT_BLOCK_BYTES = 8 * 1024 * 1024
+
+# The "data" array is looked for in this much of the start of an export
+# first (then twice as much, ...).
+#
+HEADER_PROBE_BYTES = 64 * 1024
+
+# Spans of other kinds (internal, producer, consumer) can't be either end of
+# an RPC, so they are dropped.
+#
+RPC_SPAN_KINDS = ("client", "server")
+
+# The span fields kept, and the span and process tags kept out of them.
+#
+SPAN_KEYS = ("traceID", "spanID", "startTime", "duration", "childSpanIds",
+             "tags", "process")
+SPAN_TAG_KEYS = ("span.kind", "net.peer.name", "net.peer.port",
+                 "net.sock.peer.addr", "net.sock.peer.port")
+PROCESS_TAG_KEYS = ("host.name",)
+
+# Nesting level of the objects of {"data": [trace, ...]} and of
+# trace["spans"][...] (the top-level object is level 1).
+#
+TRACE_LEVEL = 3
+SPAN_LEVEL = 5
+
+QUOTE = ord('"')
+BACKSLASH = ord('\\')
+COLON = ord(':')
+OPEN_BRACE = ord('{')
+OPEN_BRACKET = ord('[')
+CLOSE_BRACE = ord('}')
+
+# Brackets are the bytes equal to '{' or '}' once 0x20 is set ('[' and ']'
+# differ from them only in that bit), and opening brackets those with 0x02
+# set.
+#
+BRACKET_FOLD = 0x20
+OPENING_BIT = 0x02
+
+IS_SPACE = numpy.zeros(256, dtype=bool)
+IS_SPACE[[ord(' '), ord('\t'), ord('\r'), ord('\n')]] = True
+
+# A number, true, false or null.
+#
+SCALAR = re.compile(rb"[-+.\w]*")
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+#
+class StructuralIndex:
+    """
+    The structure of a buffer of JSON text, as numpy arrays: the string
+    delimiting quotes; the brackets outside strings, with the nesting level
+    of each bracket pair and the position of the matching bracket (-1 if it
+    isn't in the buffer); and the object keys (looked up with keys_named).
+
+    The buffer must start outside of any string, `level` brackets deep.
+    """
+    def __init__(self, buf, level=0):
+        self.buf = buf
+        self.initial_level = level
+        self.data = data = numpy.frombuffer(buf, dtype=numpy.uint8)
+
+        # A quote preceded by an odd number of backslashes is escaped.
+        #
+        quotes = numpy.flatnonzero(data == QUOTE)
+        backslashed = numpy.flatnonzero(data[quotes - 1] == BACKSLASH)
+        backslashed = backslashed[quotes[backslashed] > 0]
+        odd = numpy.zeros(len(backslashed), dtype=bool)
+        run = numpy.arange(len(backslashed))
+        back = quotes[backslashed] - 1
+        while len(run):
+            odd[run] = ~odd[run]
+            back -= 1
+            more = back >= 0
+            more[more] = data[back[more]] == BACKSLASH
+            run, back = run[more], back[more]
+        self.quotes = quotes = numpy.delete(quotes, backslashed[odd])
+
+        folded = data | BRACKET_FOLD
+        brackets = numpy.flatnonzero((folded == CLOSE_BRACE) | (folded == OPEN_BRACE))
+        self.brackets = brackets = brackets[numpy.searchsorted(quotes, brackets) % 2 == 0]
+
+        delta = numpy.where(data[brackets] & OPENING_BIT, 1, -1)
+        self.depth = level + numpy.cumsum(delta)
+        self.is_open = delta > 0
+        self.level = numpy.where(self.is_open, self.depth, self.depth + 1)
+
+        # Within a level, opening and closing brackets alternate: each
+        # opening bracket is matched by the next bracket of its level.  (A
+        # stable sort of 16-bit levels is a radix sort.)
+        #
+        order = numpy.argsort(self.level.astype(numpy.int16), kind='stable')
+        paired = (self.is_open[order[:-1]] & ~self.is_open[order[1:]] &
+                  (self.level[order[:-1]] == self.level[order[1:]]))
+        self.match = numpy.full(len(brackets), -1, dtype=numpy.int64)
+        self.match[order[:-1][paired]] = brackets[order[1:][paired]]
+
+        # Keys: strings followed by a colon (usually right after the quote).
+        #
+        closing = quotes[1::2]
+        after = numpy.minimum(closing + 1, len(data) - 1)
+        spaced = numpy.flatnonzero(IS_SPACE[data[after]] & (closing + 1 < len(data)))
+        after[spaced] = numpy.minimum(self.skip_space(after[spaced]), len(data) - 1)
+        is_key = (data[after] == COLON) & (closing + 1 < len(data))
+        self.key_start = quotes[0::2][:len(closing)][is_key] + 1
+        self.key_length = closing[is_key] - self.key_start
+        self.key_colon = after[is_key]
+        self.keys_by_depth = {}
+
+    def skip_space(self, positions):
+        """
+        Returns the first non-whitespace position at or after each of
+        `positions` (len(buf) if none).
+        """
+        positions = positions.copy()
+        end = len(self.data)
+        while True:
+            inside = positions < end
+            space = numpy.zeros(len(positions), dtype=bool)
+            space[inside] = IS_SPACE[self.data[positions[inside]]]
+            if not space.any():
+                return positions
+            positions += space
+
+    def depth_at(self, positions):
+        """
+        Returns the nesting depth at each of `positions` (not brackets).
+        """
+        index = numpy.searchsorted(self.brackets, positions)
+        if len(self.depth) == 0:
+            return numpy.full(len(positions), self.initial_level)
+        return numpy.where(index > 0, self.depth[numpy.maximum(index - 1, 0)],
+                           self.initial_level)
+
+    def keys_at(self, depth):
+        """
+        Returns the indices of the keys `depth` brackets deep.
+        """
+        if depth not in self.keys_by_depth:
+            key_depth = self.depth_at(self.key_start)
+            self.keys_by_depth[depth] = numpy.flatnonzero(key_depth == depth)
+        return self.keys_by_depth[depth]
+
+    def keys_named(self, name, depth):
+        """
+        Returns the (start, value start) positions of the object keys equal
+        to `name` `depth` brackets deep, in order.
+        """
+        encoded = numpy.frombuffer(name.encode(), dtype=numpy.uint8)
+        candidates = self.keys_at(depth)
+        candidates = candidates[self.key_length[candidates] == len(encoded)]
+        chars = self.data[self.key_start[candidates][:, numpy.newaxis] +
+                          numpy.arange(len(encoded))]
+        named = candidates[(chars == encoded).all(axis=1)]
+        return self.key_start[named], self.skip_space(self.key_colon[named] + 1)
+
+    def value_ends(self, starts):
+        """
+        Returns the end of each JSON value starting at `starts`: past the
+        matching bracket of an array or object, past the closing quote of a
+        string, else (numbers, true, false, null) at the end of the token.
+        """
+        first = self.data[starts]
+        ends = numpy.empty(len(starts), dtype=numpy.int64)
+
+        container = (first == OPEN_BRACE) | (first == OPEN_BRACKET)
+        ends[container] = self.match[numpy.searchsorted(self.brackets,
+                                                        starts[container])] + 1
+
+        string = first == QUOTE
+        ends[string] = self.quotes[numpy.searchsorted(self.quotes, starts[string]) + 1] + 1
+
+        scalar = numpy.flatnonzero(~(container | string))
+        ends[scalar] = [SCALAR.match(self.buf, start).end()
+                        for start in starts[scalar].tolist()]
+        return ends
+
+    def values(self, starts):
+        """
+        Decodes the JSON values starting at `starts`, returning a list.
+        """
+        ends = self.value_ends(starts)
+        buf = self.buf
+        return json.loads(b"[" + b",".join([buf[start:end] for start, end
+                                            in zip(starts.tolist(), ends.tolist())]) + b"]")
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def tags_to_list(tags, keys):
+    """
+    Returns the Jaeger tags (a list of {"key", "value", ...}) whose key is
+    one of `keys`.
+    """
+    return [tag for tag in tags if tag["key"] in keys]
+
+
+def span_kind(tags):
+    for tag in tags:
+        if tag["key"] == "span.kind":
+            return tag["value"]
+    return None
+
+
+def scan_spans(index, first, last, kinds):
+    """
+    Returns the spans of each trace whose opening bracket is among
+    index.brackets[first:last], as lists of pruned raw spans (see
+    iter_trace_spans).
+    """
+    brackets = index.brackets
+    trace_opens = numpy.arange(first, last)
+    trace_opens = trace_opens[index.is_open[trace_opens] &
+                              (index.level[trace_opens] == TRACE_LEVEL)]
+
+    # The "spans" array of each trace, and the span objects in them.
+    #
+    _, spans_values = index.keys_named("spans", TRACE_LEVEL)
+    spans_arrays = numpy.searchsorted(brackets, spans_values)
+
+    span_opens = numpy.flatnonzero(index.is_open & (index.level == SPAN_LEVEL))
+    span_array = numpy.searchsorted(brackets[spans_arrays], brackets[span_opens]) - 1
+    in_array = span_array >= 0
+    in_array[in_array] = (brackets[span_opens[in_array]] <
+                          index.match[spans_arrays[span_array[in_array]]])
+    span_opens = span_opens[in_array]
+    span_starts = brackets[span_opens]
+    span_ends = index.match[span_opens]
+
+    # The position of the value of each of SPAN_KEYS in each span (-1 if
+    # missing).
+    #
+    values = {}
+    for name in SPAN_KEYS:
+        key_starts, key_values = index.keys_named(name, SPAN_LEVEL)
+        span = numpy.searchsorted(span_starts, key_starts) - 1
+        inside = span >= 0
+        inside[inside] = key_starts[inside] < span_ends[span[inside]]
+        values[name] = numpy.full(len(span_starts), -1, dtype=numpy.int64)
+        values[name][span[inside]] = key_values[inside]
+
+    trace_of_span = numpy.searchsorted(brackets[trace_opens], span_starts) - 1
+    in_trace = trace_of_span >= 0
+    in_trace[in_trace] = span_starts[in_trace] < index.match[trace_opens[trace_of_span[in_trace]]]
+    trace_of_span[~in_trace] = -1
+
+    kept = trace_of_span >= 0
+    for name in SPAN_KEYS:
+        missing = kept & (values[name] < 0)
+        if missing.any():
+            raise KeyError(name)
+
+    # Decode the tags first, to drop the spans of other kinds before
+    # decoding anything else.
+    #
+    span_tags = index.values(values["tags"][kept])
+    if kinds is not None:
+        is_kind = numpy.array([span_kind(tags) in kinds for tags in span_tags], dtype=bool)
+        span_tags = [tags for tags, keep in zip(span_tags, is_kind.tolist()) if keep]
+        kept[kept] = is_kind
+
+    fields = {name: index.values(values[name][kept])
+              for name in SPAN_KEYS if name != "tags"}
+
+    traces = [[] for _ in trace_opens]
+    for i, trace in enumerate(trace_of_span[kept].tolist()):
+        traces[trace].append({
+            "traceID": fields["traceID"][i],
+            "spanID": fields["spanID"][i],
+            "startTime": fields["startTime"][i],
+            "duration": fields["duration"][i],
+            "childSpanIds": fields["childSpanIds"][i],
+            "tags": tags_to_list(span_tags[i], SPAN_TAG_KEYS),
+            "process": {"tags": tags_to_list(fields["process"][i]["tags"],
+                                             PROCESS_TAG_KEYS)},
+        })
+
+    return traces
+
+
+def find_data_array(buf, probe_bytes=HEADER_PROBE_BYTES):
+    """
+    Returns the position just inside of the top-level "data" array of the
+    start of a trace JSON export, or None if it isn't in `buf`.  Only as
+    much of `buf` is indexed as it takes to find it.
+    """
+    while True:
+        index = StructuralIndex(buf[:probe_bytes])
+        _, data_values = index.keys_named("data", 1)
+        if len(data_values) and data_values[0] < len(index.buf):
+            return int(data_values[0]) + 1
+
+        if probe_bytes >= len(buf):
+            return None
+        probe_bytes *= 2
+
+
+def iter_trace_spans(stream, kinds=RPC_SPAN_KINDS, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Reads a Jaeger trace JSON export from the binary `stream`, yielding the
+    list of spans of each trace in turn.
+
+    Spans are pruned raw Jaeger spans: only SPAN_KEYS, with only
+    SPAN_TAG_KEYS in "tags" and PROCESS_TAG_KEYS in "process"/"tags"
+    (enough for pipeline.TraceSpan.from_raw_span), and only those whose
+    "span.kind" is in `kinds` (all spans if None).
+    """
+    pending = b""
+    level = 0
+    in_data = False
+
+    while True:
+        block = stream.read(max(block_bytes, len(pending)))
+        eof = not block
+        buf = pending + block
+
+        if not in_data:
+            data_start = find_data_array(buf)
+            if data_start is None:
+                if eof:
+                    raise ValueError("no \"data\" array in the trace JSON")
+                pending = buf
+                continue
+
+            buf = buf[data_start:]
+            level = 2
+            in_data = True
+
+        index = StructuralIndex(buf, level)
+
+        # Whole traces (up to the end of "data", if in the buffer).
+        #
+        data_end = numpy.flatnonzero(~index.is_open & (index.level == 2))
+        last = int(data_end[0]) if len(data_end) else len(index.brackets)
+        complete = numpy.flatnonzero(index.is_open[:last] &
+                                     (index.level[:last] == TRACE_LEVEL) &
+                                     (index.match[:last] >= 0))
+
+        if len(complete):
+            yield from scan_spans(index, int(complete[0]), int(complete[-1]) + 1, kinds)
+
+        if len(data_end):
+            return
+
+        if eof:
+            raise ValueError("the trace JSON ends inside of \"data\"")
+
+        if len(complete):
+            pending = buf[int(index.match[complete[-1]]) + 1:]
+        else:
+            pending = buf
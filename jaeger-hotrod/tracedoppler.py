@@ -0,0 +1,616 @@
+import os
+import struct
+import sys
+
+
+# Single entry point for the stages of the analysis pipeline:
+#
+#   tracedoppler.py COMMAND [ARGS...]
+#
+# Each command is a thin wrapper around pipeline.py (the old per-stage scripts
+# now just forward here).  This module imports nothing heavy at load time;
+# each command imports what it needs when it runs, so that the commands run
+# by the Makefile don't all pay for numpy/matplotlib/... start-up.
+#
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Constants
+
+# Start-up budget of the non-plotting commands: wall clock time to run each
+# on an empty input (interpreter start-up included), as measured by
+# `tracedoppler.py startup`.  Most of it is numpy (~120ms here), which every
+# command needs for columnar.py; they typically take 150-250ms, versus ~700ms
+# back when every command imported matplotlib through pipeline.py.
+#
+STARTUP_TARGET_MS = 300
+
+STARTUP_RUNS = 5
+
+# An empty little-endian pcap file (global header only), for timing pcap2json.
+#
+EMPTY_PCAP = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+# Commands
+
+def parse_config_arg(args, default):
+    config_file = default
+    for arg in args[1:]:
+        if arg.startswith("--config="):
+            config_file = arg[len("--config="):]
+    return config_file
+
+
+def traces2spans(args):
+    # Usage: traces2spans [--format=json|npz] [--config=MESH_JSON] < TRACE_JSON > SPANS
+    #
+    import columnar
+    import pipeline
+
+    output_format = columnar.parse_format_arg(args)
+    config_file = parse_config_arg(args, pipeline.CONFIG_FILE)
+    host_to_ip = pipeline.MeshConfig.from_file(config_file).host_to_ip
+
+    spans = pipeline.read_span_records(sys.stdin.buffer, host_to_ip)
+
+    columnar.write_records(spans, sys.stdout.buffer, output_format)
+
+
+def spans2rpcs(args):
+    # Usage: spans2rpcs [--format=json|npz] < SPANS > RPCS
+    #
+    import columnar
+    import pipeline
+
+    output_format = columnar.parse_format_arg(args)
+
+    spans = columnar.read_records(sys.stdin.buffer)
+
+    columnar.write_records(pipeline.rpc_records_from_span_records(spans),
+                           sys.stdout.buffer, output_format)
+
+
+def pcap2json(args):
+    # Usage: pcap2json HOST_IP < PCAP > PACKETS_JSON
+    #
+    import pipeline
+
+    write_json_array(pipeline.iter_packet_records(args[1], sys.stdin.buffer),
+                     sys.stdout)
+
+
+def write_json_array(values, stream):
+    """
+    Writes an iterable of JSON-serializable values as a JSON array, one
+    element at a time; the output is the same as json.dump(list(values)).
+    """
+    import json
+
+    stream.write('[')
+    for i, value in enumerate(values):
+        if i:
+            stream.write(', ')
+        json.dump(value, stream)
+    stream.write(']')
+
+
+def extract_packet_ts(args):
+    # Usage: extract_packet_ts [--workers=N] [--rpcs=RPCS] [--format=json|npz]
+    #                          [--config=MESH_JSON] [--window-ms=MS]
+    #                          [HOST_IP=PCAP_FILE...]
+    #
+    # With --rpcs, only packets of the connections used by those RPCs are
+    # decoded.  With --config, the pcaps of every host of a capture mesh
+    # config (see pipeline.MeshConfig) are read as well.  With --window-ms,
+    # the captures are streamed and matched on the fly, giving up on packets
+    # not seen by the other end within MS milliseconds (clock skew plus
+    # latency), instead of being loaded whole; rows are then written as
+    # packets are matched, in match order rather than sorted.
+    #
+    import columnar
+    import pipeline
+
+    output_format = columnar.parse_format_arg(args)
+
+    workers = None
+    window_ns = None
+    packet_filter = None
+    host_pcap_files = {}
+    for arg in args[1:]:
+        if arg.startswith("--workers="):
+            workers = int(arg[len("--workers="):])
+            continue
+        if arg.startswith("--window-ms="):
+            window_ns = int(float(arg[len("--window-ms="):]) *
+                            pipeline.NSEC_PER_USEC * 1000)
+            continue
+        if arg.startswith("--rpcs="):
+            with open(arg[len("--rpcs="):], 'rb') as rpcs_file:
+                packet_filter = pipeline.rpc_packet_filter(
+                    columnar.read_records(rpcs_file))
+            continue
+        if arg.startswith("--config="):
+            host_pcap_files.update(
+                pipeline.MeshConfig.from_file(arg[len("--config="):]).pcap_files)
+            continue
+        host, pcap_file = arg.split('=')
+        host_pcap_files[host] = pcap_file
+
+    # Rows are emitted as arrays, in pipeline.PACKET_* field order:
+    #
+    # (src.ip, src.port, dst.ip, dst.port, send.time.usec, recv.time.usec, seq, size)
+    #
+    if window_ns is None:
+        packets_with_ts = pipeline.traced_packet_rows(host_pcap_files, workers,
+                                                      packet_filter)
+        columnar.write_rows(packets_with_ts, pipeline.PACKET_COLUMNS, sys.stdout.buffer,
+                            output_format)
+    else:
+        columnar.write_row_batches(
+            pipeline.traced_packet_row_batches(host_pcap_files, window_ns, packet_filter),
+            pipeline.PACKET_COLUMNS, sys.stdout.buffer, output_format)
+
+
+def correct_rpcs_using_packets(args):
+    # Usage: correct_rpcs_using_packets [--format=json|npz] PACKETS [RPCS]
+    #
+    # PACKETS and RPCS may each be JSON or columnar (see columnar.py); RPCS
+    # is read from stdin if not given.  RPCs whose connection has no packets
+    # are dropped, and counted on stderr.
+    #
+    import columnar
+    import pipeline
+
+    output_format = columnar.parse_format_arg(args)
+
+    with open(args[1], 'rb') as fp:
+        packets = columnar.read_rows(fp, pipeline.PACKET_COLUMNS)
+
+    if len(args) >= 3:
+        with open(args[2], 'rb') as fp:
+            rpcs = columnar.read_records(fp)
+    else:
+        rpcs = columnar.read_records(sys.stdin.buffer)
+
+    rpc_count = len(rpcs)
+    corrected = pipeline.correct_rpc_records_using_packets(rpcs, packets)
+    if len(corrected) < rpc_count:
+        sys.stderr.write(f"dropped {rpc_count - len(corrected)} of {rpc_count} RPCs "
+                         f"without traced packets\n")
+
+    columnar.write_records(corrected, sys.stdout.buffer, output_format)
+
+
+def correct_rpc_skew(args):
+    # Usage: correct_rpc_skew [--format=json|npz] [--window-s=S [--hop-s=S]]
+    #                         < RPCS > RPCS
+    #
+    # Without --window-s, the average split skew of all RPCs is removed from
+    # each.  With it, the average is taken per link over windows of S
+    # seconds (starting every --hop-s seconds; tumbling windows by default),
+    # and each RPC is corrected by its link's average interpolated at its
+    # own time.
+    #
+    import columnar
+    import pipeline
+    import sketches
+
+    output_format = columnar.parse_format_arg(args)
+
+    window_usec = None
+    hop_usec = None
+    for arg in args[1:]:
+        if arg.startswith("--window-s="):
+            window_usec = float(arg[len("--window-s="):]) * pipeline.USEC_PER_SEC
+        elif arg.startswith("--hop-s="):
+            hop_usec = float(arg[len("--hop-s="):]) * pipeline.USEC_PER_SEC
+
+    windows = None
+    if window_usec is not None:
+        windows = sketches.SlidingWindows(window_usec, hop_usec)
+
+    rpcs = columnar.read_records(sys.stdin.buffer)
+
+    columnar.write_records(pipeline.correct_rpc_records_skew(rpcs, windows),
+                           sys.stdout.buffer, output_format)
+
+
+def plot_rpc_latency(args):
+    # Usage: plot_rpc_latency [IMAGE_FILE] < RPCS
+    #
+    import columnar
+    import pipeline
+
+    pipeline.plot_rpc_latency_hist(columnar.read_records(sys.stdin.buffer),
+                                   args[1] if len(args) >= 2 else None)
+
+
+def plot_rpc_skew(args):
+    # Usage: plot_rpc_skew [IMAGE_FILE] < RPCS
+    #
+    import columnar
+    import pipeline
+
+    pipeline.plot_rpc_skew_hist(columnar.read_records(sys.stdin.buffer),
+                                args[1] if len(args) >= 2 else None)
+
+
+def analyze(args):
+    # Usage: analyze [--config=MESH_JSON] [--window-ms=MS] [--no-bootstrap]
+    #
+    # The full packet-based analysis and its plots (see pipeline.main).  With
+    # --window-ms, the RPC packets are never loaded whole: they are traced
+    # (as in extract_packet_ts) and sampled by streaming the captures.  The
+    # per-link estimates are given confidence intervals, as by the bootstrap
+    # command, unless --no-bootstrap is given.
+    #
+    import pipeline
+
+    pipeline.main(args)
+
+
+def check_link_bias(args):
+    # Usage: check_link_bias [--config=MESH_JSON] [--workers=N]
+    #
+    # Checks that the vectorized two-packets link bias estimate agrees with
+    # the reference (per-packet) implementation on a capture mesh.
+    #
+    import pipeline
+
+    config_file = parse_config_arg(args, pipeline.CONFIG_FILE)
+    workers = pipeline.INGEST_WORKERS
+    for arg in args[1:]:
+        if arg.startswith("--workers="):
+            workers = int(arg[len("--workers="):])
+
+    mesh = pipeline.MeshConfig.from_file(config_file)
+    captured = pipeline.read_pcap_files(mesh.pcap_files, workers=workers)
+
+    diffs = pipeline.check_link_bias_parity(captured)
+    for diff in diffs:
+        print(diff)
+
+    if diffs:
+        print(f"link bias: {len(diffs)} differences")
+        return 1
+
+    print(f"link bias: vectorized and reference implementations agree "
+          f"({len(captured)} packets)")
+    return 0
+
+
+def bootstrap(args):
+    # Usage: bootstrap [--config=MESH_JSON] [--replicates=N] [--confidence=C]
+    #                  [--seed=N] [--workers=N]
+    #
+    # Prints bootstrap confidence intervals of the link bias, clock skew and
+    # query/reply cost of each link of a capture mesh (see
+    # pipeline.bootstrap_link_estimates), from its packet-timestamp corrected
+    # RPCs and their packets.
+    #
+    import ingest_cache
+    import pipeline
+
+    config_file = parse_config_arg(args, pipeline.CONFIG_FILE)
+    replicates = pipeline.BOOTSTRAP_REPLICATES
+    confidence = pipeline.BOOTSTRAP_CONFIDENCE
+    seed = pipeline.BOOTSTRAP_SEED
+    workers = pipeline.BOOTSTRAP_WORKERS
+    for arg in args[1:]:
+        if arg.startswith("--replicates="):
+            replicates = int(arg[len("--replicates="):])
+        elif arg.startswith("--confidence="):
+            confidence = float(arg[len("--confidence="):])
+        elif arg.startswith("--seed="):
+            seed = int(arg[len("--seed="):])
+        elif arg.startswith("--workers="):
+            workers = int(arg[len("--workers="):])
+
+    mesh = pipeline.MeshConfig.from_file(config_file)
+    cache = ingest_cache.IngestCache(pipeline.CACHE_DIR, pipeline.CACHE_MAX_BYTES)
+
+    spans = pipeline.read_spans_from_trace_file(mesh.trace_file, mesh.host_to_ip,
+                                                cache=cache,
+                                                trace_format=mesh.trace_format)
+    rpcs = pipeline.rpcs_from_trace_spans(spans)
+    rpc_packets = pipeline.read_pcap_files(
+        mesh.pcap_files,
+        packet_filter=pipeline.make_packet_filter(
+            flow_ids=set(pipeline.TCPPacketFlowId.from_rpc(r) for r in rpcs)),
+        cache=cache)
+    packet_ts_rpcs = pipeline.replace_message_timestamps(
+        rpcs, pipeline.captured_to_traced_packets(rpc_packets))
+
+    pipeline.print_link_intervals(
+        pipeline.bootstrap_link_estimates(packet_ts_rpcs, rpc_packets,
+                                          replicates=replicates, confidence=confidence,
+                                          seed=seed, workers=workers),
+        confidence)
+
+
+def sweep(args):
+    # Usage: sweep [--config=MESH_JSON] [--format=json|npz] [--workers=N]
+    #              [--outlier-sigmas=S,...] [--cost-outlier-sigmas=S,...]
+    #              [--bias=null,mean,median] [--packets=all,rpc]
+    #              [--timestamps=raw,pts] > TABLE
+    #
+    # Evaluates the per-link link bias, clock skew and query/reply cost of a
+    # capture mesh under every combination of the given settings (see
+    # pipeline.sweep_link_estimates), writing one record per combination and
+    # link.  "rpc" packets are those of the traced RPCs' connections and
+    # "pts" timestamps the packet-timestamp corrected RPCs.
+    #
+    import columnar
+    import ingest_cache
+    import pipeline
+
+    output_format = columnar.parse_format_arg(args)
+    config_file = parse_config_arg(args, pipeline.CONFIG_FILE)
+    settings = {}
+    workers = pipeline.SWEEP_WORKERS
+    for arg in args[1:]:
+        name, _sep, value = arg.partition("=")
+        if name == "--workers":
+            workers = int(value)
+        elif name == "--outlier-sigmas":
+            settings["outlier_sigmas"] = tuple(float(v) for v in value.split(","))
+        elif name == "--cost-outlier-sigmas":
+            settings["cost_outlier_sigmas"] = tuple(float(v) for v in value.split(","))
+        elif name == "--bias":
+            settings["bias_methods"] = tuple(value.split(","))
+        elif name == "--packets":
+            settings["packets"] = tuple(value.split(","))
+        elif name == "--timestamps":
+            settings["timestamps"] = tuple(value.split(","))
+
+    # Checks the names given before anything is decoded.
+    #
+    grid = pipeline.SweepGrid(**settings)
+
+    mesh = pipeline.MeshConfig.from_file(config_file)
+    cache = ingest_cache.IngestCache(pipeline.CACHE_DIR, pipeline.CACHE_MAX_BYTES)
+
+    captured = pipeline.read_pcap_files(mesh.pcap_files, cache=cache)
+    spans = pipeline.read_spans_from_trace_file(mesh.trace_file, mesh.host_to_ip,
+                                                cache=cache,
+                                                trace_format=mesh.trace_format)
+    rpcs = pipeline.rpcs_from_trace_spans(spans)
+
+    captured_by_packets = {"all": captured}
+    if "rpc" in grid.packets:
+        captured_by_packets["rpc"] = captured.take(captured.flow_mask(
+            set(pipeline.TCPPacketFlowId.from_rpc(r) for r in rpcs)))
+
+    rpcs_by_timestamps = {"raw": rpcs}
+    if "pts" in grid.timestamps:
+        rpcs_by_timestamps["pts"] = pipeline.replace_message_timestamps(
+            rpcs, pipeline.captured_to_traced_packets(captured))
+
+    records = pipeline.sweep_link_estimates(rpcs_by_timestamps, captured_by_packets,
+                                            grid, workers)
+
+    columnar.write_records(records, sys.stdout.buffer, output_format)
+
+
+def bench_trace_formats(args):
+    # Usage: bench_trace_formats [--config=MESH_JSON] [--runs=N]
+    #
+    # Converts the mesh's Jaeger JSON trace file to each protobuf trace
+    # format (see proto_scan.write_spans), times reading each version into
+    # spans (best of N runs, without the ingest cache) and fails if any
+    # reads different spans than the JSON file.  Children are compared as
+    # sets: the JSON export and the protobuf readers order them differently.
+    #
+    import contextlib
+    import dataclasses
+    import io
+    import json
+    import pipeline
+    import proto_scan
+    import tempfile
+    import time
+
+    config_file = parse_config_arg(args, pipeline.CONFIG_FILE)
+    runs = STARTUP_RUNS
+    for arg in args[1:]:
+        if arg.startswith("--runs="):
+            runs = int(arg[len("--runs="):])
+
+    mesh = pipeline.MeshConfig.from_file(config_file)
+    if mesh.trace_format != pipeline.TRACE_FORMAT_JSON:
+        print(f"{config_file}: trace_file must be a Jaeger JSON export")
+        return 1
+
+    with open(mesh.trace_file, 'rb') as stream:
+        traces = json.load(stream)["data"]
+
+    def canonical(spans):
+        return sorted((dataclasses.replace(span, children=sorted(span.children))
+                       for span in spans),
+                      key=lambda span: (span.trace_id, span.span_id))
+
+    differ = []
+    with tempfile.TemporaryDirectory() as directory:
+        expected = None
+        json_seconds = None
+        for trace_format in pipeline.TRACE_FORMATS:
+            filename = mesh.trace_file
+            if trace_format != pipeline.TRACE_FORMAT_JSON:
+                filename = os.path.join(directory, trace_format)
+                with open(filename, 'wb') as stream:
+                    proto_scan.write_spans(traces, stream, trace_format)
+
+            best = None
+            for _run in range(runs):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    spans = pipeline.read_spans_from_trace_file(
+                        filename, mesh.host_to_ip, trace_format=trace_format)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            spans = canonical(spans)
+            if expected is None:
+                expected, json_seconds = spans, best
+            if spans != expected:
+                differ.append(trace_format)
+
+            print(f"{trace_format:14} {os.path.getsize(filename) / 1e6:8.1f} MB "
+                  f"{best * 1000:9.1f} ms {len(spans):8} spans "
+                  f"{json_seconds / best:6.2f}x")
+
+    if differ:
+        print(f"spans differ from the JSON file's: {', '.join(differ)}")
+        return 1
+
+    print("all formats read the same spans")
+    return 0
+
+
+def export(args):
+    # Usage: export < FILE.npz > FILE.json
+    #
+    import columnar
+
+    columnar.main(args)
+
+
+def startup(args):
+    # Usage: startup [--runs=N] [--target-ms=MS]
+    #
+    # Times each non-plotting command on an empty input (best of N runs, each
+    # in a fresh interpreter) and fails if any exceeds the target.
+    #
+    import subprocess
+    import tempfile
+    import time
+
+    runs = STARTUP_RUNS
+    target_ms = STARTUP_TARGET_MS
+    for arg in args[1:]:
+        if arg.startswith("--runs="):
+            runs = int(arg[len("--runs="):])
+        elif arg.startswith("--target-ms="):
+            target_ms = float(arg[len("--target-ms="):])
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    config_file = os.path.join(here, "hosts.json")
+
+    with tempfile.NamedTemporaryFile(suffix=".json") as empty_file:
+        empty_file.write(b"[]")
+        empty_file.flush()
+
+        # (command line, stdin)
+        #
+        probes = [
+            ([], b""),
+            (["traces2spans", f"--config={config_file}"], b'{"data": []}'),
+            (["spans2rpcs"], b"[]"),
+            (["pcap2json", "127.0.0.1"], EMPTY_PCAP),
+            (["extract_packet_ts"], b""),
+            (["correct_rpcs_using_packets", empty_file.name], b"[]"),
+            (["correct_rpc_skew"], b"[]"),
+            (["export"], b"[]"),
+        ]
+
+        over = []
+        for command, stdin in probes:
+            if command:
+                argv = [sys.executable, os.path.abspath(__file__)] + command
+            else:
+                argv = [sys.executable, "-c", "pass"]
+
+            best_ms = None
+            for _run in range(runs):
+                start = time.perf_counter()
+                subprocess.run(argv, input=stdin, stdout=subprocess.DEVNULL,
+                               check=True)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+
+            name = command[0] if command else "(python -c pass)"
+            print(f"{name:30} {best_ms:8.1f} ms")
+            if command and best_ms > target_ms:
+                over.append(name)
+
+    if over:
+        print(f"over the {target_ms}ms start-up target: {', '.join(over)}")
+        return 1
+
+    print(f"all within the {target_ms}ms start-up target")
+    return 0
+
+
+# Command name -> function taking the command's argv (args[0] is the command).
+#
+COMMANDS = {
+    "traces2spans": traces2spans,
+    "spans2rpcs": spans2rpcs,
+    "pcap2json": pcap2json,
+    "extract_packet_ts": extract_packet_ts,
+    "correct_rpcs_using_packets": correct_rpcs_using_packets,
+    "correct_rpc_skew": correct_rpc_skew,
+    "plot_rpc_latency": plot_rpc_latency,
+    "plot_rpc_skew": plot_rpc_skew,
+    "analyze": analyze,
+    "check_link_bias": check_link_bias,
+    "bootstrap": bootstrap,
+    "sweep": sweep,
+    "bench_trace_formats": bench_trace_formats,
+    "export": export,
+    "startup": startup,
+}
+
+
+#=#=#==#==#===============+=+=+=+=++=++++++++++++++-++-+--+-+----+---------------
+
+def usage(stream):
+    stream.write("Usage: tracedoppler.py COMMAND [ARGS...]\n\nCommands:\n")
+    for name in COMMANDS:
+        stream.write(f"  {name}\n")
+
+
+def command_usage(name):
+    """
+    Returns the usage comment at the top of a command's function.
+    """
+    import inspect
+
+    lines = []
+    for line in inspect.getsource(COMMANDS[name]).splitlines()[1:]:
+        line = line.strip()
+        if not line.startswith("#"):
+            break
+        lines.append(line[2:] if line.startswith("# ") else line[1:])
+    return "\n".join(lines).strip() + "\n"
+
+
+def run(name, args):
+    """
+    Runs command `name` with `args` (args[0] is the program name, as in
+    sys.argv), returning its exit status.
+    """
+    if any(arg in ("-h", "--help") for arg in args[1:]):
+        sys.stdout.write(command_usage(name))
+        return 0
+
+    return COMMANDS[name](list(args)) or 0
+
+
+def main(args):
+    if len(args) < 2 or args[1] in ("-h", "--help"):
+        usage(sys.stdout)
+        return 0
+
+    if args[1] not in COMMANDS:
+        sys.stderr.write(f"unknown command {args[1]!r}\n\n")
+        usage(sys.stderr)
+        return 2
+
+    return run(args[1], args[1:])
+
+
+#==#==========+==+=+=++=+++++++++++-+-+--+----- --- -- -  -  -   -
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))